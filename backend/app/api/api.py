@@ -1,24 +1,39 @@
 import os
 import io
 import json
+import asyncio
 import base64
-from typing import Dict, List
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from uuid import UUID
 from http import HTTPStatus
-from queue import Queue
 from config import Settings, BaseLogger
 
 from services.graphs import *
 from services.background_task import *
 from services.chains import *
+from services.llm_scheduler import Priority, SchedulerBusy, configure_llm_scheduler, llm_scheduler, use_priority
+from services.question_pool import configure_question_pool, question_pool
+from services.feedback_cache import configure_feedback_cache, feedback_cache
+from services.embedding_cache import configure_embedding_cache, embedding_cache
+from services.pdf_extract import get_thumbnail_pool, render_thumbnail, shutdown_extract_pool
 from api.models import *
 from api.utils import *
 from db.mongo import *
 from db.neo4j import *
+from db.async_neo4j import *
+from db.schema import apply_schema
+from db.instrumentation import configure_query_metrics, instrument_graph, query_metrics
+from db.user_cache import configure_user_cache, user_cache
+from db.write_buffer import configure_write_buffer, write_buffer
 
 from fastapi import (
     FastAPI, 
     Body, 
+    Depends, 
+    Query, 
+    Request, 
     HTTPException, 
     BackgroundTasks, 
     UploadFile, 
@@ -28,7 +43,8 @@ from fastapi import (
     APIRouter,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, Response
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
 
 from langchain_neo4j import Neo4jGraph
 
@@ -37,13 +53,12 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 from pymongo import ReturnDocument
 import bcrypt
 
-from pdf2image import convert_from_bytes
 from pydantic import BaseModel
 
 
 '''
 [ Chat & AI ]
-1.  `/generate-task`:               [G] Streams tokens generated by an LLM based on a user question
+1.  `/generate-task`:               [G] Streams a pre-generated question of the session, or tokens generated by an LLM
 2.  `/query-stream`:                [P] Streams chat responses from LLM
 3.  `/generate-learning-preference`: [P] Generates learning preferences using LLM
 4.  `/tooltest/{question}`:         [G] Tests grader chain functionality
@@ -53,10 +68,10 @@ from pydantic import BaseModel
 6.  `/get_AIsession/{user_id}`:     [G] Retrieves AI chat session data for a user
 7.  `/get_QUIZsession/{user_id}`:   [G] Retrieves QUIZ session data for a user
 8.  `/create_session/{user_id}`:     [P] Creates new QUIZ Session with user preferences
-9.  `/list_session/{user_id}`:       [G] Lists all QUIZ sessions for a user
+9.  `/list_session/{user_id}`:       [G] Lists QUIZ sessions for a user, newest first (?after=&limit=)
 10. `/list_single_session/{s_id}`:   [G] Gets details of a specific session
 11. `/update_session_name/{s_id}`:   [P] Updates session name
-12. `/delete_session/{s_id}`:        [D] Deletes a session
+12. `/delete_session/{s_id}`:        [D] Deletes a session (background job, batched)
 13. `/update_question_count`:        [P] Updates current question count in session
 
 [ Quiz System ]
@@ -75,13 +90,16 @@ from pydantic import BaseModel
 24. `/students/{id}`:               [D] Deletes student
 
 [ User Relationships ]
+25. `/users/all`:                   [G] Lists users with relationships, keyset paginated (?after=&limit=&fields=)
+25. `/users/stream`:                [G] Streams all users as NDJSON (?fields=)
 25. `/users/{user_id}/profile`:     [G] Gets user profile with relationships
 26. `/users/relationship`:          [P] Creates user relationship
 27. `/users/{user_id}/relationships`:[G] Lists user relationships
 
 [ PDF Management ]
 28. `/upload/pdf`:                  [P] Uploads and processes PDFs
-29. `/pdfs`:                        [G] Lists uploaded PDFs
+29. `/pdfs`:                        [G] Lists uploaded PDFs with thumbnail URLs, keyset paginated (?after=&limit=, ETag)
+29. `/pdfs/{id}/thumbnail`:         [G] First-page PNG thumbnail of a PDF (ETag / Cache-Control)
 30. `/pdfs/{id}`:                   [D] Deletes PDF
 31. `/retrieve_by_similarity/{query}`:[G] Retrieves similar PDF chunks
 
@@ -91,9 +109,9 @@ from pydantic import BaseModel
 34. `/web_files`:                   [G] Lists loaded web files
 
 [ Chat History ]
-35. `/chat_histories/{SessionId}`:           [G] Gets session chat history
-36. `/chat_histories/{SessionId}`:           [D] Deletes session chat history
-37. `/chat_histories/user/{user_id}`:        [G] Gets user's chat histories
+35. `/chat_histories/{SessionId}`:           [G] Gets session chat history, one page at a time (?before=&limit=)
+36. `/chat_histories/{SessionId}`:           [D] Deletes session chat history (background job, batched)
+37. `/chat_histories/user/{user_id}/summary`:[G] Gets the newest message of each of user's sessions (?limit=)
 
 [ Gamification ]
 38. `/streak-reward/{user_id}`:     [G] Gets user's quiz completion streak
@@ -101,6 +119,18 @@ from pydantic import BaseModel
 [ WebSocket ]
 39. `/ws/{client_id}`:              [WS] WebSocket endpoint for real-time communication
 
+[ Metrics ]
+40. `/metrics/cypher`:              [G] Per-query Cypher timings, row counts and sampled db hits
+41. `/metrics/cypher`:              [D] Resets the Cypher metrics
+42. `/metrics/user-cache`:          [G] User cache hit rate, evictions and size
+43. `/metrics/generation`:          [G] Streamed generations started/completed/cancelled and tokens saved,
+                                        plus per-attempt timings of the latest `generate_task` runs and question pool hit rate
+44. `/metrics/llm`:                 [G] LLM scheduler queue depth, queue wait and generation time per priority
+45. `/metrics/feedback-cache`:      [G] Quiz feedback cache hit rate, evictions and size
+46. `/metrics/embedding-cache`:     [G] Embedding cache hit rate (memory / persistent), evictions and size
+47. `/embedding-cache`:             [D] Drops cached embeddings (?model=, all models when omitted)
+48. `/metrics/embedding-batcher`:   [G] Micro-batched query embeddings: batches, average / largest batch size
+
 Method Types:
 [G] GET    - Retrieves data
 [P] POST   - Creates/Updates data
@@ -122,24 +152,60 @@ thumbnails_collection = client[settings.mongodb_].get_collection("thumbnails")
 pdfdb = client.pdfUploads
 fs = AsyncIOMotorGridFSBucket(pdfdb)
 
-embeddings = load_embedding_model(
-    settings.embedding_model,
-    config={"ollama_base_url": settings.ollama_base_url},
-    logger=BaseLogger(),
-)
+# the same instance as services/background_task.py: one micro-batcher for every query
+embeddings = get_embedding_model()
 
 # if Neo4j is local, you can go to http://localhost:7474/ to browse the database
-neo4j_graph = Neo4jGraph(url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password, refresh_schema=False)
-create_constraints(neo4j_graph)
-create_vector_index(neo4j_graph)
+configure_query_metrics(settings)
+configure_user_cache(settings)
+configure_write_buffer(settings)
+configure_llm_scheduler(settings)
+configure_feedback_cache(settings)
+configure_embedding_cache(settings)
+neo4j_graph = instrument_graph(Neo4jGraph(url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password, refresh_schema=False))
 
 llm = load_llm(settings.llm, logger=BaseLogger(), config={"ollama_base_url": settings.ollama_base_url})
 llm_chain = configure_llm_only_chain(llm)
-llm_history_chain = configure_llm_history_chain(llm, url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password)
+llm_history_chain = configure_llm_history_chain(llm)
 grader_chain = configure_grader_chain(llm)
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Neo4j driver for the whole process instead of one per request.
+    # Routes use the async driver; the sync one serves worker-thread callers.
+    init_driver(settings)
+    await init_async_driver(settings)
+    # constraints and indexes, see db/schema.py
+    apply_schema(get_driver())
+    # `/pdfs` pages and `/pdfs/{id}/thumbnail` lookups
+    await thumbnails_collection.create_index("file_id")
+    yield
+    await question_pool.close()
+    write_buffer.close()
+    embeddings.embeddings.close()
+    shutdown_extract_pool()
+    await close_async_driver()
+    close_driver()
+
+def get_neo4j_db() -> AsyncNeo4jDatabase:
+    return AsyncNeo4jDatabase(driver=get_async_driver())
+
+async def pregenerate_question(user_id, session):
+    await generate_task(
+        user_id=user_id,
+        neo4j_graph=neo4j_graph,
+        llm_chain=llm_chain,
+        grader_chain=grader_chain,
+        embeddings=embeddings,
+        session=session,
+        pooled=True,
+    )
+
+# quiz questions generated ahead of the student, see services/question_pool.py
+configure_question_pool(settings, generate=pregenerate_question, db_getter=get_neo4j_db)
+
+app = FastAPI(lifespan=lifespan)
 origins = ["*"]
 
 app.add_middleware(
@@ -148,8 +214,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    return JSONResponse(
+        status_code=HTTPStatus.TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.get("/") 
 async def root():
     return {"message": "Hello World"}
@@ -197,81 +272,79 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, target_user_id:
 
 # Chat bot API
 @app.post("/query-stream")
-async def qstream(question: Question):
+async def qstream(question: Question, request: Request):
     output_function = llm_history_chain
     print(question.session)
+    llm_scheduler.admit(Priority.INTERACTIVE)
+
+    async def run(callbacks):
+        with use_priority(Priority.INTERACTIVE):
+            await output_function(
+                sid=question.session.get("session_id"),
+                question=question.text,
+                callbacks=callbacks,
+            )
 
-    q = Queue()
-    def cb():
-        output_function(
-            sid=question.session.get("session_id"),
-            question=question.text,
-            callbacks=[QueueCallback(q)],
-        )
-    def generate():
-        for token, _ in stream(cb, q):
-            yield token
-    return StreamingResponse(generate(), media_type="application/json")
+    return StreamingResponse(astream(run, "query-stream", request), media_type="application/json")
 
 @app.post("/generate-task") 
-async def generate_task_api(task: GenerateTask):
-    q = Queue()
+async def generate_task_api(task: GenerateTask, request: Request):
     print(task.session)
+    # served from the session's pre-generated pool when possible
+    question = await question_pool.claim(task.user, task.session)
+    if question is not None:
+        await asyncio.to_thread(record_served_question, task.session, question["text"])
+        return StreamingResponse(iter([question["text"]]), media_type="application/json; charset=utf-8")
+
+    # pool miss: a student is waiting on this one, it goes ahead of the pool refills
+    llm_scheduler.admit(Priority.FEEDBACK)
+
+    async def run(callbacks):
+        with use_priority(Priority.FEEDBACK):
+            await generate_task(
+                user_id=task.user,
+                neo4j_graph=neo4j_graph,
+                # candidates stay out of the session history, only the served question is recorded
+                llm_chain=llm_chain,
+                grader_chain=grader_chain,
+                embeddings=embeddings,
+                session=task.session,
+                callbacks=callbacks,
+            )
 
-    def cb():
-        generate_task(
-            user_id=task.user,
-            neo4j_graph=neo4j_graph,
-            llm_chain=llm_history_chain,
-            grader_chain=grader_chain,
-            embeddings=embeddings,
-            session=task.session,
-            callbacks=[QueueCallback(q)],
-        )
-
-    def generate():
-        for token, _ in stream(cb, q):
-            yield token
-
-    return StreamingResponse(generate(), media_type="application/json; charset=utf-8")
+    return StreamingResponse(astream(run, "generate-task", request), media_type="application/json; charset=utf-8")
 
 @app.post("/generate-learning-preference") 
-async def generate_lp_api(task: GenerateTask):
-    q = Queue()
+async def generate_lp_api(task: GenerateTask, request: Request):
     print(task.session)
+    llm_scheduler.admit(Priority.INTERACTIVE)
+
+    async def run(callbacks):
+        with use_priority(Priority.INTERACTIVE):
+            await generate_lp(
+                user_id=task.user,
+                neo4j_graph=neo4j_graph,
+                llm_chain=llm_history_chain,
+                session=task.session,
+                callbacks=callbacks,
+            )
 
-    def cb():
-        generate_lp(
-            user_id=task.user,
-            neo4j_graph=neo4j_graph,
-            llm_chain=llm_history_chain,
-            session=task.session,
-            callbacks=[QueueCallback(q)],
-        )
-
-    def generate():
-        for token, _ in stream(cb, q):
-            yield token
-
-    return StreamingResponse(generate(), media_type="application/json")
+    return StreamingResponse(astream(run, "generate-learning-preference", request), media_type="application/json")
 
 @app.get("/get_AIsession/{user_id}") 
-async def get_session(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    session = neo4j_db.get_AIsession(user_id)
-    neo4j_db.close()
+async def get_session(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    session = await neo4j_db.get_AIsession(user_id)
     return session
 
 @app.get("/get_QUIZsession/{user_id}") 
-async def get_session(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    session = neo4j_db.get_QUIZsession(user_id)
-    neo4j_db.close()
+async def get_session(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    session = await neo4j_db.get_QUIZsession(user_id)
     return session
 
 @app.get("/retrieve_by_similarity/{query}") 
 async def retrieve_by_similarity(query: str):
-    session = retrieve_pdf_chunks_by_similarity(query, embeddings, settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
+    # embedding + vector search are blocking, keep them off the event loop
+    session = await asyncio.to_thread(retrieve_pdf_chunks_by_similarity, query, embeddings)
     return session
 
 
@@ -284,69 +357,83 @@ async def graphtest(question: str):
 
 
 @app.post("/create_session/{user_id}")
-async def create_session(user_id: str, payload: dict):
+async def create_session(user_id: str, payload: dict, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     sname = payload.get('sname')
     question_count = payload.get('question_count')
     topics = payload.get('topics')
     selected_pdfs = payload.get('selected_pdfs')
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    session = neo4j_db.create_session(user_id, sname, question_count, topics, selected_pdfs)
-    neo4j_db.close()
+    session = await neo4j_db.create_session(user_id, sname, question_count, topics, selected_pdfs)
+    # start filling the quiz's question pool before the student opens it
+    question_pool.refill(user_id, session)
     return session
 
 @app.get("/list_session/{user_id}")
-async def list_session(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    sessions = neo4j_db.get_quizsessions_for_user(user_id)
-    neo4j_db.close()
+async def list_session(
+    user_id: str,
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db),
+):
+    """
+    List a user's QUIZ sessions, newest first, one page at a time.
+
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next one.
+    """
+    try:
+        position = decode_cursor(after, 2) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # one extra row tells whether there is a next page
+    sessions = await neo4j_db.get_quizsessions_for_user(user_id, after=position, limit=limit + 1)
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        last = sessions[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last["timestamp"].iso_format(), last["session_id"])
     return sessions
 
 @app.get("/list_single_session/{session_id}")
-async def list_single_session(session_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    sessions = neo4j_db.get_quizsessions_for_sessionid(session_id)
-    neo4j_db.close()
+async def list_single_session(session_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    sessions = await neo4j_db.get_quizsessions_for_sessionid(session_id)
     return sessions
 
 @app.post("/update_session_name/{session_id}")
-async def update_session_name(session_id: str, payload: dict):
+async def update_session_name(session_id: str, payload: dict, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     new_name = payload.get("new_name")
 
     if not new_name:
         raise HTTPException(status_code=400, detail="New name is required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    success = neo4j_db.update_session_name(session_id, new_name)
-    neo4j_db.close()
+    success = await neo4j_db.update_session_name(session_id, new_name)
 
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
 
     return {"message": "Session name updated successfully"}
 
-@app.delete("/delete_session/{session_id}")
-async def delete_session(session_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    success = neo4j_db.delete_session(session_id)
-    neo4j_db.close()
-
-    if not success:
+@app.delete("/delete_session/{session_id}", status_code=HTTPStatus.ACCEPTED)
+async def delete_session(session_id: str, background_tasks: BackgroundTasks, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    """
+    Delete a session in the background, in batches. Poll `/bgtask/{uid}/status` for progress.
+    """
+    if not await neo4j_db.get_quizsessions_for_sessionid(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
 
-    return {"message": "Session deleted successfully"}
+    new_task = Job()
+    jobs[new_task.uid] = new_task
+    background_tasks.add_task(delete_session_in_batches, jobs, new_task.uid, session_id)
+    return new_task
 
 @app.post("/update_question_count")
-async def update_question_count(payload: dict):
+async def update_question_count(payload: dict, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     session_id = payload.get("session_id")
     current_question_count = payload.get("current_question_count")
 
     if not session_id or current_question_count is None:
         raise HTTPException(status_code=400, detail="Session ID and current question count are required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    neo4j_db.update_current_question_count(session_id, current_question_count)
-    neo4j_db.close()
+    await neo4j_db.update_current_question_count(session_id, current_question_count)
 
     return {"message": "Current question count updated successfully"}
 
@@ -395,39 +482,40 @@ async def get_quiz(id: str):
     raise HTTPException(status_code=404, detail=f"Student {id} not found")
 
 @app.post("/submit/quiz")
-async def submit_quiz(task: Quiz_submission):
-    q = Queue()
-
-    def cb():
-        check_quiz_correctness(
-            user_id=task.user,
-            llm_chain=llm_chain,
-            task=task.question,
-            answer=task.answer,
-            question_node=task.session,
-            callbacks=[QueueCallback(q)],
-        )
-
-    def generate():
-        for token, _ in stream(cb, q):
-            yield token
+async def submit_quiz(task: Quiz_submission, request: Request):
+    # opt out of the feedback cache with `use_cache: false` or `Cache-Control: no-cache`
+    use_cache = task.use_cache and "no-cache" not in request.headers.get("cache-control", "")
+    # a cached feedback needs no LLM, don't turn it away when the queue is full
+    if not (use_cache and feedback_cache.has(task.question, task.answer)):
+        llm_scheduler.admit(Priority.FEEDBACK)
+
+    async def run(callbacks):
+        with use_priority(Priority.FEEDBACK):
+            await check_quiz_correctness(
+                user_id=task.user,
+                llm_chain=llm_chain,
+                task=task.question,
+                answer=task.answer,
+                question_node=task.session,
+                callbacks=callbacks,
+                use_cache=use_cache,
+            )
 
-    return StreamingResponse(generate(), media_type="application/json")
+    return StreamingResponse(astream(run, "submit-quiz", request), media_type="application/json")
 
 @app.post("/submit/settings")
-async def submit_settings(task: Quiz_submission):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    user_node = neo4j_db.get_user_by_id(task.user)
+async def submit_settings(task: Quiz_submission, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    user_node = await neo4j_db.get_user_by_id(task.user)
     if user_node:
-        attr = convert_question_to_attribute(task.question, llm=llm)
+        llm_scheduler.admit(Priority.FEEDBACK)
+        with use_priority(Priority.FEEDBACK):
+            attr = await convert_question_to_attribute(task.question, llm=llm)
         login = int(dict(user_node).get("login"))
-        neo4j_db.update_user_model(task.user, {attr: task.answer, "login": login+1})
-        user_node = neo4j_db.get_user_by_id(task.user) # get updated user
-        neo4j_db.close()
+        await neo4j_db.update_user_model(task.user, {attr: task.answer, "login": login+1})
+        user_node = await neo4j_db.get_user_by_id(task.user) # get updated user
         return user_node
     else:
         print("User not found.")
-        neo4j_db.close()
         return HTTPException(status_code=404, detail=f"Student {task.user} not found")
 
 
@@ -468,7 +556,7 @@ async def login_student(login: LoginModel = Body(...)):
     status_code=HTTPStatus.CREATED,
 )
 
-async def create_student(student: StudentModel = Body(...)):
+async def create_student(student: StudentModel = Body(...), neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     # Explicit email validation (additional layer)
     if not isinstance(student.email, str) or '@' not in student.email:
         raise HTTPException(
@@ -498,47 +586,86 @@ async def create_student(student: StudentModel = Body(...)):
         created_student["_id"] = str(created_student["_id"])
 
     # Create user in neo4j with username
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    neo4j_db.update_user_model(
+    await neo4j_db.update_user_model(
         created_student["_id"], 
         {"login": 0},
         username=student.username  
     )
-    neo4j_db.create_landing_session(
+    await neo4j_db.create_landing_session(
         created_student["_id"],
     )
-    neo4j_db.close()
 
     return created_student
 
+def parse_user_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Split a `fields=a,b,c` projection and reject anything that is not a plain property name.
+    """
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    invalid = [f for f in names if not USER_FIELD_PATTERN.match(f)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid user fields: {', '.join(invalid)}")
+    return names
+
 @app.get("/users/all")
-async def get_all_users():
+async def get_all_users(
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
+    neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db),
+):
     """
-    Get all users and their relationships from the database
+    Get users and their relationships, ordered by id, one page at a time.
+
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next one.
+    `fields=username,avatar,relationships` limits the returned properties (`id` is always included).
     """
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
+    field_names = parse_user_fields(fields)
     try:
-        users = neo4j_db.get_all_user()
-        if not users:
-            return {"users": [], "message": "No users found"}
-        
-        return {
-            "users": users,
-            "count": len(users)
-        }
+        # the cursor keeps the id's type: string ids are listed before integer ones
+        position = decode_cursor(after, 1)[0] if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        # one extra row tells whether there is a next page
+        users = await neo4j_db.get_users_page(after=position, limit=limit + 1, fields=field_names)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching users: {str(e)}"
         )
-    finally:
-        neo4j_db.close()
+
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1]["id"])
+    if not users:
+        return {"users": [], "message": "No users found"}
+
+    return {
+        "users": users,
+        "count": len(users)
+    }
+
+@app.get("/users/stream")
+async def stream_all_users(fields: Optional[str] = None, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    """
+    Stream every user as NDJSON (one JSON object per line), read incrementally from Neo4j.
+    Accepts the same `fields=` projection as `/users/all`.
+    """
+    field_names = parse_user_fields(fields)
+
+    async def generate():
+        async for user in neo4j_db.stream_users(fields=field_names):
+            yield json.dumps(jsonable_encoder(user)) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @app.get("/users/{user_id}/profile")
-async def get_user_profile(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    user = neo4j_db.get_user_by_id(user_id)
-    neo4j_db.close()
+async def get_user_profile(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    user = await neo4j_db.get_user_by_id(user_id)
 
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -546,7 +673,7 @@ async def get_user_profile(user_id: str):
     return user
 
 @app.post("/users/relationship")
-async def create_relationship(relationship: dict = Body(...)):
+async def create_relationship(relationship: dict = Body(...), neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     # Validate input
     required_fields = ["from_user_id", "to_user_id", "type"]
     for field in required_fields:
@@ -564,14 +691,12 @@ async def create_relationship(relationship: dict = Body(...)):
             detail=f"Invalid relationship type. Must be one of: {', '.join(allowed_types)}"
         )
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
     try:
-        result = neo4j_db.create_user_relationship(
+        result = await neo4j_db.create_user_relationship(
             relationship["from_user_id"],
             relationship["to_user_id"],
             relationship["type"]
         )
-        neo4j_db.close()
 
         if not result:
             raise HTTPException(
@@ -585,19 +710,16 @@ async def create_relationship(relationship: dict = Body(...)):
         }
 
     except Exception as e:
-        neo4j_db.close()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/users/{user_id}/relationships")
-async def get_user_relationships(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    relationships = neo4j_db.get_user_relationships(user_id)
-    neo4j_db.close()
+async def get_user_relationships(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    relationships = await neo4j_db.get_user_relationships(user_id)
     
     return {"relationships": relationships}
 
 @app.post("/users/relationship/delete")
-async def delete_relationship(relationship: dict = Body(...)):
+async def delete_relationship(relationship: dict = Body(...), neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     # Validate input
     required_fields = ["from_user_id", "to_user_id", "type"]
     for field in required_fields:
@@ -607,14 +729,12 @@ async def delete_relationship(relationship: dict = Body(...)):
                 detail=f"Missing required field: {field}"
             )
     
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
     try:
-        result = neo4j_db.delete_user_relationship(
+        result = await neo4j_db.delete_user_relationship(
             relationship["from_user_id"],
             relationship["to_user_id"],
             relationship["type"]
         )
-        neo4j_db.close()
 
         if not result:
             raise HTTPException(
@@ -628,16 +748,13 @@ async def delete_relationship(relationship: dict = Body(...)):
         }
 
     except Exception as e:
-        neo4j_db.close()
         raise HTTPException(status_code=500, detail=str(e))
 
 ##########
 
 @app.get( "/check_new_student/{user_id}", response_model=StudentCheckResponse) 
-async def check_new_student(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    user = neo4j_db.get_user_by_id(user_id)
-    neo4j_db.close()
+async def check_new_student(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    user = await neo4j_db.get_user_by_id(user_id)
 
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -733,58 +850,47 @@ async def delete_student(id: str):
 
 
 @app.post("/quiz-progress/{user_id}")
-async def save_quiz_progress(user_id: str, payload: dict):
+async def save_quiz_progress(user_id: str, payload: dict, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     current_index = payload.get("currentIndex")
     if current_index is None:
         raise HTTPException(status_code=400, detail="Current index is required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        success = neo4j_db.update_quiz_progress(user_id, current_index)
-        if not success:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"message": "Quiz progress updated"}
-    finally:
-        neo4j_db.close()
+    success = await neo4j_db.update_quiz_progress(user_id, current_index)
+    if not success:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "Quiz progress updated"}
 
 @app.get("/quiz-progress/{user_id}")
-async def get_quiz_progress(user_id: str):
+async def get_quiz_progress(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     """Get the current quiz progress for a user."""
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        user = neo4j_db.get_user_by_id(user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        return {
-            "currentIndex": user.get("landing_quiz_progress", 0),
-        }
-    finally:
-        neo4j_db.close()
+    user = await neo4j_db.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return {
+        "currentIndex": user.get("landing_quiz_progress", 0),
+    }
 
 @app.get("/check_new_student/{user_id}")
-async def check_new_student(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        progress = neo4j_db.get_quiz_progress(user_id)
-        total_questions = 6  # Set your total number of questions here
-        return {"is_new": progress < total_questions - 1}
-    finally:
-        neo4j_db.close()
+async def check_new_student(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
+    progress = await neo4j_db.get_quiz_progress(user_id)
+    total_questions = 6  # Set your total number of questions here
+    return {"is_new": progress < total_questions - 1}
 
 ####################
 
 @app.post("/upload/pdf", status_code=HTTPStatus.ACCEPTED)
-async def upload_pdf(background_tasks: BackgroundTasks, user_id: str = Body(...), files: List[UploadFile] = File(...)):
+async def upload_pdf(request: Request, background_tasks: BackgroundTasks, user_id: str = Body(...), files: List[UploadFile] = File(...)):
     new_task = Job()
     jobs[new_task.uid] = new_task
     byte_files = await get_file_content(files)
 
     try:
         response_data = []
+        loop = asyncio.get_running_loop()
         for filename, content in byte_files.items():
             # Store the PDF in GridFS
             file_id = await fs.upload_from_stream(
@@ -792,28 +898,28 @@ async def upload_pdf(background_tasks: BackgroundTasks, user_id: str = Body(...)
                         content,
                         metadata={"contentType": "pdf"})
 
-            # Generate thumbnail image from the first page
-            images = convert_from_bytes(content)
-            first_page_image = images[0]
-            img_byte_arr = io.BytesIO()
-            first_page_image.save(img_byte_arr, format="PNG")
-            img_byte_arr.seek(0)
-
-            # Convert image to base64
-            img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-            
-            # Store thumbnail in MongoDB
+            # Thumbnail of the first page only, rendered in its own pool off the event loop
+            thumbnail = await loop.run_in_executor(
+                get_thumbnail_pool(settings.pdf_thumbnail_workers),
+                render_thumbnail,
+                content,
+                settings.pdf_thumbnail_max_size,
+            )
+
+            # Store thumbnail in MongoDB, as binary
             thumbnail_data = {
                 "file_id": str(file_id),
                 "filename": filename,
-                "thumbnail": img_base64
+                "thumbnail": thumbnail,
+                "content_type": "image/png",
+                "etag": hashlib.sha256(thumbnail).hexdigest()[:32],
             }
             await thumbnails_collection.insert_one(thumbnail_data)
 
             response_data.append({
                 "file_id": str(file_id),
                 "filename": filename,
-                "thumbnail": f"data:image/png;base64,{img_base64}"
+                "thumbnail": str(request.url_for("get_pdf_thumbnail", id=str(file_id))),
             })
 
         background_tasks.add_task(save_pdf_to_neo4j, jobs, new_task.uid, byte_files, user_id)
@@ -821,32 +927,74 @@ async def upload_pdf(background_tasks: BackgroundTasks, user_id: str = Body(...)
     except Exception as error:
         return f"Saving pdf fails with error: {error}"
 
-@app.get( "/pdfs", status_code=HTTPStatus.ACCEPTED)
-async def list_pdfs():
-    response_data = []
-
-    async for thumbnail in thumbnails_collection.find():
-        pdf_file_id = thumbnail['file_id']
-        filename = thumbnail['filename']
-        img_base64 = thumbnail['thumbnail']
+@app.get("/pdfs")
+async def list_pdfs(
+    request: Request,
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+):
+    """
+    List uploaded PDFs by `file_id`, one page at a time: metadata plus the URL of
+    the thumbnail, never the image itself.
 
-        # pdf_data = await fs.download_to_stream(pdf_file_id, io.BytesIO())        
-        # pdf_base64 = base64.b64encode(pdf_data.getvalue()).decode('utf-8')
-        
-        response_data.append({
-            "file_id": str(pdf_file_id),
-            "filename": filename,
-            "thumbnail": f"data:image/png;base64,{img_base64}",
-            # "pdf_data": f"data:application/pdf;base64,{pdf_base64}"
-        })
+    Pass the `X-Next-Cursor` header of a page as `after` to fetch the next one.
+    Pages carry an `ETag`; a repeated request with `If-None-Match` gets a 304.
+    """
+    try:
+        position = decode_cursor(after, 1)[0] if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # decoded JSON goes into a Mongo filter, only a plain file id is a position
+    if position is not None and not isinstance(position, str):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {after}")
+    query = {"file_id": {"$gt": position}} if position else {}
+    # projection + the `file_id` index: the thumbnail bytes are never read
+    cursor = thumbnails_collection.find(query, {"_id": 0, "file_id": 1, "filename": 1}).sort("file_id", 1).limit(limit + 1)
+    rows = await cursor.to_list(limit + 1)
+    next_after = rows[limit - 1]["file_id"] if len(rows) > limit else None
+    rows = rows[:limit]
+
+    response_data = [{
+        "file_id": str(row["file_id"]),
+        "filename": row["filename"],
+        "thumbnail": str(request.url_for("get_pdf_thumbnail", id=str(row["file_id"]))),
+    } for row in rows]
 
     if not response_data:
         print("No thumbnails or PDFs found.")
-        # raise HTTPException(status_code=404, detail="No thumbnails or PDFs found.")
-        
 
+    page_key = json.dumps([[row["file_id"], row["filename"]] for row in response_data] + [next_after])
+    etag = f'"{hashlib.sha256(page_key.encode("utf-8")).hexdigest()[:32]}"'
+    # `no-cache`: browsers keep the page but revalidate it on every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_after is not None:
+        headers["X-Next-Cursor"] = encode_cursor(next_after)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
     return response_data
 
+@app.get("/pdfs/{id}/thumbnail")
+async def get_pdf_thumbnail(id: str, request: Request):
+    """
+    The first-page PNG of a PDF. A file id never gets another thumbnail, so
+    clients may cache it for a day and revalidate with `If-None-Match`.
+    """
+    thumbnail = await thumbnails_collection.find_one({"file_id": id})
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail=f"Thumbnail of {id} not found")
+
+    image = thumbnail["thumbnail"]
+    if isinstance(image, str):
+        # uploaded before thumbnails were stored as binary
+        image = base64.b64decode(image)
+    etag = f'"{thumbnail.get("etag") or hashlib.sha256(image).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content=bytes(image), media_type=thumbnail.get("content_type", "image/png"), headers=headers)
+
 @app.delete( "/pdfs/{id}", response_description="Delete a pdf in database")
 async def delete_pdf(id: str):
     """
@@ -883,56 +1031,50 @@ async def load_web(background_tasks: BackgroundTasks, request: LoadWebDataReques
     # "/chat_histories/{SessionId}/{QuestionId}", # Should add QuestionId for more specific chat history
     response_description="List all chat histories",
 )
-async def list_chat_histories(SessionId: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    chat_histories = neo4j_db.get_all_chat_histories(SessionId)
-    if not chat_histories:
+async def list_chat_histories(
+    SessionId: str,
+    response: Response,
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db),
+):
+    """
+    Page through a session's chat history, oldest message first within a page.
+
+    Pass the `X-Next-Cursor` header of a page as `before` to fetch the older one.
+    """
+    page = await neo4j_db.get_chat_history_page(SessionId, before=before, limit=limit)
+    if not page["messages"]:
         raise HTTPException(status_code=404, detail="No chat histories found")
-    return chat_histories
+    if page["next_before"] is not None:
+        response.headers["X-Next-Cursor"] = str(page["next_before"])
+    return page["messages"]
 
 # Also delete all related chat histories for a session
-@app.delete("/chat_histories/{SessionId}", response_description="Delete a session's chat histories")
-async def delete_chat_histories(SessionId: str):
+@app.delete("/chat_histories/{SessionId}", response_description="Delete a session's chat histories", status_code=HTTPStatus.ACCEPTED)
+async def delete_chat_histories(SessionId: str, background_tasks: BackgroundTasks):
     """
-    Remove a session's chat histories from the database.
-    Returns success even if no histories were found to delete.
+    Remove a session's chat histories from the database in the background, in batches.
+    Succeeds even if no histories exist. Poll `/bgtask/{uid}/status` for progress.
     """
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        delete_result = neo4j_db.delete_chat_history(SessionId)
-        
-        if delete_result is None:
-            # Log that no chat histories were found
-            print(f"No chat histories found for session {SessionId}")
-            # Still return success since the end state is what we wanted
-            return Response(
-                status_code=HTTPStatus.OK,
-                content=json.dumps({"message": "No chat histories found to delete"})
-            )
-        
-        return Response(
-            status_code=HTTPStatus.OK,
-            content=json.dumps({"message": "Chat histories deleted successfully"})
-        )
-        
-    except Exception as e:
-        # Log any unexpected errors
-        print(f"Error deleting chat histories for session {SessionId}: {str(e)}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Error deleting chat histories: {str(e)}"
-        )
-    finally:
-        neo4j_db.close()
-
-@app.get( "/chat_histories/user/{user_id}")
-async def list_chat_histories_for_user(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    chat_histories = neo4j_db.get_all_chat_histories_for_user(user_id)
-    neo4j_db.close()
-    if not chat_histories:
+    new_task = Job()
+    jobs[new_task.uid] = new_task
+    background_tasks.add_task(delete_chat_history_in_batches, jobs, new_task.uid, SessionId)
+    return new_task
+
+@app.get( "/chat_histories/user/{user_id}/summary")
+async def list_chat_history_summaries_for_user(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db),
+):
+    """
+    List the newest message of each of a user's sessions, newest session first.
+    """
+    summaries = await neo4j_db.get_chat_history_summaries_for_user(user_id, limit=limit)
+    if not summaries:
         raise HTTPException(status_code=404, detail="No chat histories found for user")
-    return chat_histories
+    return summaries
 
 @app.get( "/web_files/",
     response_description="List all web files",
@@ -948,15 +1090,13 @@ async def list_web_files():
     return WebfileModelCollection(web_files=await file_collection.find().to_list(1000))
 
 @app.get("/streak-reward/{user_id}")
-async def get_streak_reward(user_id: str):
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
+async def get_streak_reward(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     query = """
     MATCH (u:User {id: $user_id})-[:COMPLETED]->(q:Quiz)
     RETURN count(q) as quiz_count
     """
     params = {'user_id': user_id}
-    result = neo4j_db.query(query, params)
-    neo4j_db.close()
+    result = await neo4j_db.query(query, params)
 
     if result:
         return {"quiz_count": result[0]['quiz_count']}
@@ -964,22 +1104,18 @@ async def get_streak_reward(user_id: str):
         raise HTTPException(status_code=404, detail="User not found or no quizzes completed")
 
 @app.get("/users/{user_id}/avatar")
-async def get_user_avatar(user_id: str):
+async def get_user_avatar(user_id: str, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     """Retrieve the avatar for a specific user."""
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        avatar = neo4j_db.get_user_avatar(user_id)
-        if avatar is None:
-            raise HTTPException(status_code=404, detail="Avatar not found")
-        return {"avatar": avatar}
-    finally:
-        neo4j_db.close()
+    avatar = await neo4j_db.get_user_avatar(user_id)
+    if avatar is None:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    return {"avatar": avatar}
 
 @app.post("/users/{user_id}/avatar")
-async def update_user_avatar(user_id: str, payload: dict):
+async def update_user_avatar(user_id: str, payload: dict, neo4j_db: AsyncNeo4jDatabase = Depends(get_neo4j_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
     
@@ -987,11 +1123,59 @@ async def update_user_avatar(user_id: str, payload: dict):
     if not avatar:
         raise HTTPException(status_code=400, detail="Avatar is required")
 
-    neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-    try:
-        success = neo4j_db.update_user_avatar(user_id, avatar)
-        if not success:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"message": "Avatar updated successfully"}
-    finally:
-        neo4j_db.close()
+    success = await neo4j_db.update_user_avatar(user_id, avatar)
+    if not success:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "Avatar updated successfully"}
+
+@app.get("/metrics/cypher")
+async def get_cypher_metrics():
+    """
+    Aggregated timings of every Cypher query run through the instrumented drivers,
+    the most expensive (total wall time) first.
+    """
+    return {
+        "profile_sample_rate": query_metrics.profile_sample_rate,
+        "slow_query_ms": query_metrics.slow_query_ms,
+        "queries": query_metrics.snapshot(),
+        "write_buffer": write_buffer.stats(),
+    }
+
+@app.delete("/metrics/cypher")
+async def reset_cypher_metrics():
+    query_metrics.reset()
+    return {"message": "Cypher metrics reset"}
+
+@app.get("/metrics/user-cache")
+async def get_user_cache_metrics():
+    return user_cache.stats()
+
+@app.get("/metrics/generation")
+async def get_generation_metrics():
+    return {
+        "streams": generation_metrics.snapshot(),
+        "generate_task": list(generate_task_runs),
+        "question_pool": question_pool.stats(),
+    }
+
+@app.get("/metrics/llm")
+async def get_llm_metrics():
+    return llm_scheduler.stats()
+
+@app.get("/metrics/feedback-cache")
+async def get_feedback_cache_metrics():
+    return feedback_cache.stats()
+
+@app.get("/metrics/embedding-cache")
+async def get_embedding_cache_metrics():
+    return await asyncio.to_thread(embedding_cache.stats)
+
+@app.delete("/embedding-cache")
+async def invalidate_embedding_cache(model: Optional[str] = None):
+    await asyncio.to_thread(embedding_cache.invalidate, model)
+    return {"message": f"Embedding cache cleared for {model or 'all models'}"}
+
+@app.get("/metrics/embedding-batcher")
+async def get_embedding_batcher_metrics():
+    # `embeddings` is CachedEmbeddings(MicroBatchingEmbeddings(...)), see `load_embedding_model`
+    return embeddings.embeddings.stats()
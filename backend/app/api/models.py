@@ -26,6 +26,7 @@ class Quiz_submission(BaseModel):
     question: str
     answer: str # user's answer (need to check and provide feedback to user)
     session: Json[Any] = None
+    use_cache: bool = True # False: always ask the LLM, skip the feedback cache
 
 class StudentCheckResponse(BaseModel):
     is_new: bool
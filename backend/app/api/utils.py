@@ -1,42 +1,263 @@
-from threading import Thread
-from queue import Empty
-from collections.abc import Generator
+import re
+import json
+import time
+import queue
+import base64
+import asyncio
+import logging
+import argparse
+import threading
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any, List, Optional
 
-from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.callbacks import AsyncCallbackHandler
+from starlette.requests import Request
 
-class QueueCallback(BaseCallbackHandler):
-    """Callback handler for streaming LLM responses to a queue."""
+def encode_cursor(*values) -> str:
+    """Opaque, URL-safe `X-Next-Cursor` value of a keyset position."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
 
-    def __init__(self, q):
+def decode_cursor(cursor: str, size: int) -> list:
+    """The `size` values of an `encode_cursor` cursor; raises ValueError on anything else."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches `etag`: `*`, or a comma-separated
+    list of entity tags compared weakly (a `W/` prefix is ignored on either side).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _ENTITY_TAG.match(etag.strip())
+    opaque = opaque.group(1) if opaque else etag.strip()
+    return opaque in _ENTITY_TAG.findall(if_none_match)
+
+
+class AsyncQueueCallback(AsyncCallbackHandler):
+    """Callback handler for streaming LLM tokens to an `asyncio.Queue`."""
+
+    def __init__(self, q: asyncio.Queue):
         self.q = q
 
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.q.put(token)
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.q.put_nowait(token)
 
-    def on_llm_end(self, *args, **kwargs) -> None:
-        return self.q.empty()
 
+class GenerationMetrics:
+    """
+    Per-endpoint counters of streamed generations. A cancelled generation "saves"
+    the tokens it did not produce, estimated from the average length of the
+    completed ones.
+    """
 
-def stream(cb, q) -> Generator:
-    job_done = object()
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, name):
+        return self._stats.setdefault(name, {
+            "started": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "tokens_streamed": 0,
+            "completed_tokens": 0,
+            "estimated_tokens_saved": 0,
+        })
+
+    def started(self, name):
+        with self._lock:
+            self._entry(name)["started"] += 1
+
+    def finished(self, name, outcome, tokens):
+        with self._lock:
+            stats = self._entry(name)
+            stats[outcome] += 1
+            stats["tokens_streamed"] += tokens
+            if outcome == "completed":
+                stats["completed_tokens"] += tokens
+            elif outcome == "cancelled" and stats["completed"]:
+                average = stats["completed_tokens"] / stats["completed"]
+                stats["estimated_tokens_saved"] += max(0, round(average - tokens))
 
-    def task():
-        x = cb()
-        q.put(job_done)
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
 
-    t = Thread(target=task)
-    t.start()
 
-    content = ""
+generation_metrics = GenerationMetrics()
 
-    # Get each new token from the queue and yield for our generator
-    while True:
+
+async def _cancel_on_disconnect(request: Request, task: asyncio.Task, interval: float = 0.5):
+    while not task.done():
+        if await request.is_disconnected():
+            task.cancel()
+            return
+        await asyncio.sleep(interval)
+
+
+async def astream(
+    run: Callable[[List[Any]], Awaitable[Any]],
+    name: str = "stream",
+    request: Optional[Request] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Run `run(callbacks)` as a task on the event loop and yield the LLM tokens it
+    produces as they arrive. No thread, no polling: the generator wakes up on
+    each token and ends as soon as `run` returns (re-raising its error, if any).
+
+    If the client goes away - the response closes this generator, or `request`
+    reports a disconnect - the task is cancelled, which aborts the model call and
+    any LangGraph workflow in it before later nodes (e.g. saving) run.
+    """
+    q = asyncio.Queue()
+    job_done = object()
+    tokens = 0
+    outcome = "cancelled"
+
+    async def task():
         try:
-            next_token = q.get(True, timeout=1)
-            if next_token is job_done:
+            await run([AsyncQueueCallback(q)])
+        finally:
+            q.put_nowait(job_done)
+
+    generation_metrics.started(name)
+    producer = asyncio.create_task(task())
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, producer)) if request is not None else None
+    try:
+        while True:
+            token = await q.get()
+            if token is job_done:
                 break
-            content += next_token
-            yield next_token, content
-        except Empty:
-            continue
+            tokens += 1
+            yield token
+        try:
+            await producer
+        except asyncio.CancelledError:
+            if producer.cancelled():
+                # cancelled by the disconnect watcher, end the response quietly
+                return
+            raise
+        outcome = "completed"
+    except Exception:
+        outcome = "failed"
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except BaseException:
+                pass
+        if outcome == "cancelled":
+            logging.info(f"{name}: client disconnected, generation cancelled after {tokens} tokens")
+        generation_metrics.finished(name, outcome, tokens)
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def benchmark_streams(streams=64, tokens=50, first_token_ms=200.0, token_ms=20.0):
+    """
+    `streams` concurrent generations of a simulated model (`first_token_ms` to the
+    first token, then one token every `token_ms`), streamed the way the endpoints
+    did before `astream` - the chain in its own thread feeding a `queue.Queue`,
+    iterated by `StreamingResponse` in the threadpool - and through `astream`.
+    Reports time-to-first-token p50/p99 and the threads each stream adds.
+
+    `python -m api.utils [--streams 64] [--tokens 50] [--first-token-ms 200] [--token-ms 20]`
+    """
+    from starlette.concurrency import iterate_in_threadpool
+
+    def threaded_stream():
+        # the former `stream(cb, q)`
+        q = queue.Queue()
+        job_done = object()
+
+        def task():
+            time.sleep(first_token_ms / 1000)
+            for i in range(tokens):
+                q.put(f"t{i} ")
+                time.sleep(token_ms / 1000)
+            q.put(job_done)
+
+        threading.Thread(target=task).start()
+        while True:
+            try:
+                token = q.get(True, timeout=1)
+            except queue.Empty:
+                continue
+            if token is job_done:
+                break
+            yield token
+
+    async def simulated_model(callbacks):
+        await asyncio.sleep(first_token_ms / 1000)
+        for i in range(tokens):
+            for callback in callbacks:
+                await callback.on_llm_new_token(f"t{i} ")
+            await asyncio.sleep(token_ms / 1000)
+
+    async def consume(iterator):
+        started = time.perf_counter()
+        first = None
+        async for _ in iterator:
+            if first is None:
+                first = time.perf_counter() - started
+        return first
+
+    async def run(make_iterator):
+        baseline = threading.active_count()
+        peak = baseline
+        done = asyncio.Event()
+
+        async def sample_threads():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        sampler = asyncio.create_task(sample_threads())
+        started = time.perf_counter()
+        ttfts = await asyncio.gather(*(consume(make_iterator()) for _ in range(streams)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+        return {
+            "ttft_p50_ms": round(_percentile(ttfts, 0.50) * 1000, 1),
+            "ttft_p99_ms": round(_percentile(ttfts, 0.99) * 1000, 1),
+            "seconds": round(elapsed, 3),
+            "peak_extra_threads": peak - baseline,
+            "threads_per_stream": round((peak - baseline) / streams, 2),
+        }
+
+    return {
+        "thread_and_queue": await run(lambda: iterate_in_threadpool(threaded_stream())),
+        "astream": await run(lambda: astream(simulated_model, name="benchmark")),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-token and threads per stream, thread + queue vs. astream")
+    parser.add_argument("--streams", type=int, default=64)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    args = parser.parse_args()
 
+    results = asyncio.run(benchmark_streams(args.streams, args.tokens, args.first_token_ms, args.token_ms))
+    for name, result in results.items():
+        print(f"{name:>16}: {result}")
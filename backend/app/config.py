@@ -12,6 +12,52 @@ class Settings(BaseSettings):
     embedding_model: str = Field('default_model', env='EMBEDDING_MODEL')
     llm: str = Field(..., env='LLM')
 
+    # Neo4j driver connection pool (shared by every request in the process)
+    neo4j_max_connection_pool_size: int = Field(100, env='NEO4J_MAX_CONNECTION_POOL_SIZE')
+    neo4j_connection_acquisition_timeout: float = Field(60.0, env='NEO4J_CONNECTION_ACQUISITION_TIMEOUT')
+    neo4j_max_connection_lifetime: float = Field(3600.0, env='NEO4J_MAX_CONNECTION_LIFETIME')
+    # Nodes removed per transaction by the batched session / chat history deletion
+    neo4j_delete_batch_size: int = Field(500, env='NEO4J_DELETE_BATCH_SIZE')
+    # Cypher instrumentation, see db/instrumentation.py (0.01 = PROFILE 1% of queries)
+    cypher_profile_sample_rate: float = Field(0.0, env='CYPHER_PROFILE_SAMPLE_RATE')
+    cypher_slow_query_ms: float = Field(500.0, env='CYPHER_SLOW_QUERY_MS')
+    # User node cache, see db/user_cache.py (ttl 0 disables it; backend 'memory' or 'mongo')
+    user_cache_ttl: float = Field(60.0, env='USER_CACHE_TTL')
+    user_cache_max_entries: int = Field(1024, env='USER_CACHE_MAX_ENTRIES')
+    user_cache_backend: str = Field('memory', env='USER_CACHE_BACKEND')
+    # Write-behind buffer for question nodes / answers, see db/write_buffer.py
+    neo4j_write_buffer_window_ms: float = Field(50.0, env='NEO4J_WRITE_BUFFER_WINDOW_MS')
+    neo4j_write_buffer_max_batch: int = Field(500, env='NEO4J_WRITE_BUFFER_MAX_BATCH')
+    # LLM scheduler, see services/llm_scheduler.py
+    llm_max_concurrency: int = Field(2, env='LLM_MAX_CONCURRENCY')
+    llm_max_queue_depth: int = Field(32, env='LLM_MAX_QUEUE_DEPTH')
+    # generate -> verify loop of `generate_task`, see services/chains.py
+    generate_task_max_attempts: int = Field(3, env='GENERATE_TASK_MAX_ATTEMPTS')
+    generate_task_candidates: int = Field(1, env='GENERATE_TASK_CANDIDATES')
+    # pre-generated quiz questions, see services/question_pool.py (high water 0 disables)
+    question_pool_low_water: int = Field(1, env='QUESTION_POOL_LOW_WATER')
+    question_pool_high_water: int = Field(3, env='QUESTION_POOL_HIGH_WATER')
+    question_pool_max_workers: int = Field(1, env='QUESTION_POOL_MAX_WORKERS')
+    # quiz feedback cache, see services/feedback_cache.py (ttl 0 disables)
+    feedback_cache_ttl: float = Field(3600.0, env='FEEDBACK_CACHE_TTL')
+    feedback_cache_max_entries: int = Field(2048, env='FEEDBACK_CACHE_MAX_ENTRIES')
+    # embedding cache, see services/embedding_cache.py (max entries 0 disables)
+    embedding_cache_backend: str = Field('memory', env='EMBEDDING_CACHE_BACKEND')
+    embedding_cache_max_entries: int = Field(10000, env='EMBEDDING_CACHE_MAX_ENTRIES')
+    embedding_cache_purge_stale: bool = Field(False, env='EMBEDDING_CACHE_PURGE_STALE')
+    # batched embedding of imports, see services/background_task.py
+    embedding_batch_size: int = Field(32, env='EMBEDDING_BATCH_SIZE')
+    embedding_max_in_flight: int = Field(2, env='EMBEDDING_MAX_IN_FLIGHT')
+    # micro-batching of concurrent query embeddings, see services/embedding_batcher.py
+    embedding_batch_window_ms: float = Field(5.0, env='EMBEDDING_BATCH_WINDOW_MS')
+    embedding_batch_max_size: int = Field(16, env='EMBEDDING_BATCH_MAX_SIZE')
+    embedding_batch_timeout: float = Field(60.0, env='EMBEDDING_BATCH_TIMEOUT')
+    # PDF text extraction process pool, see services/pdf_extract.py (0 workers = all cores)
+    pdf_extract_workers: int = Field(0, env='PDF_EXTRACT_WORKERS')
+    pdf_extract_pages_per_task: int = Field(32, env='PDF_EXTRACT_PAGES_PER_TASK')
+    pdf_thumbnail_max_size: int = Field(320, env='PDF_THUMBNAIL_MAX_SIZE')
+    pdf_thumbnail_workers: int = Field(2, env='PDF_THUMBNAIL_WORKERS')
+
     mongodb_: str = Field(default='my_db')
 
 
@@ -0,0 +1,685 @@
+from neo4j import AsyncGraphDatabase
+from db.instrumentation import AsyncInstrumentedDriver
+from db.user_cache import user_cache, FIND_USER_QUERY
+from db.queries import (
+    USER_FIELD_PATTERN, users_query, NUMERIC_USER_IDS_START,
+    FIND_SESSION_QUERY, LATEST_AI_SESSION_QUERY, LATEST_QUIZ_SESSION_QUERY,
+    NEWEST_AI_SESSION_QUERY, NEWEST_QUIZ_SESSION_QUERY, QUIZ_SESSIONS_FOR_USER_QUERY,
+    NEEDS_MESSAGE_BACKFILL_QUERY, CHAT_HISTORY_PAGE_QUERY, LEGACY_CHAT_HISTORY_PAGE_QUERY,
+    CHAT_HISTORY_SUMMARIES_QUERY, CLAIM_POOLED_QUESTION_QUERY, update_user_query,
+    USER_RELATIONSHIPS_QUERY, CREATE_LANDING_SESSION_QUERY, CREATE_QUESTIONS_QUERY, CREATE_ANSWERS_QUERY,
+    UPDATE_CURRENT_QUESTION_COUNT_QUERY,
+)
+import time
+import uuid
+import asyncio
+import logging
+
+'''
+async_neo4j.py [Async Database Operation]
+
+Same method surface as `Neo4jDatabase` (db/neo4j.py) but built on
+`neo4j.AsyncGraphDatabase`, so Cypher round-trips from `async def` routes
+no longer block the event loop.
+
+[ Driver ]
+0.  `init_async_driver`:        Creates the process-wide pooled async driver, instrumented (see db/instrumentation.py).
+0.  `get_async_driver`:         Returns the process-wide pooled async driver.
+0.  `close_async_driver`:       Closes the process-wide pooled async driver.
+
+1.  `__init__`:                 Wraps a shared async driver, or opens a private one from uri/user/password.
+2.  `close`:                    Closes the database connection (only if it owns the driver).
+3.  `query`:                    (Read/Write) Runs an ad-hoc Cypher query and returns the records as dicts.
+
+[ User Anw Node ]
+4.  `save_answer`:              (Creates) Saves a user's answer to a question in the database.
+4.  `save_answers`:             (Creates) Saves many answers of a user in one `UNWIND` transaction.
+
+[ User Node ]
+5.  `update_user_model`:        (Updates) properties of a user node.
+6.  `create_landing_session`:   (Creates) the landing session of a newly signed up user.
+7.  `get_users_page`:           (Read) users with their outgoing user relationships, keyset paginated by id (after, limit, fields).
+7.  `stream_users`:             (Read) the same users, yielded one by one from the result cursor.
+8.  `get_user_by_id`:           (Read) retrieve a user node by its ID, through `user_cache` (db/user_cache.py).
+9.  `get_user_avatar` / `update_user_avatar`
+10. `get_quiz_progress` / `update_quiz_progress`
+
+[ User Relationship ]
+11. `create_user_relationship` / `get_user_relationships` / `delete_user_relationship`
+
+[ Chat History Node ]
+12. `get_all_chat_histories`:   (Read) Fetches the latest chat history for a session.
+13. `get_chat_history_page`:    (Read) One cursor-paginated page of a session's history via the `seq` index.
+13. `get_chat_history_summaries_for_user`: (Read) The newest message of each session of a user.
+
+Sessions and chat histories are deleted by background jobs (services/background_task.py)
+through the sync `Neo4jDatabase`.
+
+[ Session Node ]
+15. `get_AIsession` / `get_QUIZsession`: (Read) Retrieves or creates a user AI / QUIZ session.
+16. `create_session`:           (Creates) a new Quiz session based on user prefence.
+17. `update_session_name` / `update_current_question_count`
+18. `get_quizsessions_for_user` / `get_quizsessions_for_sessionid` / `get_sessions_for_user`
+
+[ Question Node ]
+19. `create_question_node`:     (Creates) a question node linked to a session.
+19. `create_question_nodes`:    (Creates) many question nodes of a session in one `UNWIND` transaction.
+20. `claim_pooled_question`:    (Updates) Hands out the oldest pre-generated (`pooled`) question of a session.
+20. `get_question_pool_state`:  (Read) Pooled / served question counts of a session.
+
+[ Benchmark ]
+21. `benchmark_get_quizsession`: N concurrent `/get_QUIZsession` lookups, sync vs. async driver, in round-trips.
+                                `python -m db.async_neo4j bench <user_id> [calls]`
+
+'''
+
+_async_driver = None
+
+def create_async_driver(settings):
+    return AsyncGraphDatabase.driver(
+        settings.neo4j_uri,
+        auth=(settings.neo4j_username, settings.neo4j_password),
+        max_connection_pool_size=settings.neo4j_max_connection_pool_size,
+        connection_acquisition_timeout=settings.neo4j_connection_acquisition_timeout,
+        max_connection_lifetime=settings.neo4j_max_connection_lifetime,
+    )
+
+async def init_async_driver(settings):
+    global _async_driver
+    if _async_driver is None:
+        _async_driver = AsyncInstrumentedDriver(create_async_driver(settings))
+        await _async_driver.verify_connectivity()
+    return _async_driver
+
+def get_async_driver():
+    if _async_driver is None:
+        raise RuntimeError("Async Neo4j driver is not initialised, call init_async_driver() first")
+    return _async_driver
+
+async def close_async_driver():
+    global _async_driver
+    if _async_driver is not None:
+        await _async_driver.close()
+        _async_driver = None
+
+class AsyncNeo4jDatabase:
+    def __init__(self, uri=None, user=None, password=None, driver=None):
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else AsyncGraphDatabase.driver(uri, auth=(user, password))
+
+    async def close(self):
+        if self._owns_driver:
+            await self.driver.close()
+
+    async def query(self, query, params=None):
+        async with self.driver.session() as session:
+            result = await session.run(query, params or {})
+            return await result.data()
+
+    async def save_answer(self, user_id, question, answer, is_correct):
+        await self.save_answers(user_id, [{"question": question, "answer": answer, "is_correct": is_correct}])
+
+    async def save_answers(self, user_id, answers):
+        """
+        Save many answers of a user in one transaction.
+        `answers`: [{"question", "answer", "is_correct"}, ...]
+        """
+        rows = [{**answer, "user_id": user_id} for answer in answers]
+        if rows:
+            async with self.driver.session() as session:
+                await session.execute_write(self._create_answer_records, rows)
+
+    @staticmethod
+    async def _create_answer_records(tx, answers):
+        await tx.run(CREATE_ANSWERS_QUERY, answers=answers)
+
+    async def update_user_model(self, user_id, properties, username=None):
+        async with self.driver.session() as session:
+            await session.execute_write(self._update_user_record, user_id, properties, username)
+        await user_cache.ainvalidate(user_id)
+
+    @staticmethod
+    async def _update_user_record(tx, user_id, properties, username=None):
+        query = update_user_query(properties, username=bool(username))
+        properties['user_id'] = user_id
+        if username:
+            properties['username'] = username
+        await tx.run(query, **properties)
+
+    async def create_landing_session(self, user_id):
+        async with self.driver.session() as session:
+            await session.execute_write(self._create_landing_session, user_id)
+
+    @staticmethod
+    async def _create_landing_session(tx, user_id):
+        await tx.run(CREATE_LANDING_SESSION_QUERY, user_id=user_id, session_id=user_id)
+
+    ###### User #####
+    async def get_users_page(self, after=None, limit=100, fields=None):
+        """
+        Users after the id `after` (None for the first page): string ids first,
+        then integer ids, so a page can span the end of one range and the start
+        of the next.
+        """
+        users = []
+        async with self.driver.session() as session:
+            if after is None or isinstance(after, str):
+                users = await session.execute_read(self._find_users_page, after or "", limit, fields)
+                after = NUMERIC_USER_IDS_START
+            if len(users) < limit:
+                users += await session.execute_read(self._find_users_page, after, limit - len(users), fields)
+        return users
+
+    @staticmethod
+    async def _find_users_page(tx, after, limit, fields):
+        query = users_query(fields, limit)
+        result = await tx.run(query, after=after, limit=limit)
+        return [record["u"] async for record in result]
+
+    async def stream_users(self, fields=None):
+        """
+        Yield users one at a time straight off the result cursor, so memory stays
+        flat however many users there are.
+        """
+        query = users_query(fields)
+        async with self.driver.session() as session:
+            for after in ("", NUMERIC_USER_IDS_START):
+                result = await session.run(query, after=after)
+                async for record in result:
+                    yield record["u"]
+
+    async def get_user_by_id(self, user_id):
+        user = await user_cache.aget(user_id)
+        if user is None:
+            async with self.driver.session() as session:
+                user = await session.execute_read(self._find_user_by_id, user_id)
+            await user_cache.aset(user_id, user)
+        return user
+
+    @staticmethod
+    async def _find_user_by_id(tx, user_id):
+        result = await tx.run(FIND_USER_QUERY, user_id=user_id)
+        record = await result.single()
+        return record["u"] if record else None
+
+    async def get_user_avatar(self, user_id: str) -> str:
+        async with self.driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (u:User {id: $user_id})
+                RETURN u.avatar AS avatar
+                """,
+                user_id=user_id
+            )
+            record = await result.single()
+            return record["avatar"] if record else None
+
+    async def update_user_avatar(self, user_id: str, avatar: str) -> bool:
+        async with self.driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (u:User {id: $user_id})
+                SET u.avatar = $avatar
+                RETURN u
+                """,
+                user_id=user_id,
+                avatar=avatar
+            )
+            updated = bool(await result.single())
+        await user_cache.ainvalidate(user_id)
+        return updated
+
+    async def update_quiz_progress(self, user_id: str, current_index: int) -> bool:
+        """Updates the quiz progress for a user"""
+        query = """
+        MATCH (u:User {id: $user_id})
+        SET u.landing_quiz_progress = $current_index
+        RETURN u
+        """
+        async with self.driver.session() as session:
+            result = await session.run(query, user_id=user_id, current_index=current_index)
+            updated = bool(await result.single())
+        await user_cache.ainvalidate(user_id)
+        return updated
+
+    async def get_quiz_progress(self, user_id: str) -> int:
+        """Gets the current quiz progress for a user"""
+        query = """
+        MATCH (u:User {id: $user_id})
+        RETURN u.landing_quiz_progress AS progress
+        """
+        async with self.driver.session() as session:
+            result = await session.run(query, user_id=user_id)
+            record = await result.single()
+            return record["progress"] if record and record["progress"] is not None else 0
+
+    async def create_user_relationship(self, from_user_id, to_user_id, relationship_type):
+        async with self.driver.session() as session:
+            result = await session.execute_write(
+                self._create_relationship,
+                from_user_id,
+                to_user_id,
+                relationship_type
+            )
+        # both endpoints: a cached user must not hold a stale view of a relationship it is part of
+        await user_cache.ainvalidate(from_user_id, to_user_id)
+        return result
+
+    @staticmethod
+    async def _create_relationship(tx, from_user_id, to_user_id, relationship_type):
+        # Validate that both users exist first
+        validation_query = """
+        MATCH (u1:User {id: $from_id})
+        MATCH (u2:User {id: $to_id})
+        RETURN u1, u2
+        """
+        validation_result = await tx.run(validation_query, from_id=from_user_id, to_id=to_user_id)
+        validation_record = await validation_result.single()
+
+        if not validation_record:
+            return None
+
+        # Create relationship if validation passed
+        query = """
+        MATCH (u1:User {id: $from_id})
+        MATCH (u2:User {id: $to_id})
+        WHERE u1 <> u2
+        MERGE (u1)-[r:%s]->(u2)
+        RETURN {
+            from_user: u1.username,
+            to_user: u2.username,
+            relationship_type: type(r)
+        } as result
+        """ % relationship_type
+
+        result = await tx.run(query, from_id=from_user_id, to_id=to_user_id)
+        record = await result.single()
+        return record["result"] if record else None
+
+    async def get_user_relationships(self, user_id):
+        async with self.driver.session() as session:
+            return await session.execute_read(self._get_relationships, user_id)
+
+    @staticmethod
+    async def _get_relationships(tx, user_id):
+        result = await tx.run(USER_RELATIONSHIPS_QUERY, user_id=user_id)
+        return [record["relationship"] async for record in result]
+
+    async def delete_user_relationship(self, from_user_id, to_user_id, relationship_type):
+        async with self.driver.session() as session:
+            result = await session.execute_write(
+                self._delete_relationship,
+                from_user_id,
+                to_user_id,
+                relationship_type
+            )
+        await user_cache.ainvalidate(from_user_id, to_user_id)
+        return result
+
+    @staticmethod
+    async def _delete_relationship(tx, from_user_id, to_user_id, relationship_type):
+        query = """
+        MATCH (u1:User {id: $from_id})-[r:%s]->(u2:User {id: $to_id})
+        DELETE r
+        RETURN {
+            from_user: u1.username,
+            to_user: u2.username,
+            relationship_type: type(r)
+        } as result
+        """ % relationship_type
+
+        result = await tx.run(query, from_id=from_user_id, to_id=to_user_id)
+        record = await result.single()
+        return record["result"] if record else None
+
+    async def get_all_chat_histories(self, session_id):
+        async with self.driver.session() as session:
+            query = """
+            MATCH (s:Session)-[:LAST_MESSAGE]->(last_message)
+            WHERE s.id = $session_id
+            WITH last_message
+            MATCH p=(last_message)<-[:NEXT*0..6]-(previous_messages)
+            WITH p, length(p) AS path_length
+            ORDER BY path_length DESC
+            LIMIT 1
+            UNWIND reverse(nodes(p)) AS node
+            RETURN {data: {content: node.content}, type: node.type} AS result
+            """
+            result = await session.run(query, session_id=session_id)
+            return [record["result"] async for record in result]
+
+    async def get_chat_history_page(self, session_id, before=None, limit=20):
+        """
+        One page of a session's chat history, oldest first.
+
+        Reads at most `limit` messages through the `(session_id, seq)` index no
+        matter how long the conversation is. `before` is the `seq` cursor
+        returned as `next_before` by the previous (newer) page.
+        Sessions written before messages were numbered only get their newest
+        page until `python -m db.schema apply` has backfilled them.
+        """
+        async with self.driver.session() as session:
+            if await session.execute_read(self._needs_message_backfill, session_id):
+                if before is not None:
+                    return {"messages": [], "next_before": None}
+                messages = await session.execute_read(self._find_legacy_chat_history_page, session_id, limit)
+                return {"messages": messages, "next_before": None}
+            messages = await session.execute_read(self._find_chat_history_page, session_id, before, limit)
+
+        next_before = messages[0]["seq"] if len(messages) == limit else None
+        return {
+            "messages": [message["result"] for message in messages],
+            "next_before": next_before,
+        }
+
+    @staticmethod
+    async def _needs_message_backfill(tx, session_id):
+        result = await tx.run(NEEDS_MESSAGE_BACKFILL_QUERY, session_id=session_id)
+        record = await result.single()
+        return bool(record and record["needs_backfill"])
+
+    @staticmethod
+    async def _find_legacy_chat_history_page(tx, session_id, limit):
+        result = await tx.run(LEGACY_CHAT_HISTORY_PAGE_QUERY % (limit - 1), session_id=session_id)
+        return [record["result"] async for record in result]
+
+    @staticmethod
+    async def _find_chat_history_page(tx, session_id, before, limit):
+        result = await tx.run(CHAT_HISTORY_PAGE_QUERY, session_id=session_id, before=before, limit=limit)
+        return list(reversed(await result.data()))
+
+    async def get_chat_history_summaries_for_user(self, user_id, limit=50):
+        """Session heads only: the newest message of each session, never the whole chain."""
+        async with self.driver.session() as session:
+            # sessions written before messages were numbered have no `message_count`
+            # until `python -m db.schema apply` has backfilled them
+            return await session.execute_read(self._find_chat_history_summaries, user_id, limit)
+
+    @staticmethod
+    async def _find_chat_history_summaries(tx, user_id, limit):
+        result = await tx.run(CHAT_HISTORY_SUMMARIES_QUERY, user_id=user_id, limit=limit)
+        return await result.data()
+
+#####
+
+    async def get_AIsession(self, user_id):
+        async with self.driver.session() as session:
+            existing_sessions = await session.execute_read(self._get_latest_user_aisession, user_id)
+
+            if existing_sessions:
+                # If an existing session is found, use the latest session
+                session_id = existing_sessions["s"]["id"]
+                return {
+                    "message": "Latest session already exists for user",
+                    "user_id": user_id,
+                    "session_id": session_id
+                }
+            else:
+                # If no session exists, create a new session
+                session_id = await session.execute_write(self._create_user_session, user_id, "AI Chat", 0, [], [], None, None)
+                return {
+                    "message": "Session created for user",
+                    "user_id": user_id,
+                    "session_id": session_id
+                }
+
+    async def get_QUIZsession(self, user_id):
+        async with self.driver.session() as session:
+            existing_session = await session.execute_read(self._get_latest_user_quizsession, user_id)
+
+            if not existing_session:
+                session_id = await session.execute_write(self._create_user_session, user_id, "EMTPY QUIZ", 0, [], [], None, None)
+                return {
+                    "message": "Session created for user",
+                    "user_id": user_id,
+                    "session_id": session_id
+                    }
+            else:
+                # Extract session details from the existing session record
+                session_id = existing_session["s"]["id"]
+                return {
+                    "message": "Latest session already exists for user",
+                    "user_id": user_id,
+                    "session_id": session_id
+                }
+
+    async def create_session(self, user_id, sname, question_count, topics, selected_pdfs):
+        async with self.driver.session() as session:
+            session_id = await session.execute_write(self._create_user_session, user_id, sname, question_count, topics, selected_pdfs, None, None)
+            return {
+                "message": "Session created for user",
+                "user_id": user_id,
+                "session_id": session_id,
+                "session_name": sname,
+                "question_count": question_count,
+                "topics": topics,
+                "selected_pdfs": selected_pdfs,
+                }
+
+    async def update_session_name(self, session_id: str, new_name: str) -> bool:
+        async with self.driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (s:Session {id: $session_id})
+                SET s.sname = $new_name
+                RETURN s
+                """,
+                session_id=session_id,
+                new_name=new_name
+            )
+            return bool(await result.single())
+
+    @staticmethod
+    async def _get_latest_user_aisession(tx, user_id):
+        result = await tx.run(LATEST_AI_SESSION_QUERY, user_id=user_id)
+        record = await result.single()
+        if record:
+            return record
+        result = await tx.run(NEWEST_AI_SESSION_QUERY, user_id=user_id)
+        return await result.single()
+
+    @staticmethod
+    async def _get_latest_user_quizsession(tx, user_id):
+        result = await tx.run(LATEST_QUIZ_SESSION_QUERY, user_id=user_id)
+        record = await result.single()
+        if record:
+            return record
+        result = await tx.run(NEWEST_QUIZ_SESSION_QUERY, user_id=user_id)
+        return await result.single()
+
+    @staticmethod
+    async def _create_user_session(tx, user_id, sname, question_count, topics, selected_pdfs, score, current_question_count):
+        session_id = str(uuid.uuid4())  # Generate a unique session ID
+        # Sessions without questions are AI chat sessions, see `_get_latest_user_aisession`
+        latest_rel = "LATEST_QUIZ_SESSION" if question_count else "LATEST_AI_SESSION"
+
+        await tx.run(
+            """
+            MERGE (u:User {id: $user_id})
+            CREATE (s:Session {
+                id: $session_id,
+                timestamp: datetime(),
+                sname: COALESCE(NULLIF($sname, ''), 'New Quiz'),
+                question_count: COALESCE($question_count, 0),
+                topics: COALESCE($topics, []),
+                selected_pdfs: COALESCE($selected_pdfs, []),
+                score: COALESCE($score, 0),
+                current_question_count: COALESCE($current_question_count, 1)
+            })
+            CREATE (u)-[:HAS_SESSION]->(s)
+            WITH u, s
+            OPTIONAL MATCH (u)-[previous:%s]->(:Session)
+            WITH u, s, collect(previous) AS previous_pointers
+            FOREACH (r IN previous_pointers | DELETE r)
+            CREATE (u)-[:%s]->(s)
+            """ % (latest_rel, latest_rel),
+            user_id=user_id,
+            session_id=session_id,
+            sname = sname,
+            question_count=question_count,
+            topics=topics,
+            selected_pdfs=selected_pdfs,
+            score = score,
+            current_question_count = current_question_count
+        )
+        return session_id
+
+    # get all quiz sessions for a user
+    async def get_quizsessions_for_user(self, user_id, after=None, limit=None):
+        async with self.driver.session() as session:
+            return await session.execute_read(self._find_quizsessions_for_user, user_id, after, limit)
+
+    # get single quiz sessions for a user
+    async def get_quizsessions_for_sessionid(self, session_id):
+        async with self.driver.session() as session:
+            return await session.execute_read(self._find_quizsession_by_sessionid, session_id)
+
+    @staticmethod
+    async def _find_quizsessions_for_user(tx, user_id, after=None, limit=None):
+        # `after` is the (timestamp, session id) of the last session of the previous page
+        after_timestamp, after_id = after or (None, None)
+        query = QUIZ_SESSIONS_FOR_USER_QUERY
+        if limit is not None:
+            query += "LIMIT $limit"
+        result = await tx.run(query, user_id=user_id, after_timestamp=after_timestamp, after_id=after_id, limit=limit)
+        return await result.data()
+
+    @staticmethod
+    async def _find_quizsession_by_sessionid(tx, session_id):
+        result = await tx.run(FIND_SESSION_QUERY, session_id=session_id)
+        record = await result.single()
+        return record.data() if record else None
+
+    # get all AI Chat sessions for a user
+    async def get_sessions_for_user(self, user_id):
+        async with self.driver.session() as session:
+            return await session.execute_read(self._find_aisessions_for_user, user_id)
+
+    @staticmethod
+    async def _find_aisessions_for_user(tx, user_id):
+        query = """
+        MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
+        WHERE s.question_count = 0
+        RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics, s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp
+        """
+        result = await tx.run(query, user_id=user_id)
+        return await result.data()
+
+    async def create_question_node(self, session_id, question_id, question_text, difficulty, completeness, xp):
+        await self.create_question_nodes(session_id, [{
+            "question_id": question_id,
+            "question_text": question_text,
+            "difficulty": difficulty,
+            "completeness": completeness,
+            "xp": xp,
+        }])
+
+    async def create_question_nodes(self, session_id, questions):
+        """
+        Create many question nodes of a session in one transaction.
+        `questions`: [{"question_id", "question_text", "difficulty", "completeness", "xp"}, ...]
+        """
+        rows = [{**question, "session_id": session_id} for question in questions]
+        if not rows:
+            return 0
+        async with self.driver.session() as session:
+            created = await session.execute_write(self._create_question_nodes, rows)
+        logging.info(f"Created {created} question node(s) for session: {session_id}")
+        return created
+
+    @staticmethod
+    async def _create_question_nodes(tx, questions):
+        result = await tx.run(CREATE_QUESTIONS_QUERY, questions=questions)
+        record = await result.single()
+        return record["created"] if record else 0
+
+    async def claim_pooled_question(self, session_id):
+        """
+        Take the oldest pre-generated question of a session out of its pool.
+        Returns the question or None when the pool is empty.
+        """
+        async with self.driver.session() as session:
+            return await session.execute_write(self._claim_pooled_question, session_id)
+
+    @staticmethod
+    async def _claim_pooled_question(tx, session_id):
+        result = await tx.run(CLAIM_POOLED_QUESTION_QUERY, session_id=session_id)
+        record = await result.single()
+        return record["q"] if record else None
+
+    async def get_question_pool_state(self, session_id):
+        async with self.driver.session() as session:
+            return await session.execute_read(self._get_question_pool_state, session_id)
+
+    @staticmethod
+    async def _get_question_pool_state(tx, session_id):
+        query = """
+        MATCH (s:Session {id: $session_id})
+        OPTIONAL MATCH (s)-[:CONTAINS]->(q:Question)
+        RETURN s.question_count AS question_count,
+               count(CASE WHEN q.pooled THEN 1 END) AS pooled,
+               count(CASE WHEN q IS NOT NULL AND NOT coalesce(q.pooled, false) THEN 1 END) AS served
+        """
+        result = await tx.run(query, session_id=session_id)
+        record = await result.single()
+        return record.data() if record else None
+
+    async def update_current_question_count(self, session_id, current_question_count):
+        async with self.driver.session() as session:
+            await session.execute_write(self._update_current_question_count, session_id, current_question_count)
+
+    @staticmethod
+    async def _update_current_question_count(tx, session_id, current_question_count):
+        await tx.run(UPDATE_CURRENT_QUESTION_COUNT_QUERY, session_id=session_id, current_question_count=current_question_count)
+
+
+async def benchmark_get_quizsession(settings, user_id, calls=32):
+    """
+    `calls` concurrent `/get_QUIZsession` lookups on one event loop: the blocking
+    `Neo4jDatabase` serialises them (about `calls` round-trips), the async one
+    overlaps them (about one).
+    """
+    from db.neo4j import Neo4jDatabase, create_driver
+
+    sync_driver = create_driver(settings)
+    async_driver = create_async_driver(settings)
+    try:
+        sync_db = Neo4jDatabase(driver=sync_driver)
+        async_db = AsyncNeo4jDatabase(driver=async_driver)
+        # warm both pools, the latest-session pointer and the plan cache
+        sync_db.get_QUIZsession(user_id)
+        await async_db.get_QUIZsession(user_id)
+
+        started = time.perf_counter()
+        await async_db.get_QUIZsession(user_id)
+        round_trip = time.perf_counter() - started
+
+        async def blocking():
+            # what an `async def` route calling the sync class does: hold the loop for the whole round-trip
+            sync_db.get_QUIZsession(user_id)
+
+        results = {"calls": calls, "round_trip_ms": round(round_trip * 1000, 2)}
+        for name, call in (("sync", blocking), ("async", lambda: async_db.get_QUIZsession(user_id))):
+            started = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(calls)))
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "seconds": round(elapsed, 3),
+                "round_trips": round(elapsed / round_trip, 1),
+            }
+        return results
+    finally:
+        sync_driver.close()
+        await async_driver.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from config import Settings
+
+    if len(sys.argv) < 3 or sys.argv[1] != "bench":
+        print("usage: python -m db.async_neo4j bench <user_id> [calls]")
+        sys.exit(2)
+
+    calls = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    print(asyncio.run(benchmark_get_quizsession(Settings(), sys.argv[2], calls)))
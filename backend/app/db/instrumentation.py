@@ -0,0 +1,425 @@
+import re
+import sys
+import time
+import random
+import logging
+import threading
+
+'''
+instrumentation.py [Cypher Query Metrics]
+
+Thin wrappers around the Neo4j drivers that time every query run through them.
+Each query is recorded under the name of the function that ran it (the `_tx`
+helper, or the caller of `session.run` / `execute_query` / `neo4j_graph.query`),
+optionally behind a `prefix` for drivers handed to a library.
+
+Per query name we keep: calls, wall time (total/max), rows returned, the
+server's `result_available_after` / `result_consumed_after`, and - for the
+sampled fraction whose statement is sent with a `PROFILE` prefix (it still runs
+once, PROFILE returns the same rows) - the total db hits.
+
+Drivers LangChain builds itself are covered by handing it a wrapped driver: the
+`pdf_bot` `Neo4jVector` (`pdf_vector_store.*`, its index setup stays raw since
+neo4j_graphrag type-checks the driver) and `SequencedChatMessageHistory`
+(`chat_history.*`). Only `Neo4jGraph` is left with wall time and rows.
+
+[ Metrics ]
+1.  `QueryMetrics`:             Thread-safe per-query aggregates (`record`, `snapshot`, `reset`).
+2.  `configure_query_metrics`:  Applies the sampling rate / slow query threshold from `Settings`.
+
+[ Wrappers ]
+3.  `InstrumentedDriver`:       Wraps a `neo4j.Driver` (sessions, transactions, `execute_query`);
+                                `with_prefix` re-prefixes an already wrapped driver.
+4.  `AsyncInstrumentedDriver`:  Same for a `neo4j.AsyncDriver`.
+5.  `instrument_graph`:         Times `Neo4jGraph.query` calls (no server summary is available there).
+'''
+
+# schema commands and already explained/profiled statements can't be prefixed with PROFILE
+_NOT_PROFILABLE = re.compile(r"^\s*(EXPLAIN|PROFILE|SHOW|DROP|CREATE\s+(\w+\s+)?(INDEX|CONSTRAINT))\b", re.IGNORECASE)
+
+
+class QueryMetrics:
+    def __init__(self, profile_sample_rate=0.0, slow_query_ms=500.0):
+        self.profile_sample_rate = profile_sample_rate
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def should_profile(self, query):
+        return (
+            self.profile_sample_rate > 0
+            and random.random() < self.profile_sample_rate
+            and not _NOT_PROFILABLE.match(query)
+        )
+
+    def record(self, name, wall_ms, rows, summary=None, profiled=False):
+        available_after = getattr(summary, "result_available_after", None)
+        consumed_after = getattr(summary, "result_consumed_after", None)
+        db_hits = _total_db_hits(summary.profile) if profiled and getattr(summary, "profile", None) else None
+
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "available_after_ms": 0,
+                "consumed_after_ms": 0,
+                "profiled": 0,
+                "db_hits": 0,
+            })
+            stats["calls"] += 1
+            stats["total_ms"] += wall_ms
+            stats["max_ms"] = max(stats["max_ms"], wall_ms)
+            stats["rows"] += rows
+            stats["available_after_ms"] += available_after or 0
+            stats["consumed_after_ms"] += consumed_after or 0
+            if db_hits is not None:
+                stats["profiled"] += 1
+                stats["db_hits"] += db_hits
+
+        if wall_ms >= self.slow_query_ms:
+            logging.warning(
+                f"Slow Cypher query {name}: {wall_ms:.0f} ms, {rows} rows"
+                + (f", {db_hits} db hits" if db_hits is not None else "")
+            )
+
+    def snapshot(self):
+        """
+        Aggregates per query name, the most expensive (total wall time) first.
+        """
+        with self._lock:
+            stats = {name: dict(s) for name, s in self._stats.items()}
+        for s in stats.values():
+            s["avg_ms"] = s["total_ms"] / s["calls"]
+            s["avg_db_hits"] = s["db_hits"] / s["profiled"] if s["profiled"] else None
+        return dict(sorted(stats.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_metrics = QueryMetrics()
+
+def configure_query_metrics(settings):
+    query_metrics.profile_sample_rate = settings.cypher_profile_sample_rate
+    query_metrics.slow_query_ms = settings.cypher_slow_query_ms
+    return query_metrics
+
+def _total_db_hits(profile):
+    return profile.get("dbHits", 0) + sum(_total_db_hits(child) for child in profile.get("children", []))
+
+def _caller_name(depth=2):
+    return sys._getframe(depth).f_code.co_name
+
+def _qualify(prefix, name):
+    return f"{prefix}.{name}" if prefix else name
+
+def _prepare(query):
+    text = getattr(query, "text", query)
+    profiled = query_metrics.should_profile(text)
+    if profiled:
+        # a `Query` object keeps its timeout/metadata, only its text changes
+        if hasattr(query, "text"):
+            query.text = "PROFILE " + text
+        else:
+            query = "PROFILE " + query
+    return query, profiled
+
+
+###### Sync #####
+class InstrumentedResult:
+    def __init__(self, result, name, profiled):
+        self._result = result
+        self._name = name
+        self._profiled = profiled
+        self._start = time.perf_counter()
+        self._rows = 0
+        self._recorded = False
+
+    def __iter__(self):
+        for record in self._result:
+            self._rows += 1
+            yield record
+
+    def data(self, *keys):
+        data = self._result.data(*keys)
+        self._rows += len(data)
+        return data
+
+    def single(self, *args, **kwargs):
+        record = self._result.single(*args, **kwargs)
+        self._rows += record is not None
+        return record
+
+    def consume(self):
+        summary = self._result.consume()
+        if not self._recorded:
+            self._recorded = True
+            wall_ms = (time.perf_counter() - self._start) * 1000
+            query_metrics.record(self._name, wall_ms, self._rows, summary, self._profiled)
+        return summary
+
+    def __getattr__(self, attr):
+        return getattr(self._result, attr)
+
+
+class InstrumentedTransaction:
+    def __init__(self, tx, name):
+        self._tx = tx
+        self._name = name
+        self._results = []
+
+    def run(self, query, parameters=None, **kwargs):
+        query, profiled = _prepare(query)
+        result = InstrumentedResult(self._tx.run(query, parameters, **kwargs), self._name, profiled)
+        self._results.append(result)
+        return result
+
+    def finish(self):
+        for result in self._results:
+            result.consume()
+        self._results.clear()
+
+    def __getattr__(self, attr):
+        return getattr(self._tx, attr)
+
+
+def _instrument_work(work, prefix=None):
+    def instrumented(tx, *args, **kwargs):
+        itx = InstrumentedTransaction(tx, _qualify(prefix, work.__name__))
+        value = work(itx, *args, **kwargs)
+        itx.finish()
+        return value
+    return instrumented
+
+
+class InstrumentedSession:
+    def __init__(self, session, prefix=None):
+        self._session = session
+        self._prefix = prefix
+        self._results = []
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._finish()
+        return self._session.__exit__(*exc)
+
+    def _finish(self):
+        for result in self._results:
+            try:
+                result.consume()
+            except Exception:
+                pass
+        self._results.clear()
+
+    def run(self, query, parameters=None, **kwargs):
+        query, profiled = _prepare(query)
+        result = InstrumentedResult(self._session.run(query, parameters, **kwargs), _qualify(self._prefix, _caller_name()), profiled)
+        self._results.append(result)
+        return result
+
+    def read_transaction(self, work, *args, **kwargs):
+        return self._session.read_transaction(_instrument_work(work, self._prefix), *args, **kwargs)
+
+    def write_transaction(self, work, *args, **kwargs):
+        return self._session.write_transaction(_instrument_work(work, self._prefix), *args, **kwargs)
+
+    def execute_read(self, work, *args, **kwargs):
+        return self._session.execute_read(_instrument_work(work, self._prefix), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return self._session.execute_write(_instrument_work(work, self._prefix), *args, **kwargs)
+
+    def close(self):
+        self._finish()
+        self._session.close()
+
+    def __getattr__(self, attr):
+        return getattr(self._session, attr)
+
+
+class InstrumentedDriver:
+    def __init__(self, driver, prefix=None):
+        self._driver = driver
+        self._prefix = prefix
+
+    def with_prefix(self, prefix):
+        # same inner driver under another prefix; wrapping this wrapper would record every query twice
+        return InstrumentedDriver(self._driver, prefix)
+
+    def session(self, **config):
+        return InstrumentedSession(self._driver.session(**config), self._prefix)
+
+    def execute_query(self, query, *args, **kwargs):
+        # parameters are forwarded as given, positionally or as `parameters_=`
+        name = _qualify(self._prefix, _caller_name())
+        query, profiled = _prepare(query)
+        start = time.perf_counter()
+        records, summary, keys = self._driver.execute_query(query, *args, **kwargs)
+        wall_ms = (time.perf_counter() - start) * 1000
+        query_metrics.record(name, wall_ms, len(records), summary, profiled)
+        return records, summary, keys
+
+    def __getattr__(self, attr):
+        return getattr(self._driver, attr)
+
+
+###### Async #####
+class AsyncInstrumentedResult:
+    def __init__(self, result, name, profiled):
+        self._result = result
+        self._name = name
+        self._profiled = profiled
+        self._start = time.perf_counter()
+        self._rows = 0
+        self._recorded = False
+
+    async def __aiter__(self):
+        async for record in self._result:
+            self._rows += 1
+            yield record
+
+    async def data(self, *keys):
+        data = await self._result.data(*keys)
+        self._rows += len(data)
+        return data
+
+    async def single(self, *args, **kwargs):
+        record = await self._result.single(*args, **kwargs)
+        self._rows += record is not None
+        return record
+
+    async def consume(self):
+        summary = await self._result.consume()
+        if not self._recorded:
+            self._recorded = True
+            wall_ms = (time.perf_counter() - self._start) * 1000
+            query_metrics.record(self._name, wall_ms, self._rows, summary, self._profiled)
+        return summary
+
+    def __getattr__(self, attr):
+        return getattr(self._result, attr)
+
+
+class AsyncInstrumentedTransaction:
+    def __init__(self, tx, name):
+        self._tx = tx
+        self._name = name
+        self._results = []
+
+    async def run(self, query, parameters=None, **kwargs):
+        query, profiled = _prepare(query)
+        result = AsyncInstrumentedResult(await self._tx.run(query, parameters, **kwargs), self._name, profiled)
+        self._results.append(result)
+        return result
+
+    async def finish(self):
+        for result in self._results:
+            await result.consume()
+        self._results.clear()
+
+    def __getattr__(self, attr):
+        return getattr(self._tx, attr)
+
+
+def _async_instrument_work(work, prefix=None):
+    async def instrumented(tx, *args, **kwargs):
+        itx = AsyncInstrumentedTransaction(tx, _qualify(prefix, work.__name__))
+        value = await work(itx, *args, **kwargs)
+        await itx.finish()
+        return value
+    return instrumented
+
+
+class AsyncInstrumentedSession:
+    def __init__(self, session, prefix=None):
+        self._session = session
+        self._prefix = prefix
+        self._results = []
+
+    async def __aenter__(self):
+        await self._session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._finish()
+        return await self._session.__aexit__(*exc)
+
+    async def _finish(self):
+        for result in self._results:
+            try:
+                await result.consume()
+            except Exception:
+                pass
+        self._results.clear()
+
+    async def run(self, query, parameters=None, **kwargs):
+        name = _qualify(self._prefix, _caller_name())
+        query, profiled = _prepare(query)
+        result = AsyncInstrumentedResult(await self._session.run(query, parameters, **kwargs), name, profiled)
+        self._results.append(result)
+        return result
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await self._session.execute_read(_async_instrument_work(work, self._prefix), *args, **kwargs)
+
+    async def execute_write(self, work, *args, **kwargs):
+        return await self._session.execute_write(_async_instrument_work(work, self._prefix), *args, **kwargs)
+
+    async def close(self):
+        await self._finish()
+        await self._session.close()
+
+    def __getattr__(self, attr):
+        return getattr(self._session, attr)
+
+
+class AsyncInstrumentedDriver:
+    def __init__(self, driver, prefix=None):
+        self._driver = driver
+        self._prefix = prefix
+
+    def with_prefix(self, prefix):
+        # same inner driver under another prefix; wrapping this wrapper would record every query twice
+        return AsyncInstrumentedDriver(self._driver, prefix)
+
+    def session(self, **config):
+        return AsyncInstrumentedSession(self._driver.session(**config), self._prefix)
+
+    async def execute_query(self, query, *args, **kwargs):
+        # parameters are forwarded as given, positionally or as `parameters_=`
+        name = _qualify(self._prefix, _caller_name())
+        query, profiled = _prepare(query)
+        start = time.perf_counter()
+        records, summary, keys = await self._driver.execute_query(query, *args, **kwargs)
+        wall_ms = (time.perf_counter() - start) * 1000
+        query_metrics.record(name, wall_ms, len(records), summary, profiled)
+        return records, summary, keys
+
+    def __getattr__(self, attr):
+        return getattr(self._driver, attr)
+
+
+###### Neo4jGraph #####
+def instrument_graph(graph):
+    """
+    Record `graph.query` calls under the caller's name. `Neo4jGraph.query` only
+    returns the rows, so wall time and row counts are kept but no server timings,
+    and PROFILE is not sampled.
+    """
+    query = graph.query
+
+    def instrumented_query(cypher, params={}, *args, **kwargs):
+        name = _caller_name()
+        start = time.perf_counter()
+        rows = query(cypher, params, *args, **kwargs)
+        query_metrics.record(name, (time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+    graph.query = instrumented_query
+    return graph
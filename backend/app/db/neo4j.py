@@ -1,21 +1,38 @@
 from neo4j import GraphDatabase
+from concurrent.futures import ThreadPoolExecutor
+from db.instrumentation import InstrumentedDriver
+from db.user_cache import user_cache, FIND_USER_QUERY
+from db.queries import (
+    FIND_SESSION_QUERY, LATEST_AI_SESSION_QUERY, LATEST_QUIZ_SESSION_QUERY,
+    NEWEST_AI_SESSION_QUERY, NEWEST_QUIZ_SESSION_QUERY, QUIZ_SESSIONS_FOR_USER_QUERY,
+    FIND_DETACHED_CHAT_HISTORIES_QUERY, update_user_query, USER_RELATIONSHIPS_QUERY,
+    CREATE_LANDING_SESSION_QUERY, CREATE_QUESTIONS_QUERY, CREATE_ANSWERS_QUERY,
+    UPDATE_CURRENT_QUESTION_COUNT_QUERY,
+)
+import time
 import uuid
 import logging
 
 '''
 neo4j.py [Database Operation]
 
-1.  `__init__`:                 Initializes the Neo4j database connection.  
-2.  `close`:                    Closes the database connection.
+[ Driver ]
+0.  `init_driver`:              Creates the process-wide pooled driver, instrumented (see db/instrumentation.py).
+0.  `get_driver`:               Returns the process-wide pooled driver.
+0.  `close_driver`:             Closes the process-wide pooled driver.
+
+1.  `__init__`:                 Wraps a shared driver, or opens a private one from uri/user/password.  
+2.  `close`:                    Closes the database connection (only if it owns the driver).
 
 [ User Anw Node ]
 3.  `save_answer`:              (Creates) Saves a user's answer to a question in the database.  
-4.  `_create_answer_record`:    (Creates) an `Answer` node linked to a `User` node.  
+3.  `save_answers`:             (Creates) Saves many answers of a user in one `UNWIND` transaction.  
+4.  `_create_answer_records`:   (Creates) `Answer` nodes linked to their `User` nodes.  
 
 [ User Node ]
 5.  `update_user_model`:        (Updates) properties of a user node.  
 6.  `_update_user_record`:      (Updates) properties dynamically.  
-7.  `get_user_by_id`:           (Read) retirve a user node by its ID.  
+7.  `get_user_by_id`:           (Read) retirve a user node by its ID, through `user_cache` (db/user_cache.py).  
 8.  `_find_user_by_id`:         (Read) fetch a user node by ID. 
 
 [ Chat History Node ]
@@ -26,60 +43,92 @@ neo4j.py [Database Operation]
 11. `get_AIsession`:            (Read) Retrieves or creates a user AI session. 
 11. `get_QUIZsession`:          (Read) Retrieves or creates a user QUIZ session. 
 12. `create_session`            (Creates) creates a new Quiz session based on user prefence. 
-13. `_get_latest_user_aisession`(Read) Fetches the most recent quiz session for a user.  
-13. `_get_latest_user_quizsession(Read) Fetches the most recent quiz session for a user.  
-14. `_create_user_session`:     (Creates) a new session node for a user. (user_id, question_count, topics, selected_pdfs, sname, score, current_question_count)
+13. `_get_latest_user_aisession`(Read) Fetches the most recent AI session for a user via `LATEST_AI_SESSION`.  
+13. `_get_latest_user_quizsession(Read) Fetches the most recent quiz session for a user via `LATEST_QUIZ_SESSION`.  
+14. `_create_user_session`:     (Creates) a new session node for a user and moves the matching latest-session pointer. (user_id, question_count, topics, selected_pdfs, sname, score, current_question_count)
 
-15. `get_quizsessions_for_user`:(Read) Retrieves all quiz sessions associated with a user.  
+15. `get_quizsessions_for_user`:(Read) Retrieves quiz sessions of a user, newest first, keyset paginated (after, limit).  
 16. `_find_quizsessions_for_user(Read) fetch user quiz sessions.  
 15. `get_sessions_for_user`:    (Read) Retrieves all AI sessions associated with a user.  
 16. `_find_aisessions_for_user`:(Read) fetch user AI sessions.  
 
-[ ? ]
-17. `create_vector_index`:      Creates vector indexes for `Question` and `Answer` nodes.  
-18. `create_constraints`:       Creates uniqueness constraints for nodes (`Question`, `Answer`, `User`, `Tag`).  
+[ Question Node ]
+17. `create_question_node`:     (Creates) a question node linked to a session.  
+17. `create_question_nodes`:    (Creates) many question nodes of a session in one `UNWIND` transaction.  
+
+Constraints and indexes are declared in `db/schema.py`.
+
+[ Benchmark ]
+18. `benchmark_list_session`:   p50/p99 of the `/list_session` lookup, a driver per request vs. the pooled driver.
+                                `python -m db.neo4j bench <user_id> [requests] [concurrency]`
 
 '''
 
+_driver = None
+
+def create_driver(settings):
+    return GraphDatabase.driver(
+        settings.neo4j_uri,
+        auth=(settings.neo4j_username, settings.neo4j_password),
+        max_connection_pool_size=settings.neo4j_max_connection_pool_size,
+        connection_acquisition_timeout=settings.neo4j_connection_acquisition_timeout,
+        max_connection_lifetime=settings.neo4j_max_connection_lifetime,
+    )
+
+def init_driver(settings):
+    global _driver
+    if _driver is None:
+        _driver = InstrumentedDriver(create_driver(settings))
+        _driver.verify_connectivity()
+    return _driver
+
+def get_driver():
+    if _driver is None:
+        raise RuntimeError("Neo4j driver is not initialised, call init_driver() first")
+    return _driver
+
+def close_driver():
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+
 class Neo4jDatabase:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri=None, user=None, password=None, driver=None):
+        # Prefer a shared pooled driver; opening one per instance costs a full
+        # Bolt handshake + auth and is only kept for scripts and old callers.
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password))
 
     def close(self):
-        self.driver.close()
+        if self._owns_driver:
+            self.driver.close()
 
     def save_answer(self, user_id, question, answer, is_correct):
-        with self.driver.session() as session:
-            session.write_transaction(self._create_answer_record, user_id, question, answer, is_correct)
+        self.save_answers(user_id, [{"question": question, "answer": answer, "is_correct": is_correct}])
+
+    def save_answers(self, user_id, answers):
+        """
+        Save many answers of a user in one transaction.
+        `answers`: [{"question", "answer", "is_correct"}, ...]
+        """
+        rows = [{**answer, "user_id": user_id} for answer in answers]
+        if rows:
+            with self.driver.session() as session:
+                session.write_transaction(self._create_answer_records, rows)
 
     @staticmethod
-    def _create_answer_record(tx, user_id, question, answer, is_correct):
-        tx.run(
-            """
-            MERGE (u:User {id: $user_id})
-            CREATE (a:Answer {question: $question, answer: $answer, isCorrect: $is_correct, timestamp: datetime()})
-            CREATE (u)-[:SUBMITTED]->(a)
-            """,
-            user_id=user_id,
-            question=question,
-            answer=answer,
-            is_correct=is_correct
-        )
+    def _create_answer_records(tx, answers):
+        tx.run(CREATE_ANSWERS_QUERY, answers=answers)
 
     def update_user_model(self, user_id, properties, username=None):
         with self.driver.session() as session:
             session.write_transaction(self._update_user_record, user_id, properties, username)
+        user_cache.invalidate(user_id)
 
     @staticmethod
     def _update_user_record(tx, user_id, properties, username=None):
-        set_clauses = [f"u.{key} = ${key}" for key in properties]
-        if username:
-            set_clauses.append("u.username = $username")
-        set_clause = ", ".join(set_clauses)
-        query = f"""
-        MERGE (u:User {{id: $user_id}})
-        SET {set_clause}
-        """
+        query = update_user_query(properties, username=bool(username))
         properties['user_id'] = user_id
         if username:
             properties['username'] = username
@@ -91,22 +140,7 @@ class Neo4jDatabase:
         
     @staticmethod
     def _create_landing_session(tx, user_id):
-        session_id = user_id
-        query = """
-        MERGE (u:User {id: $user_id})
-        CREATE (s:Session {
-            id: $session_id, 
-            timestamp: datetime(), 
-            sname: 'landing session',
-            question_count: 0, 
-            topics: [], 
-            selected_pdfs: [], 
-            score: 0,  
-            current_question_count: 0
-        })
-        CREATE (u)-[:landing_session]->(s)
-        """
-        tx.run(query, user_id=user_id, session_id=session_id)
+        tx.run(CREATE_LANDING_SESSION_QUERY, user_id=user_id, session_id=user_id)
 
     ###### User #####
     def get_all_user(self):
@@ -133,21 +167,16 @@ class Neo4jDatabase:
 
     #
     def get_user_by_id(self, user_id):
-        with self.driver.session() as session:
-            result = session.read_transaction(self._find_user_by_id, user_id)
-            return result
+        user = user_cache.get(user_id)
+        if user is None:
+            with self.driver.session() as session:
+                user = session.read_transaction(self._find_user_by_id, user_id)
+            user_cache.set(user_id, user)
+        return user
 
     @staticmethod
     def _find_user_by_id(tx, user_id):
-        query = """
-        MATCH (u:User {id: $user_id})
-        RETURN u {.*, relationships: [(u)-[r]->(other:User) | {
-            type: type(r),
-            target: other.username,
-            target_id: other.id
-        }]}
-        """
-        result = tx.run(query, user_id=user_id)
+        result = tx.run(FIND_USER_QUERY, user_id=user_id)
         record = result.single()
         return record["u"] if record else None
 
@@ -174,7 +203,9 @@ class Neo4jDatabase:
                 user_id=user_id, 
                 avatar=avatar
             )
-            return bool(result.single()) 
+            updated = bool(result.single())
+        user_cache.invalidate(user_id)
+        return updated
 
     def update_quiz_progress(self, user_id: str, current_index: int) -> bool:
         """Updates the quiz progress for a user"""
@@ -185,7 +216,9 @@ class Neo4jDatabase:
         """
         with self.driver.session() as session:
             result = session.run(query, user_id=user_id, current_index=current_index)
-            return bool(result.single())
+            updated = bool(result.single())
+        user_cache.invalidate(user_id)
+        return updated
 
     def get_quiz_progress(self, user_id: str) -> int:
         """Gets the current quiz progress for a user"""
@@ -200,12 +233,15 @@ class Neo4jDatabase:
 
     def create_user_relationship(self, from_user_id, to_user_id, relationship_type):
         with self.driver.session() as session:
-            return session.write_transaction(
+            result = session.write_transaction(
                 self._create_relationship, 
                 from_user_id, 
                 to_user_id,
                 relationship_type
             )
+        # both endpoints: a cached user must not hold a stale view of a relationship it is part of
+        user_cache.invalidate(from_user_id, to_user_id)
+        return result
 
     @staticmethod
     def _create_relationship(tx, from_user_id, to_user_id, relationship_type):
@@ -244,26 +280,19 @@ class Neo4jDatabase:
 
     @staticmethod
     def _get_relationships(tx, user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[r]->(other:User)
-        RETURN {
-            from: u.username,
-            type: type(r),
-            to: other.username,
-            to_id: other.id
-        } as relationship
-        """
-        result = tx.run(query, user_id=user_id)
+        result = tx.run(USER_RELATIONSHIPS_QUERY, user_id=user_id)
         return [record["relationship"] for record in result]
 
     def delete_user_relationship(self, from_user_id, to_user_id, relationship_type):
         with self.driver.session() as session:
-            return session.write_transaction(
+            result = session.write_transaction(
                 self._delete_relationship, 
                 from_user_id, 
                 to_user_id,
                 relationship_type
             )
+        user_cache.invalidate(from_user_id, to_user_id)
+        return result
 
     @staticmethod
     def _delete_relationship(tx, from_user_id, to_user_id, relationship_type):
@@ -297,43 +326,80 @@ class Neo4jDatabase:
             result = session.run(query, session_id=session_id)
             return [record["result"] for record in result]
 
-    def get_all_chat_histories_for_user(self, user_id):
-        with self.driver.session() as session:
-            query = """
-            MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)-[:LAST_MESSAGE]->(last_message)
-            
-            WITH s, last_message
-            MATCH p=(last_message)<-[:NEXT*0..]-(previous_messages)
-            WITH s, p, length(p) AS path_length
-            ORDER BY s.timestamp DESC, path_length DESC
-            UNWIND reverse(nodes(p)) AS node
-            WITH s.id AS session_id, COLLECT(DISTINCT {data: {content: node.content}, type: node.type}) AS results
-            RETURN session_id, results
-            """
-            result = session.run(query, user_id=user_id)
-            sessions = {}
-            for record in result:
-                sessions[record["session_id"]] = record["results"]
-            return sessions
+    def delete_chat_history(self, session_id, batch_size=500, on_progress=None):
+        """
+        Deletes a session's chat history in fixed-size batches.
 
-    def delete_chat_history(self, session_id):
+        The message chain is first detached from the session in one small
+        transaction (so new messages start a fresh chain), then removed
+        `batch_size` messages per transaction to keep heap usage and lock times
+        flat. Chains left detached by an interrupted run are picked up again,
+        which makes the deletion resumable.
+
+        Args:
+            session_id (str): The ID of the session whose history is deleted.
+            batch_size (int): Messages deleted per transaction.
+            on_progress (callable): Called with {"messages_deleted": n} after each batch.
+
+        Returns:
+            int: The number of messages deleted.
+        """
+        deleted = 0
         with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s:Session {id: $session_id})-[:LAST_MESSAGE]->(last_message)
-                OPTIONAL MATCH (last_message)<-[:NEXT*0..]-(messages)
-                WITH last_message, COLLECT(messages) AS all_messages
-                // Delete relationships first
-                FOREACH (msg IN all_messages | 
-                    DETACH DELETE msg
-                )
-                // Now delete the last message
-                DETACH DELETE last_message
-                RETURN COUNT(all_messages) AS deleted_count
-                """,
-                session_id=session_id
-            )
-            return result
+            session.write_transaction(self._detach_chat_history, session_id)
+            history_ids = session.read_transaction(self._find_detached_chat_histories, session_id)
+            for history_id in history_ids:
+                while True:
+                    count = session.write_transaction(self._delete_detached_messages_batch, history_id, batch_size)
+                    if not count:
+                        break
+                    deleted += count
+                    if on_progress:
+                        on_progress({"messages_deleted": deleted})
+        return deleted
+
+    @staticmethod
+    def _detach_chat_history(tx, session_id):
+        query = """
+        MATCH (s:Session {id: $session_id})-[lm:LAST_MESSAGE]->(last_message)
+        CREATE (h:DetachedChatHistory {id: randomUUID(), session_id: $session_id, timestamp: datetime()})
+        CREATE (h)-[:LAST_MESSAGE]->(last_message)
+        DELETE lm
+        SET s.history_start = coalesce(s.message_count, 0)
+        """
+        tx.run(query, session_id=session_id)
+
+    @staticmethod
+    def _find_detached_chat_histories(tx, session_id):
+        result = tx.run(FIND_DETACHED_CHAT_HISTORIES_QUERY, session_id=session_id)
+        return [record["history_id"] for record in result]
+
+    @staticmethod
+    def _delete_detached_messages_batch(tx, history_id, batch_size):
+        # Deletes the newest `batch_size` messages and moves the pointer to the
+        # message before them. Variable-length bounds cannot be parameters.
+        query = """
+        MATCH (h:DetachedChatHistory {id: $history_id})-[lm:LAST_MESSAGE]->(last_message)
+        MATCH p=(last_message)<-[:NEXT*0..%d]-(oldest)
+        WITH h, lm, p
+        ORDER BY length(p) DESC
+        LIMIT 1
+        WITH h, lm, nodes(p) AS messages, last(nodes(p)) AS oldest
+        OPTIONAL MATCH (previous)-[:NEXT]->(oldest)
+        DELETE lm
+        FOREACH (_ IN CASE WHEN previous IS NULL THEN [] ELSE [1] END |
+            CREATE (h)-[:LAST_MESSAGE]->(previous)
+        )
+        FOREACH (message IN messages | DETACH DELETE message)
+        RETURN size(messages) AS deleted
+        """ % (int(batch_size) - 1)
+        record = tx.run(query, history_id=history_id).single()
+        if record:
+            return record["deleted"]
+
+        # Chain exhausted, drop the tombstone
+        tx.run("MATCH (h:DetachedChatHistory {id: $history_id}) DELETE h", history_id=history_id)
+        return 0
 
 #####
 
@@ -411,12 +477,19 @@ class Neo4jDatabase:
 
             return bool(result.single()) 
 
-    def delete_session(self, session_id: str) -> dict:
+    def delete_session(self, session_id: str, batch_size=500, on_progress=None) -> dict:
         """
-        Deletes a session and all its recursively related nodes downstream.
+        Deletes a session and all its related nodes downstream, in batches.
+
+        Chat messages go first (see `delete_chat_history`), then the session's
+        questions `batch_size` per transaction, then the session node itself.
+        Each step only touches what is left, so an interrupted run can simply
+        be started again.
         
         Args:
             session_id (str): The ID of the session to delete.
+            batch_size (int): Nodes deleted per transaction.
+            on_progress (callable): Called with {"messages_deleted", "questions_deleted"} after each batch.
         
         Returns:
             dict: A dictionary with 'success' (bool) and 'nodes_deleted' (int).
@@ -428,52 +501,68 @@ class Neo4jDatabase:
         if not session_id or not isinstance(session_id, str):
             raise ValueError("session_id must be a non-empty string")
 
-        with self.driver.session() as session:
-            try:
-                result = session.run(
-                    """
-                    MATCH (s:Session {id: $session_id})
-                    OPTIONAL MATCH (s)-[*]->(related)
-                    DETACH DELETE s, related
-                    WITH COUNT(s) AS session_count, COUNT(related) AS related_count
-                    RETURN session_count > 0 AS success, 
-                        (session_count + related_count) AS nodes_deleted
-                    """,
-                    session_id=session_id
-                )
-                record = result.single()
-                return {
-                    "success": record["success"],
-                    "nodes_deleted": record["nodes_deleted"]
-                }
-            except Exception as e:
-                raise Exception(f"Failed to delete session {session_id}: {str(e)}")
+        progress = {"messages_deleted": 0, "questions_deleted": 0}
+
+        def report(**counts):
+            progress.update(counts)
+            if on_progress:
+                on_progress(dict(progress))
+
+        try:
+            progress["messages_deleted"] = self.delete_chat_history(session_id, batch_size, lambda p: report(**p))
+            with self.driver.session() as session:
+                while True:
+                    count = session.write_transaction(self._delete_session_questions_batch, session_id, batch_size)
+                    if not count:
+                        break
+                    report(questions_deleted=progress["questions_deleted"] + count)
+                success = session.write_transaction(self._delete_session_node, session_id)
+            return {
+                "success": success,
+                "nodes_deleted": progress["messages_deleted"] + progress["questions_deleted"] + int(success)
+            }
+        except Exception as e:
+            raise Exception(f"Failed to delete session {session_id}: {str(e)}")
 
     @staticmethod
-    def _get_latest_user_aisession(tx, user_id):
+    def _delete_session_questions_batch(tx, session_id, batch_size):
         query = """
-        MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
-        WHERE s.question_count = 0 
-        RETURN s
-        LIMIT 1
+        MATCH (s:Session {id: $session_id})-[:CONTAINS]->(q)
+        WITH q
+        LIMIT $batch_size
+        DETACH DELETE q
+        RETURN count(*) AS deleted
         """
-        result = tx.run(query, user_id=user_id)
-        return result.single()
+        return tx.run(query, session_id=session_id, batch_size=batch_size).single()["deleted"]
 
     @staticmethod
-    def _get_latest_user_quizsession(tx, user_id):
+    def _delete_session_node(tx, session_id):
         query = """
-        MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
-        WHERE s.question_count <> 0 
-        RETURN s
-        LIMIT 1
+        MATCH (s:Session {id: $session_id})
+        DETACH DELETE s
+        RETURN count(*) AS deleted
         """
-        result = tx.run(query, user_id=user_id)
-        return result.single()
+        return tx.run(query, session_id=session_id).single()["deleted"] > 0
+
+    @staticmethod
+    def _get_latest_user_aisession(tx, user_id):
+        record = tx.run(LATEST_AI_SESSION_QUERY, user_id=user_id).single()
+        if record:
+            return record
+        return tx.run(NEWEST_AI_SESSION_QUERY, user_id=user_id).single()
+
+    @staticmethod
+    def _get_latest_user_quizsession(tx, user_id):
+        record = tx.run(LATEST_QUIZ_SESSION_QUERY, user_id=user_id).single()
+        if record:
+            return record
+        return tx.run(NEWEST_QUIZ_SESSION_QUERY, user_id=user_id).single()
 
     @staticmethod
     def _create_user_session(tx, user_id, sname, question_count, topics, selected_pdfs, score, current_question_count):
         session_id = str(uuid.uuid4())  # Generate a unique session ID
+        # Sessions without questions are AI chat sessions, see `_get_latest_user_aisession`
+        latest_rel = "LATEST_QUIZ_SESSION" if question_count else "LATEST_AI_SESSION"
         
         tx.run(
             """
@@ -489,8 +578,12 @@ class Neo4jDatabase:
                 current_question_count: COALESCE($current_question_count, 1)
             })
             CREATE (u)-[:HAS_SESSION]->(s)
- 
-            """,
+            WITH u, s
+            OPTIONAL MATCH (u)-[previous:%s]->(:Session)
+            WITH u, s, collect(previous) AS previous_pointers
+            FOREACH (r IN previous_pointers | DELETE r)
+            CREATE (u)-[:%s]->(s)
+            """ % (latest_rel, latest_rel),
             user_id=user_id,
             session_id=session_id,
             sname = sname,
@@ -503,9 +596,9 @@ class Neo4jDatabase:
         return session_id
     
     # get all quiz sessions for a user
-    def get_quizsessions_for_user(self, user_id):
+    def get_quizsessions_for_user(self, user_id, after=None, limit=None):
         with self.driver.session() as session:
-            sessions = session.read_transaction(self._find_quizsessions_for_user, user_id)
+            sessions = session.read_transaction(self._find_quizsessions_for_user, user_id, after, limit)
             return sessions
 
     # get single quiz sessions for a user
@@ -515,13 +608,13 @@ class Neo4jDatabase:
             return sessions
 
     @staticmethod
-    def _find_quizsessions_for_user(tx, user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
-        WHERE s.question_count <> 0 
-        RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics, s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp, s.sname AS sname, s.score AS score, s.current_question_count AS current_question_count
-        """
-        result = tx.run(query, user_id=user_id)
+    def _find_quizsessions_for_user(tx, user_id, after=None, limit=None):
+        # `after` is the (timestamp, session id) of the last session of the previous page
+        after_timestamp, after_id = after or (None, None)
+        query = QUIZ_SESSIONS_FOR_USER_QUERY
+        if limit is not None:
+            query += "LIMIT $limit"
+        result = tx.run(query, user_id=user_id, after_timestamp=after_timestamp, after_id=after_id, limit=limit)
         sessions = []
         for record in result:
             sessions.append({
@@ -538,13 +631,7 @@ class Neo4jDatabase:
 
     @staticmethod
     def _find_quizsession_by_sessionid(tx, session_id):
-        query = """
-        MATCH (s:Session {id: $session_id})
-        RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics, 
-            s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp, s.sname AS sname, 
-            s.score AS score, s.current_question_count AS current_question_count
-        """
-        result = tx.run(query, session_id=session_id)
+        result = tx.run(FIND_SESSION_QUERY, session_id=session_id)
         record = result.single()  # Fetch a single record
         if record:
             return {
@@ -570,7 +657,6 @@ class Neo4jDatabase:
         query = """
         MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
         WHERE s.question_count = 0 
-        RETURN s
         RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics, s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp
         """
         result = tx.run(query, user_id=user_id)
@@ -586,27 +672,31 @@ class Neo4jDatabase:
         return sessions
 
     def create_question_node(self, session_id, question_id, question_text, difficulty, completeness, xp):
+        self.create_question_nodes(session_id, [{
+            "question_id": question_id,
+            "question_text": question_text,
+            "difficulty": difficulty,
+            "completeness": completeness,
+            "xp": xp,
+        }])
+
+    def create_question_nodes(self, session_id, questions):
+        """
+        Create many question nodes of a session in one transaction.
+        `questions`: [{"question_id", "question_text", "difficulty", "completeness", "xp"}, ...]
+        """
+        rows = [{**question, "session_id": session_id} for question in questions]
+        if not rows:
+            return 0
         with self.driver.session() as session:
-            logging.info(f"Creating question node with ID: {question_id} for session: {session_id}")
-            session.write_transaction(self._create_question_node, session_id, question_id, question_text, difficulty, completeness, xp)
+            created = session.write_transaction(self._create_question_nodes, rows)
+        logging.info(f"Created {created} question node(s) for session: {session_id}")
+        return created
 
     @staticmethod
-    def _create_question_node(tx, session_id, question_id, question_text, difficulty, completeness, xp):
-        query = """
-        MATCH (s:Session {id: $session_id})
-        CREATE (q:Question {
-            id: $question_id, 
-            text: $question_text, 
-            difficulty: $difficulty, 
-            completeness: $completeness, 
-            xp: $xp, 
-            timestamp: datetime()
-        })
-        CREATE (s)-[:CONTAINS]->(q)
-        """
-        logging.info(f"Running query to create question node: {query}")
-        tx.run(query, session_id=session_id, question_id=question_id, question_text=question_text, difficulty=difficulty, completeness=completeness, xp=xp)
-        logging.info(f"Question node with ID: {question_id} created successfully")
+    def _create_question_nodes(tx, questions):
+        record = tx.run(CREATE_QUESTIONS_QUERY, questions=questions).single()
+        return record["created"] if record else 0
 
     def update_current_question_count(self, session_id, current_question_count):
         with self.driver.session() as session:
@@ -614,41 +704,62 @@ class Neo4jDatabase:
 
     @staticmethod
     def _update_current_question_count(tx, session_id, current_question_count):
-        query = """
-        MATCH (s:Session {id: $session_id})
-        SET s.current_question_count = $current_question_count
-        RETURN s
-        """
-        tx.run(query, session_id=session_id, current_question_count=current_question_count)    
+        tx.run(UPDATE_CURRENT_QUESTION_COUNT_QUERY, session_id=session_id, current_question_count=current_question_count)
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def benchmark_list_session(settings, user_id, requests=200, concurrency=16):
+    """
+    Latency of the `/list_session/{user_id}` lookup from `concurrency` threads:
+    a private driver per call (connect, handshake, auth, close - what every route
+    used to do) against the shared pooled driver.
+    """
+    def per_request():
+        neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
+        try:
+            neo4j_db.get_quizsessions_for_user(user_id, limit=100)
+        finally:
+            neo4j_db.close()
+
+    shared_driver = create_driver(settings)
+    shared_db = Neo4jDatabase(driver=shared_driver)
+
+    def pooled():
+        shared_db.get_quizsessions_for_user(user_id, limit=100)
+
+    def run(call):
+        def timed(_):
+            started = time.perf_counter()
+            call()
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+        return {
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "requests_per_second": round(requests / elapsed, 2),
+        }
 
-# stackoverflow questions
-def create_vector_index(driver) -> None:
-    index_query = "CREATE VECTOR INDEX stackoverflow IF NOT EXISTS FOR (m:Question) ON m.embedding"
-    try:
-        driver.query(index_query)
-    except:  # Already exists
-        pass
-    index_query = "CREATE VECTOR INDEX top_answers IF NOT EXISTS FOR (m:Answer) ON m.embedding"
     try:
-        driver.query(index_query)
-    except:  # Already exists
-        pass
-
-# stackoverflow questions
-def create_constraints(driver):
-    driver.query(
-        "CREATE CONSTRAINT question_id IF NOT EXISTS FOR (q:Question) REQUIRE (q.id) IS UNIQUE"
-    )
-    driver.query(
-        "CREATE CONSTRAINT answer_id IF NOT EXISTS FOR (a:Answer) REQUIRE (a.id) IS UNIQUE"
-    )
-    driver.query(
-        "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE (u.id) IS UNIQUE"
-    )
-    driver.query(
-        "CREATE CONSTRAINT tag_name IF NOT EXISTS FOR (t:Tag) REQUIRE (t.name) IS UNIQUE"
-    )
+        return {"driver_per_request": run(per_request), "pooled_driver": run(pooled)}
+    finally:
+        shared_driver.close()
 
 
+if __name__ == "__main__":
+    import sys
+    from config import Settings
 
+    if len(sys.argv) < 3 or sys.argv[1] != "bench":
+        print("usage: python -m db.neo4j bench <user_id> [requests] [concurrency]")
+        sys.exit(2)
 
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+    for name, result in benchmark_list_session(Settings(), sys.argv[2], requests, concurrency).items():
+        print(f"{name:<20} p50 {result['p50_ms']}ms  p99 {result['p99_ms']}ms  {result['requests_per_second']} req/s")
@@ -0,0 +1,277 @@
+import re
+
+'''
+queries.py [Shared Cypher]
+
+The hot lookups behind the API routes and the PDF ingestion, plus every statement
+`Neo4jDatabase` and `AsyncNeo4jDatabase` both run. These classes,
+services/background_task.py and `python -m db.schema check` all use these strings,
+so the check EXPLAINs exactly what the app runs.
+The user lookup, `FIND_USER_QUERY`, lives with its cache in db/user_cache.py.
+
+[ Session ]
+1.  `FIND_SESSION_QUERY`:                   A session by id.
+2.  `LATEST_AI_SESSION_QUERY` / `LATEST_QUIZ_SESSION_QUERY`:  Follow the latest-session pointer.
+3.  `NEWEST_AI_SESSION_QUERY` / `NEWEST_QUIZ_SESSION_QUERY`:  Fallback for users without a pointer.
+4.  `QUIZ_SESSIONS_FOR_USER_QUERY`:         Keyset page of a user's quiz sessions (append `LIMIT $limit`).
+
+[ Chat History ]
+5.  `NEEDS_MESSAGE_BACKFILL_QUERY`:         Whether a session's messages still need their `seq`.
+6.  `CHAT_HISTORY_PAGE_QUERY`:              One page of a session's messages via the `(session_id, seq)` index.
+7.  `CHAT_HISTORY_SUMMARIES_QUERY`:         The newest message of each session of a user.
+8.  `FIND_DETACHED_CHAT_HISTORIES_QUERY`:   Chains left to delete for a session.
+
+[ User ]
+9.  `users_query`:                          Users keyset paginated by id, with an optional `fields` projection.
+    `NUMERIC_USER_IDS_START`:               `after` that starts the integer-id range.
+    `update_user_query`:                    MERGE a user and SET the given properties.
+    `USER_RELATIONSHIPS_QUERY`:             A user's outgoing relationships to other users.
+    `CREATE_LANDING_SESSION_QUERY`:         A new user's landing session.
+
+[ Question ]
+10. `CLAIM_POOLED_QUESTION_QUERY`:          Takes the oldest pre-generated question of a session.
+    `CREATE_QUESTIONS_QUERY` / `CREATE_ANSWERS_QUERY`:  `UNWIND` batches of question nodes / answers.
+    `UPDATE_CURRENT_QUESTION_COUNT_QUERY`:  Sets how many questions of a session were served.
+
+[ Pdf ]
+11. `PDF_FILE_UNCHANGED_QUERY` / `CLAIM_PDF_CHUNKS_QUERY` / `DELETE_STALE_PDF_CHUNKS_QUERY`
+'''
+
+##### Session #####
+
+FIND_SESSION_QUERY = """
+MATCH (s:Session {id: $session_id})
+RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics,
+    s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp, s.sname AS sname,
+    s.score AS score, s.current_question_count AS current_question_count
+"""
+
+# O(1): follow the pointer maintained by `_create_user_session`
+LATEST_AI_SESSION_QUERY = """
+MATCH (u:User {id: $user_id})-[:LATEST_AI_SESSION]->(s:Session)
+RETURN s
+"""
+
+LATEST_QUIZ_SESSION_QUERY = """
+MATCH (u:User {id: $user_id})-[:LATEST_QUIZ_SESSION]->(s:Session)
+RETURN s
+"""
+
+# Users created before the pointer existed, or whose latest session was deleted
+NEWEST_AI_SESSION_QUERY = """
+MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
+WHERE s.question_count = 0
+RETURN s
+ORDER BY s.timestamp DESC
+LIMIT 1
+"""
+
+NEWEST_QUIZ_SESSION_QUERY = """
+MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
+WHERE s.question_count <> 0
+RETURN s
+ORDER BY s.timestamp DESC
+LIMIT 1
+"""
+
+# Keyset pagination, newest first: (`after_timestamp`, `after_id`) is the last
+# session of the previous page, so no page re-reads the ones before it and
+# sessions created in the same instant are neither skipped nor repeated.
+QUIZ_SESSIONS_FOR_USER_QUERY = """
+MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)
+WHERE s.question_count <> 0
+  AND ($after_timestamp IS NULL
+    OR s.timestamp < datetime($after_timestamp)
+    OR (s.timestamp = datetime($after_timestamp) AND s.id < $after_id))
+RETURN s.id AS session_id, s.question_count AS question_count, s.topics AS topics, s.selected_pdfs AS selected_pdfs, s.timestamp AS timestamp, s.sname AS sname, s.score AS score, s.current_question_count AS current_question_count
+ORDER BY s.timestamp DESC, s.id DESC
+"""
+
+##### Chat History #####
+
+NEEDS_MESSAGE_BACKFILL_QUERY = """
+MATCH (s:Session {id: $session_id})-[:LAST_MESSAGE]->(last_message)
+RETURN s.message_count IS NULL OR last_message.seq IS NULL AS needs_backfill
+"""
+
+CHAT_HISTORY_PAGE_QUERY = """
+MATCH (s:Session {id: $session_id})
+MATCH (m:Message {session_id: $session_id})
+// Messages before `history_start` belong to a chain that is being deleted
+WHERE m.seq >= coalesce(s.history_start, 0)
+  AND ($before IS NULL OR m.seq < $before)
+RETURN m.seq AS seq, {data: {content: m.content}, type: m.type} AS result
+ORDER BY m.seq DESC
+LIMIT $limit
+"""
+
+# Sessions not yet numbered by `python -m db.schema apply`: the newest `limit`
+# messages only, walked back from the head. Variable-length bounds cannot be
+# parameters, format in `limit - 1`.
+LEGACY_CHAT_HISTORY_PAGE_QUERY = """
+MATCH (s:Session {id: $session_id})-[:LAST_MESSAGE]->(last_message)
+MATCH p=(last_message)<-[:NEXT*0..%d]-(oldest)
+WITH p
+ORDER BY length(p) DESC
+LIMIT 1
+UNWIND reverse(nodes(p)) AS message
+RETURN {data: {content: message.content}, type: message.type} AS result
+"""
+
+CHAT_HISTORY_SUMMARIES_QUERY = """
+MATCH (u:User {id: $user_id})-[:HAS_SESSION]->(s:Session)-[:LAST_MESSAGE]->(last_message)
+RETURN s.id AS session_id, s.sname AS sname, s.timestamp AS timestamp,
+    s.message_count - coalesce(s.history_start, 0) AS message_count,
+    {data: {content: last_message.content}, type: last_message.type} AS last_message
+ORDER BY s.timestamp DESC
+LIMIT $limit
+"""
+
+FIND_DETACHED_CHAT_HISTORIES_QUERY = """
+MATCH (h:DetachedChatHistory {session_id: $session_id})
+RETURN h.id AS history_id
+"""
+
+##### User #####
+
+# allowed in the `fields` projection of `users_query`
+USER_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def user_projection(fields=None):
+    # `fields` are interpolated into Cypher, so only plain identifiers are accepted.
+    # `id` is always returned since it is the pagination key.
+    relationships = """relationships: [(u)-[r]->(other:User) | {
+        type: type(r),
+        target: other.username,
+        target_id: other.id
+    }]"""
+    if not fields:
+        return "u {.*, %s}" % relationships
+
+    invalid = [f for f in fields if not USER_FIELD_PATTERN.match(f)]
+    if invalid:
+        raise ValueError(f"Invalid user fields: {', '.join(invalid)}")
+
+    items = [".id"] + [f".{f}" for f in dict.fromkeys(fields) if f not in ("id", "relationships")]
+    if "relationships" in fields:
+        items.append(relationships)
+    return "u {%s}" % ", ".join(items)
+
+# `u.id > $after` only matches ids of the type of `after`, so users are listed in
+# two index-seeked ranges: string ids from `after = ""`, then integer ids
+# (imported StackOverflow users) from this value.
+NUMERIC_USER_IDS_START = float("-inf")
+
+def users_query(fields=None, limit=None):
+    # `u.id > $after ORDER BY u.id` lets the planner seek and order through the
+    # `user_id` constraint index, for either range.
+    query = """
+    MATCH (u:User)
+    WHERE u.id > $after
+    RETURN %s AS u
+    ORDER BY u.id
+    """ % user_projection(fields)
+    if limit is not None:
+        query += "LIMIT $limit"
+    return query
+
+def update_user_query(keys, username=False):
+    # property keys come from the code, not from the request body
+    set_clauses = [f"u.{key} = ${key}" for key in keys]
+    if username:
+        set_clauses.append("u.username = $username")
+    return """
+    MERGE (u:User {id: $user_id})
+    SET %s
+    """ % ", ".join(set_clauses)
+
+USER_RELATIONSHIPS_QUERY = """
+MATCH (u:User {id: $user_id})-[r]->(other:User)
+RETURN {
+    from: u.username,
+    type: type(r),
+    to: other.username,
+    to_id: other.id
+} as relationship
+"""
+
+# the landing session shares its id with the user
+CREATE_LANDING_SESSION_QUERY = """
+MERGE (u:User {id: $user_id})
+CREATE (s:Session {
+    id: $session_id,
+    timestamp: datetime(),
+    sname: 'landing session',
+    question_count: 0,
+    topics: [],
+    selected_pdfs: [],
+    score: 0,
+    current_question_count: 0
+})
+CREATE (u)-[:landing_session]->(s)
+"""
+
+##### Question #####
+
+# rows carry their own session_id, so the write-behind buffer can mix sessions in one batch
+CREATE_QUESTIONS_QUERY = """
+UNWIND $questions AS row
+MATCH (s:Session {id: row.session_id})
+CREATE (q:Question {
+    id: row.question_id,
+    text: row.question_text,
+    difficulty: row.difficulty,
+    completeness: row.completeness,
+    xp: row.xp,
+    pooled: coalesce(row.pooled, false),
+    timestamp: datetime()
+})
+CREATE (s)-[:CONTAINS]->(q)
+RETURN count(q) AS created
+"""
+
+UPDATE_CURRENT_QUESTION_COUNT_QUERY = """
+MATCH (s:Session {id: $session_id})
+SET s.current_question_count = $current_question_count
+RETURN s
+"""
+
+# rows carry their own user_id, so the write-behind buffer can mix users in one batch
+CREATE_ANSWERS_QUERY = """
+UNWIND $answers AS row
+MERGE (u:User {id: row.user_id})
+CREATE (a:Answer {question: row.question, answer: row.answer, isCorrect: row.is_correct, timestamp: datetime()})
+CREATE (u)-[:SUBMITTED]->(a)
+"""
+
+# write-lock the session first, so two concurrent claims never get the same question
+CLAIM_POOLED_QUESTION_QUERY = """
+MATCH (s:Session {id: $session_id})
+SET s._lock = true REMOVE s._lock
+WITH s
+MATCH (s)-[:CONTAINS]->(q:Question {pooled: true})
+WITH q ORDER BY q.timestamp LIMIT 1
+SET q.pooled = false, q.served_at = datetime()
+RETURN q {.id, .text, .difficulty, .completeness, .xp} AS q
+"""
+
+##### Pdf #####
+
+PDF_FILE_UNCHANGED_QUERY = """
+MATCH (f:PdfFile {user_id: $user_id, filename: $filename})
+RETURN f.file_hash = $file_hash AND f.complete AS unchanged
+"""
+
+CLAIM_PDF_CHUNKS_QUERY = """
+UNWIND $ids AS id
+MATCH (c:PdfBotChunk {id: id})
+SET c.file_hash = $file_hash
+RETURN collect(c.id) AS ids
+"""
+
+# only the chunks of the replaced version of a file, never the whole collection
+DELETE_STALE_PDF_CHUNKS_QUERY = """
+MATCH (c:PdfBotChunk {user_id: $user_id, filename: $filename})
+WHERE c.file_hash IS NULL OR c.file_hash <> $file_hash
+CALL { WITH c DETACH DELETE c } IN TRANSACTIONS OF $batch_size ROWS
+"""
@@ -0,0 +1,313 @@
+import sys
+import logging
+
+from neo4j.exceptions import ClientError
+
+from db.user_cache import FIND_USER_QUERY
+from db.queries import (
+    users_query,
+    FIND_SESSION_QUERY, LATEST_AI_SESSION_QUERY, LATEST_QUIZ_SESSION_QUERY,
+    NEWEST_QUIZ_SESSION_QUERY, QUIZ_SESSIONS_FOR_USER_QUERY,
+    NEEDS_MESSAGE_BACKFILL_QUERY, CHAT_HISTORY_PAGE_QUERY, LEGACY_CHAT_HISTORY_PAGE_QUERY,
+    CHAT_HISTORY_SUMMARIES_QUERY,
+    FIND_DETACHED_CHAT_HISTORIES_QUERY, CLAIM_POOLED_QUESTION_QUERY,
+    USER_RELATIONSHIPS_QUERY, CREATE_QUESTIONS_QUERY,
+    PDF_FILE_UNCHANGED_QUERY, CLAIM_PDF_CHUNKS_QUERY, DELETE_STALE_PDF_CHUNKS_QUERY,
+)
+
+'''
+schema.py [Database Schema]
+
+Every constraint and index the app relies on is declared here and applied at
+startup. Bump `SCHEMA_VERSION` whenever `CONSTRAINTS` or `INDEXES` change.
+
+[ Bootstrap ]
+1.  `apply_schema`:             Creates missing constraints/indexes and records the schema version.
+2.  `get_schema_version`:       (Read) the version stored on the `SchemaVersion` node.
+
+[ Migrations ]
+3.  `backfill_message_sequence`: Numbers the messages of sessions written before `seq`, in
+                                bounded batches. Only run by `apply` from the command line.
+
+[ Check ]
+4.  `explain_query`:            Runs `EXPLAIN` on a query and returns the operators of its plan.
+5.  `check_queries`:            EXPLAINs the hot queries (db/queries.py) and reports the ones that still scan a label.
+
+Usage (from backend/app):
+    python -m db.schema apply [--force] [--batch-size N]
+    python -m db.schema check
+'''
+
+SCHEMA_VERSION = 2
+
+# (name, statement, fallback) - the fallback is a plain index, used when existing
+# duplicates prevent the uniqueness constraint from being created
+CONSTRAINTS = [
+    # stackoverflow import, also the quiz `Question` nodes from `_create_question_node`
+    ("question_id", "CREATE CONSTRAINT question_id IF NOT EXISTS FOR (q:Question) REQUIRE (q.id) IS UNIQUE", None),
+    ("answer_id", "CREATE CONSTRAINT answer_id IF NOT EXISTS FOR (a:Answer) REQUIRE (a.id) IS UNIQUE", None),
+    ("user_id", "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE (u.id) IS UNIQUE", None),
+    ("tag_name", "CREATE CONSTRAINT tag_name IF NOT EXISTS FOR (t:Tag) REQUIRE (t.name) IS UNIQUE", None),
+    # chat history, rename, delete and question count updates all match on Session.id
+    ("session_id", "CREATE CONSTRAINT session_id IF NOT EXISTS FOR (s:Session) REQUIRE (s.id) IS UNIQUE",
+        "CREATE INDEX session_id_lookup IF NOT EXISTS FOR (s:Session) ON (s.id)"),
+    ("detached_chat_history_id", "CREATE CONSTRAINT detached_chat_history_id IF NOT EXISTS FOR (h:DetachedChatHistory) REQUIRE (h.id) IS UNIQUE", None),
+    # content-addressed PDF chunks and the per-file ingestion record, see `save_pdf_to_neo4j`
+    ("pdf_chunk_id", "CREATE CONSTRAINT pdf_chunk_id IF NOT EXISTS FOR (c:PdfBotChunk) REQUIRE (c.id) IS UNIQUE",
+        "CREATE INDEX pdf_chunk_id_lookup IF NOT EXISTS FOR (c:PdfBotChunk) ON (c.id)"),
+    ("pdf_file_key", "CREATE CONSTRAINT pdf_file_key IF NOT EXISTS FOR (f:PdfFile) REQUIRE (f.user_id, f.filename) IS UNIQUE",
+        "CREATE INDEX pdf_file_lookup IF NOT EXISTS FOR (f:PdfFile) ON (f.user_id, f.filename)"),
+]
+
+# (name, statement)
+INDEXES = [
+    ("session_timestamp", "CREATE INDEX session_timestamp IF NOT EXISTS FOR (s:Session) ON (s.timestamp)"),
+    ("user_username", "CREATE INDEX user_username IF NOT EXISTS FOR (u:User) ON (u.username)"),
+    # chat history paging, see `SequencedChatMessageHistory`
+    ("message_session_seq", "CREATE INDEX message_session_seq IF NOT EXISTS FOR (m:Message) ON (m.session_id, m.seq)"),
+    ("detached_chat_history_session", "CREATE INDEX detached_chat_history_session IF NOT EXISTS FOR (h:DetachedChatHistory) ON (h.session_id)"),
+    ("stackoverflow", "CREATE VECTOR INDEX stackoverflow IF NOT EXISTS FOR (m:Question) ON m.embedding"),
+    ("top_answers", "CREATE VECTOR INDEX top_answers IF NOT EXISTS FOR (m:Answer) ON m.embedding"),
+    ("pdf_chunk_file", "CREATE INDEX pdf_chunk_file IF NOT EXISTS FOR (c:PdfBotChunk) ON (c.user_id, c.filename)"),
+]
+
+# The lookups behind the API routes, with representative parameters. The query
+# strings are the ones the app runs (db/queries.py, db/user_cache.py).
+# None of them should plan a `NodeByLabelScan` or `AllNodesScan`.
+CHECK_QUERIES = {
+    "session_by_id": (FIND_SESSION_QUERY, {"session_id": "check"}),
+    "needs_message_backfill": (NEEDS_MESSAGE_BACKFILL_QUERY, {"session_id": "check"}),
+    "chat_history_page": (CHAT_HISTORY_PAGE_QUERY, {"session_id": "check", "before": 20, "limit": 20}),
+    "legacy_chat_history_page": (LEGACY_CHAT_HISTORY_PAGE_QUERY % 19, {"session_id": "check"}),
+    "chat_history_summaries": (CHAT_HISTORY_SUMMARIES_QUERY, {"user_id": "check", "limit": 50}),
+    "detached_chat_history": (FIND_DETACHED_CHAT_HISTORIES_QUERY, {"session_id": "check"}),
+    "user_by_id": (FIND_USER_QUERY, {"user_id": "check"}),
+    "users_page": (users_query(["username"], limit=100), {"after": "", "limit": 100}),
+    "latest_ai_session": (LATEST_AI_SESSION_QUERY, {"user_id": "check"}),
+    "latest_quiz_session": (LATEST_QUIZ_SESSION_QUERY, {"user_id": "check"}),
+    "newest_quiz_session": (NEWEST_QUIZ_SESSION_QUERY, {"user_id": "check"}),
+    "quiz_sessions_for_user": (
+        QUIZ_SESSIONS_FOR_USER_QUERY + "LIMIT $limit",
+        {"user_id": "check", "after_timestamp": None, "after_id": None, "limit": 101},
+    ),
+    "claim_pooled_question": (CLAIM_POOLED_QUESTION_QUERY, {"session_id": "check"}),
+    "user_relationships": (USER_RELATIONSHIPS_QUERY, {"user_id": "check"}),
+    "create_questions": (CREATE_QUESTIONS_QUERY, {"questions": [{"session_id": "check"}]}),
+    "pdf_file_unchanged": (
+        PDF_FILE_UNCHANGED_QUERY,
+        {"user_id": "check", "filename": "check.pdf", "file_hash": "check"},
+    ),
+    "claim_pdf_chunks": (CLAIM_PDF_CHUNKS_QUERY, {"ids": ["check"], "file_hash": "check"}),
+    "delete_stale_pdf_chunks": (
+        DELETE_STALE_PDF_CHUNKS_QUERY,
+        {"user_id": "check", "filename": "check.pdf", "file_hash": "check", "batch_size": 500},
+    ),
+}
+
+LABEL_SCANS = ("NodeByLabelScan", "AllNodesScan")
+
+
+def get_schema_version(driver, database=None):
+    records, _, _ = driver.execute_query(
+        "MATCH (v:SchemaVersion {name: 'app'}) RETURN v.version AS version",
+        database_=database,
+    )
+    return records[0]["version"] if records else None
+
+def _run_schema_statement(driver, name, statement, database=None):
+    try:
+        driver.execute_query(statement, database_=database)
+        return True
+    except ClientError as e:
+        logging.warning(f"Could not apply schema item {name}: {e.message}")
+        return False
+
+def apply_schema(driver, database=None, force=False):
+    """
+    Create every declared constraint and index. Statements use `IF NOT EXISTS`,
+    so re-running is harmless; unless `force` is set the work is skipped once
+    the stored version matches `SCHEMA_VERSION`.
+    """
+    current = get_schema_version(driver, database)
+    if current is not None and current >= SCHEMA_VERSION and not force:
+        logging.info(f"Neo4j schema is up to date (version {current})")
+        return current
+
+    for name, statement, fallback in CONSTRAINTS:
+        if not _run_schema_statement(driver, name, statement, database) and fallback:
+            logging.warning(f"Falling back to a non-unique index for {name}")
+            _run_schema_statement(driver, name, fallback, database)
+
+    for name, statement in INDEXES:
+        _run_schema_statement(driver, name, statement, database)
+
+    driver.execute_query(
+        """
+        MERGE (v:SchemaVersion {name: 'app'})
+        SET v.version = $version, v.applied_at = datetime()
+        """,
+        version=SCHEMA_VERSION,
+        database_=database,
+    )
+    logging.info(f"Neo4j schema applied (version {current} -> {SCHEMA_VERSION})")
+    return SCHEMA_VERSION
+
+###### Migrations #####
+# Sessions whose messages predate `seq`. A one-off scan over `Session`, so it
+# stays out of `CHECK_QUERIES`.
+_UNNUMBERED_SESSIONS_QUERY = """
+MATCH (s:Session)-[:LAST_MESSAGE]->(last_message)
+WHERE (s.message_count IS NULL OR last_message.seq IS NULL) AND NOT s.id IN $skipped
+RETURN s.id AS session_id, elementId(last_message) AS head
+LIMIT $limit
+"""
+
+# Walks back at most `batch_size` messages from `cursor`, numbering them from
+# the newest (`_rseq`) since the length of the chain is not known yet. With
+# `skip` = 1 the cursor itself was numbered by the previous step.
+_NUMBER_MESSAGES_STEP_QUERY = """
+MATCH (start:Message) WHERE elementId(start) = $cursor
+MATCH p=(start)<-[:NEXT*0..%d]-(oldest)
+WITH p
+ORDER BY length(p) DESC
+LIMIT 1
+WITH nodes(p) AS messages
+UNWIND range($skip, size(messages) - 1) AS i
+WITH messages, messages[i] AS message, i
+SET message._rseq = $numbered + i - $skip, message.session_id = $session_id
+WITH DISTINCT messages, last(messages) AS oldest
+RETURN elementId(oldest) AS cursor, size(messages) - $skip AS numbered,
+    NOT EXISTS { ()-[:NEXT]->(oldest) } AS reached_first
+"""
+
+_ASSIGN_SEQ_BATCH_QUERY = """
+MATCH (m:Message {session_id: $session_id})
+WHERE m._rseq IS NOT NULL
+WITH m LIMIT $batch_size
+SET m.seq = $total - 1 - m._rseq
+REMOVE m._rseq
+RETURN count(m) AS assigned
+"""
+
+# Only once nothing was appended meanwhile; the write lock is the one
+# `SequencedChatMessageHistory.add_message` takes, so appends queue behind it.
+_FINISH_SESSION_QUERY = """
+MATCH (s:Session {id: $session_id})
+SET s._lock = true REMOVE s._lock
+WITH s
+MATCH (s)-[:LAST_MESSAGE]->(last_message)
+WHERE elementId(last_message) = $head
+SET s.message_count = $total
+RETURN count(s) AS finished
+"""
+
+def _number_session_messages(driver, session_id, head, batch_size, database=None):
+    cursor, numbered, skip = head, 0, 0
+    while True:
+        records, _, _ = driver.execute_query(
+            _NUMBER_MESSAGES_STEP_QUERY % batch_size,
+            cursor=cursor, skip=skip, numbered=numbered, session_id=session_id,
+            database_=database,
+        )
+        if not records:
+            return 0
+        cursor, skip = records[0]["cursor"], 1
+        numbered += records[0]["numbered"]
+        if records[0]["reached_first"]:
+            break
+
+    while True:
+        records, _, _ = driver.execute_query(
+            _ASSIGN_SEQ_BATCH_QUERY,
+            session_id=session_id, total=numbered, batch_size=batch_size,
+            database_=database,
+        )
+        if not records[0]["assigned"]:
+            break
+
+    records, _, _ = driver.execute_query(
+        _FINISH_SESSION_QUERY, session_id=session_id, head=head, total=numbered, database_=database,
+    )
+    # a message was appended meanwhile: the session stays unnumbered until the next run
+    return numbered if records and records[0]["finished"] else 0
+
+def backfill_message_sequence(driver, database=None, batch_size=1000):
+    """
+    Give every message of the sessions written before messages were numbered its
+    `seq`, and the session its `message_count`, so their history can be paged.
+
+    Each transaction touches at most `batch_size` messages: the `NEXT` chain is
+    walked back from the head in steps, then the final numbers are assigned in
+    batches. Safe to interrupt and re-run. Returns `(sessions, messages)` numbered.
+    """
+    sessions = messages = 0
+    # sessions that could not be finished (appended to meanwhile) are left for the next run
+    skipped = []
+    while True:
+        records, _, _ = driver.execute_query(
+            _UNNUMBERED_SESSIONS_QUERY, skipped=skipped, limit=100, database_=database,
+        )
+        if not records:
+            break
+        for record in records:
+            numbered = _number_session_messages(driver, record["session_id"], record["head"], batch_size, database)
+            if numbered:
+                sessions += 1
+                messages += numbered
+            else:
+                skipped.append(record["session_id"])
+    logging.info(f"Numbered {messages} messages in {sessions} sessions")
+    return sessions, messages
+
+def _plan_operators(plan):
+    # operator types may carry a runtime suffix, e.g. `NodeByLabelScan@neo4j`
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(_plan_operators(child))
+    return operators
+
+def explain_query(driver, query, params=None, database=None):
+    # auto-commit, so queries using `CALL { ... } IN TRANSACTIONS` can be explained too
+    with driver.session(database=database) as session:
+        summary = session.run("EXPLAIN " + query, params or {}).consume()
+    return _plan_operators(summary.plan)
+
+def check_queries(driver, database=None):
+    """
+    EXPLAIN every entry of `CHECK_QUERIES` and return `{name: [label scan operators]}`
+    for the ones that would still scan a whole label.
+    """
+    problems = {}
+    for name, (query, params) in CHECK_QUERIES.items():
+        operators = explain_query(driver, query, params, database)
+        scans = [op for op in operators if op in LABEL_SCANS]
+        if scans:
+            problems[name] = scans
+    return problems
+
+
+if __name__ == "__main__":
+    from config import Settings
+    from db.neo4j import create_driver
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("apply", "check"):
+        print("usage: python -m db.schema apply [--force] [--batch-size N] | check")
+        sys.exit(2)
+
+    logging.basicConfig(level=logging.INFO)
+    driver = create_driver(Settings())
+    try:
+        if sys.argv[1] == "apply":
+            version = apply_schema(driver, force="--force" in sys.argv[2:])
+            print(f"schema version {version}")
+            batch_size = int(sys.argv[sys.argv.index("--batch-size") + 1]) if "--batch-size" in sys.argv else 1000
+            sessions, messages = backfill_message_sequence(driver, batch_size=batch_size)
+            print(f"numbered {messages} messages in {sessions} sessions")
+        else:
+            problems = check_queries(driver)
+            for name in CHECK_QUERIES:
+                status = "LABEL SCAN " + ", ".join(problems[name]) if name in problems else "ok"
+                print(f"{name:<28} {status}")
+            sys.exit(1 if problems else 0)
+    finally:
+        driver.close()
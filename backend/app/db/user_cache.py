@@ -0,0 +1,267 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from neo4j.time import Date, DateTime, Duration, Time
+
+'''
+user_cache.py [User Node Cache]
+
+Read-through cache of user node properties (plus outgoing user relationships),
+keyed by user id. Serves `get_user_by_id` and `get_user_preferences`; every
+write that touches a user node invalidates its entry, and a relationship write
+invalidates both of its endpoints.
+
+[ Backends ]
+1.  `MemoryCacheBackend`:       In-process TTL + LRU (default, per worker).
+2.  `MongoCacheBackend`:        Shared `user_cache` collection with a TTL index, so
+                                invalidations are seen by every worker. Neo4j temporal values
+                                are stored as tagged ISO strings and read back as the same type
+                                (`python -m db.user_cache check`).
+
+[ Cache ]
+3.  `UserCache`:                `get` / `set` / `invalidate` (+ `aget` / `aset` / `ainvalidate`
+                                for async callers) and hit-rate `stats`.
+4.  `configure_user_cache`:     Applies `USER_CACHE_*` settings to the process-wide `user_cache`.
+'''
+
+# Same projection as `_find_user_by_id`, so every reader caches the same shape
+FIND_USER_QUERY = """
+MATCH (u:User {id: $user_id})
+RETURN u {.*, relationships: [(u)-[r]->(other:User) | {
+    type: type(r),
+    target: other.username,
+    target_id: other.id
+}]} AS u
+"""
+
+# neo4j temporal values are not BSON-encodable
+_TEMPORAL_TYPES = {cls.__name__: cls for cls in (DateTime, Date, Time, Duration)}
+_TEMPORAL_TAG = "__neo4j_temporal__"
+
+
+class MemoryCacheBackend:
+    shared = False
+
+    def __init__(self, ttl=60.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def size(self):
+        return len(self._entries)
+
+
+def _to_document(value):
+    if isinstance(value, tuple(_TEMPORAL_TYPES.values())):
+        return {_TEMPORAL_TAG: type(value).__name__, "iso": value.iso_format()}
+    if isinstance(value, dict):
+        return {key: _to_document(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_document(item) for item in value]
+    return value
+
+def _from_document(value):
+    if isinstance(value, dict):
+        if _TEMPORAL_TAG in value:
+            return _TEMPORAL_TYPES[value[_TEMPORAL_TAG]].from_iso_format(value["iso"])
+        return {key: _from_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_from_document(item) for item in value]
+    return value
+
+
+class MongoCacheBackend:
+    shared = True
+
+    def __init__(self, mongodb_uri, database, ttl=60.0, collection="user_cache"):
+        from pymongo import MongoClient
+
+        self.ttl = ttl
+        self.evictions = 0
+        self._collection = MongoClient(mongodb_uri, serverSelectionTimeoutMS=2000)[database][collection]
+        # Mongo removes expired documents in the background; `get` also checks the expiry itself
+        self._collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key):
+        doc = self._collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        return _from_document(doc["value"]) if doc else None
+
+    def set(self, key, value):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        doc = {"_id": key, "value": _to_document(value), "expires_at": expires_at}
+        self._collection.replace_one({"_id": key}, doc, upsert=True)
+
+    def delete(self, *keys):
+        self._collection.delete_many({"_id": {"$in": list(keys)}})
+
+    def clear(self):
+        self._collection.delete_many({})
+
+    def size(self):
+        return self._collection.estimated_document_count()
+
+
+class UserCache:
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend or MemoryCacheBackend()
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(user_id)
+        except Exception as e:
+            logging.warning(f"User cache read failed for {user_id}: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # callers get their own copy, the cached entry stays untouched
+        return dict(value)
+
+    def set(self, user_id, user):
+        if not self.enabled or user is None:
+            return
+        try:
+            self.backend.set(user_id, dict(user))
+        except Exception as e:
+            logging.warning(f"User cache write failed for {user_id}: {e}")
+
+    def invalidate(self, *user_ids):
+        if not self.enabled or not user_ids:
+            return
+        try:
+            self.backend.delete(*user_ids)
+        except Exception as e:
+            logging.warning(f"User cache invalidation failed for {user_ids}: {e}")
+
+    # A shared backend does blocking I/O, keep it off the event loop
+    async def aget(self, user_id):
+        if self.backend.shared:
+            return await asyncio.to_thread(self.get, user_id)
+        return self.get(user_id)
+
+    async def aset(self, user_id, user):
+        if self.backend.shared:
+            return await asyncio.to_thread(self.set, user_id, user)
+        return self.set(user_id, user)
+
+    async def ainvalidate(self, *user_ids):
+        if self.backend.shared:
+            return await asyncio.to_thread(self.invalidate, *user_ids)
+        return self.invalidate(*user_ids)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.backend.evictions,
+            "size": size,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.backend.evictions = 0
+
+
+user_cache = UserCache()
+
+def configure_user_cache(settings):
+    if settings.user_cache_backend == "mongo":
+        backend = MongoCacheBackend(settings.mongodb_uri, settings.mongodb_, ttl=settings.user_cache_ttl)
+    else:
+        backend = MemoryCacheBackend(ttl=settings.user_cache_ttl, max_entries=settings.user_cache_max_entries)
+    user_cache.backend = backend
+    user_cache.enabled = settings.user_cache_ttl > 0
+    return user_cache
+
+
+def self_check():
+    """
+    A user with temporal properties survives the trip through a BSON document
+    (what `MongoCacheBackend` stores) unchanged.
+    """
+    import bson
+
+    user = {
+        "id": "u1",
+        "username": "alice",
+        "created_at": DateTime(2024, 5, 1, 12, 30, 15, 123456789, tzinfo=timezone.utc),
+        "birthday": Date(2001, 2, 3),
+        "reminder": Time(8, 15, 0),
+        "streak": Duration(days=3, hours=2),
+        "relationships": [{"type": "FRIEND", "target": "bob", "target_id": "u2",
+                           "since": DateTime(2024, 1, 1, tzinfo=timezone.utc)}],
+    }
+    stored = bson.decode(bson.encode({"value": _to_document(user)}))["value"]
+    restored = _from_document(stored)
+    failures = []
+    for key, expected in user.items():
+        if restored.get(key) != expected or type(restored.get(key)) is not type(expected):
+            failures.append(f"{key}: expected {expected!r}, got {restored.get(key)!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "check":
+        print("usage: python -m db.user_cache check")
+        sys.exit(2)
+
+    failures = self_check()
+    for failure in failures:
+        print("FAIL", failure)
+    print("cached user round-trip " + ("failed" if failures else "passed"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
+
+from db.neo4j import Neo4jDatabase, get_driver
+
+'''
+write_buffer.py [Write-Behind Buffer]
+
+Coalesces small Neo4j writes (question nodes, answers) that arrive within a short
+window into one `UNWIND` transaction per kind, so a burst of N submissions costs a
+few commits instead of N. A failed batch is retried row by row, so one bad row
+only fails its own caller.
+
+Every `create_question_node` / `save_answer` returns a `concurrent.futures.Future`
+that resolves once its batch is committed: wait on it (`.result()`, or
+`asyncio.wrap_future` from async code) when the caller needs to read its own write,
+or drop it for fire-and-forget.
+
+[ Buffer ]
+1.  `WriteBehindBuffer`:        Background flusher thread (`create_question_node`, `save_answer`, `flush`, `close`).
+2.  `configure_write_buffer`:   Applies the window / batch size from `Settings`.
+'''
+
+# kind -> transaction function taking the list of rows
+_WRITERS = {
+    "question": Neo4jDatabase._create_question_nodes,
+    "answer": Neo4jDatabase._create_answer_records,
+}
+
+
+class WriteBehindBuffer:
+    def __init__(self, window_ms=50.0, max_batch=500, driver_getter=get_driver):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._driver_getter = driver_getter
+        self._cond = threading.Condition()
+        self._pending = []  # [(kind, row, future)]
+        self._thread = None
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+
+    def create_question_node(self, session_id, question_id, question_text, difficulty, completeness, xp, pooled=False):
+        return self._add("question", {
+            "session_id": session_id,
+            "question_id": question_id,
+            "question_text": question_text,
+            "difficulty": difficulty,
+            "completeness": completeness,
+            "xp": xp,
+            "pooled": pooled,
+        })
+
+    def save_answer(self, user_id, question, answer, is_correct):
+        return self._add("answer", {
+            "user_id": user_id,
+            "question": question,
+            "answer": answer,
+            "is_correct": is_correct,
+        })
+
+    def _add(self, kind, row):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+            self._pending.append((kind, row, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="neo4j-write-buffer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+            # let the burst build up, unless a full batch is already waiting
+            deadline = time.monotonic() + self.window_ms / 1000
+            with self._cond:
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                pending, self._pending = self._pending, []
+            self._write(pending)
+
+    def _write(self, pending):
+        # Any failure outside a batch (e.g. no driver yet) must still resolve every
+        # future, or its waiters hang and the flusher thread dies.
+        # Futures cancelled by their waiter (e.g. a disconnected client) get no result,
+        # their rows are still written; the others can no longer be cancelled from here on.
+        pending = [
+            (kind, row, future if future.set_running_or_notify_cancel() else None)
+            for kind, row, future in pending
+        ]
+        try:
+            self._write_batches(pending)
+        except Exception as e:
+            logging.error(f"Write buffer failed to flush {len(pending)} row(s): {e}")
+            for _, _, future in pending:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+
+    def _write_batches(self, pending):
+        by_kind = {}
+        for kind, row, future in pending:
+            by_kind.setdefault(kind, []).append((row, future))
+
+        driver = self._driver_getter()
+        for kind, items in by_kind.items():
+            for start in range(0, len(items), self.max_batch):
+                chunk = items[start:start + self.max_batch]
+                try:
+                    self._write_chunk(driver, kind, chunk)
+                except (ServiceUnavailable, SessionExpired) as e:
+                    # the database is unreachable, writing the rows one by one would fail the same way
+                    self._fail(kind, chunk, e)
+                except Exception as e:
+                    if len(chunk) == 1:
+                        self._fail(kind, chunk, e)
+                        continue
+                    # rows of unrelated requests share the batch: retry them one by one,
+                    # so only the offending row's future gets the error
+                    logging.warning(f"Write buffer batch of {len(chunk)} {kind} row(s) failed, retrying row by row: {e}")
+                    for item in chunk:
+                        try:
+                            self._write_chunk(driver, kind, [item])
+                        except Exception as row_error:
+                            self._fail(kind, [item], row_error)
+
+    def _write_chunk(self, driver, kind, chunk):
+        with driver.session() as session:
+            session.write_transaction(_WRITERS[kind], [row for row, _ in chunk])
+        self.batches += 1
+        self.rows += len(chunk)
+        for _, future in chunk:
+            if future is not None:
+                future.set_result(True)
+
+    def _fail(self, kind, chunk, error):
+        logging.error(f"Write buffer failed to write {len(chunk)} {kind} row(s): {error}")
+        for _, future in chunk:
+            if future is not None:
+                future.set_exception(error)
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything queued so far is written.
+        """
+        with self._cond:
+            futures = [future for _, _, future in self._pending]
+            self._cond.notify()
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "batches": self.batches,
+            "rows": self.rows,
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+        }
+
+
+write_buffer = WriteBehindBuffer()
+
+def configure_write_buffer(settings):
+    write_buffer.window_ms = settings.neo4j_write_buffer_window_ms
+    write_buffer.max_batch = settings.neo4j_write_buffer_max_batch
+    return write_buffer
@@ -1,61 +1,74 @@
-import io
+import time
+import hashlib
 import requests
-from typing import List, Dict, Union
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
 from uuid import UUID, uuid4
 import docker
 from pydantic import BaseModel, Field
 from bs4 import BeautifulSoup as Soup
 from db.mongo import WebfileModel
+from db.neo4j import Neo4jDatabase, get_driver
+from db.queries import PDF_FILE_UNCHANGED_QUERY, CLAIM_PDF_CHUNKS_QUERY, DELETE_STALE_PDF_CHUNKS_QUERY
+from db.instrumentation import instrument_graph
 
 client = docker.from_env()
 
 from services.chains import (
-    load_embedding_model,
+    get_embedding_model,
+    get_pdf_vector_store,
 )
+from services.pdf_extract import PdfExtraction, get_extract_pool
 from config import Settings, BaseLogger
 
 from langchain_neo4j import Neo4jVector, Neo4jGraph
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders.recursive_url_loader import RecursiveUrlLoader
 
-from PyPDF2 import PdfReader
 
 '''
 background_task.py
 
 [ Pdf ]
-1. save_pdf_to_neo4j:        Extracts text from a PDF, splits it into chunks, and stores it in a Neo4j vector database.  
+1. save_pdf_to_neo4j:        Streams a PDF page by page through the splitter and embedding batches into the Neo4j vector index.  
+1. iter_pdf_chunks:          Splits the pages of a PDF into chunks one page at a time (text from `services.pdf_extract`).  
 
 [ Stack Overflow ]
 2. insert_so_data:           Imports Stack Overflow questions and answers into a Neo4j database with embeddings and relationships.  
+2. iter_embedded_batches:    Embeds a stream of texts in ordered `embed_documents` batches, a bounded number in flight.  
+2. embed_in_batches:         Embeds a list of texts through `iter_embedded_batches`, reporting embeddings/s.  
 3. load_so_data:             Fetches Stack Overflow data based on a tag and imports it into Neo4j.
 4. load_high_score_so_data:  Fetches and imports high-voted Stack Overflow data into Neo4j.  
 
+[ Neo4j Maintenance ]
+5. delete_session_in_batches:      Deletes a session, its chat history and questions in fixed-size batches.
+6. delete_chat_history_in_batches: Deletes a session's chat history in fixed-size batches.
+
 [ Web Content ]
-5. load_web_data:            Crawls web content from a given URL, processes it, and stores it in MongoDB.  
-6. verify_submission:        Validates JavaScript code syntax and functionality through ESLint and test cases.  
-7. validate_js_syntax:       Checks JavaScript code syntax using ESLint.  
-8. run_js_tests:             Runs predefined JavaScript test cases in a Node.js Docker container to verify code functionality.  
+7. load_web_data:            Crawls web content from a given URL, processes it, and stores it in MongoDB.  
+8. verify_submission:        Validates JavaScript code syntax and functionality through ESLint and test cases.  
+9. validate_js_syntax:       Checks JavaScript code syntax using ESLint.  
+10. run_js_tests:            Runs predefined JavaScript test cases in a Node.js Docker container to verify code functionality.  
 
 '''
 
 settings = Settings()
 
 # if Neo4j is local, you can go to http://localhost:7474/ to browse the database
-neo4j_graph = Neo4jGraph(url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password, refresh_schema=False)
+neo4j_graph = instrument_graph(Neo4jGraph(url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password, refresh_schema=False))
 
 SO_API_BASE_URL = "https://api.stackexchange.com/2.3/search/advanced"
 
-embeddings = load_embedding_model(
-    settings.embedding_model,
-    config={"ollama_base_url": settings.ollama_base_url},
-    logger=BaseLogger(),
-)
+# shared with the API routes, see `get_embedding_model`
+embeddings = get_embedding_model()
 
 class Job(BaseModel):
     uid: UUID = Field(default_factory=uuid4)
     status: str = "in_progress"
     processed_files: List[str] = Field(default_factory=list)
+    progress: Dict[str, Any] = Field(default_factory=dict)
 
 class Submission(BaseModel):
     jsDoc: str
@@ -64,40 +77,137 @@ class Submission(BaseModel):
 
 
 # Background task for PDF processing
+def iter_pdf_chunks(pages: Iterable[str], text_splitter, on_page=None) -> Iterator[str]:
+    """
+    Split a PDF page by page: only the current page and the unfinished last chunk
+    of the previous one are in memory, never the whole document.
+    """
+    carry = ""
+    for number, page_text in enumerate(pages, start=1):
+        chunks = text_splitter.split_text(carry + page_text)
+        # the last chunk may go on on the next page, split it again together with that page
+        carry = chunks.pop() if chunks else ""
+        if on_page:
+            on_page(number)
+        yield from chunks
+    if carry:
+        yield carry
+
+def pdf_chunk_id(user_id: str, filename: str, text: str) -> str:
+    # content-addressed: the same text of the same file always maps to the same node
+    return hashlib.sha256(f"{user_id}\0{filename}\0{text}".encode("utf-8")).hexdigest()
+
+def pdf_file_unchanged(user_id: str, filename: str, file_hash: str) -> bool:
+    result = neo4j_graph.query(PDF_FILE_UNCHANGED_QUERY, {"user_id": user_id, "filename": filename, "file_hash": file_hash})
+    return bool(result and result[0]["unchanged"])
+
+def mark_pdf_file(user_id: str, filename: str, file_hash: str, complete: bool, chunks: int = None) -> None:
+    neo4j_graph.query("""
+    MERGE (f:PdfFile {user_id: $user_id, filename: $filename})
+    SET f.file_hash = $file_hash, f.complete = $complete, f.chunks = $chunks, f.updated_at = datetime()
+    """, {"user_id": user_id, "filename": filename, "file_hash": file_hash, "complete": complete, "chunks": chunks})
+
+def claim_existing_pdf_chunks(ids: List[str], file_hash: str) -> set:
+    """
+    The chunks of `ids` already stored; they are re-tagged with `file_hash` so the
+    stale-chunk cleanup keeps them.
+    """
+    result = neo4j_graph.query(CLAIM_PDF_CHUNKS_QUERY, {"ids": ids, "file_hash": file_hash})
+    return set(result[0]["ids"]) if result else set()
+
+def delete_stale_pdf_chunks(user_id: str, filename: str, file_hash: str) -> None:
+    # only the chunks of the replaced version of this file, never the whole collection
+    neo4j_graph.query(DELETE_STALE_PDF_CHUNKS_QUERY, {"user_id": user_id, "filename": filename, "file_hash": file_hash, "batch_size": settings.neo4j_delete_batch_size})
+
 def save_pdf_to_neo4j(jobs: dict, task_id: UUID, byte_files: List[dict], user_id: str):
-    for filename, content in byte_files.items():
+    """
+    page -> incremental splitter -> embedding batches -> vector writes, streamed:
+    chunks become queryable batch by batch and memory stays flat however long the
+    PDF is. `Job.progress` follows pages, chunks, embeddings and writes of the
+    current file.
+
+    Ingestion is content-addressed: an unchanged re-upload costs one file hash,
+    chunks already stored are not embedded again, and only the chunks the new
+    version no longer contains are deleted.
+    """
+    # langchain_textspliter
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200, length_function=len
+    )
+    progress = jobs[task_id].progress
+    # text extraction runs in worker processes, one file ahead of the embedding
+    executor = get_extract_pool(settings.pdf_extract_workers)
+    files = list(byte_files.items())
+    file_hashes = {}
+    extractions = {}
+
+    def extract(index):
+        if index >= len(files) or index in extractions:
+            return
+        filename, content = files[index]
+        file_hashes[index] = hashlib.sha256(content).hexdigest()
+        if pdf_file_unchanged(user_id, filename, file_hashes[index]):
+            extractions[index] = None
+        else:
+            extractions[index] = PdfExtraction(content, executor, settings.pdf_extract_pages_per_task)
+
+    for index, (filename, content) in enumerate(files):
+        extraction = None
         try:
-            # Create a file-like object from the content
-            pdf_reader = PdfReader(io.BytesIO(content))
-
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-
-            # langchain_textspliter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000, chunk_overlap=200, length_function=len
-            )
-
-            chunks = text_splitter.split_text(text=text)
-
-            # Store the chunks part in db (vector)
-            Neo4jVector.from_texts(
-                chunks,
-                url=settings.neo4j_uri,
-                username=settings.neo4j_username,
-                password=settings.neo4j_password,
-                embedding=embeddings,
-                index_name="pdf_bot",
-                node_label="PdfBotChunk",
-                pre_delete_collection=True,  # Delete existing PDF data
-                metadatas=[
-                    {"user_id": user_id, "filename": filename}
-                    for _ in range(len(chunks))
-                ],
-            )
-            
+            extract(index)
+            extract(index + 1)
+            extraction = extractions.pop(index)
+            file_hash = file_hashes.pop(index)
+            if extraction is None:
+                progress.update({"file": filename, "unchanged": True})
+                continue
+
+            vector_store = get_pdf_vector_store(embeddings)
+            mark_pdf_file(user_id, filename, file_hash, complete=False)
+
+            stats = {"file": filename, "unchanged": False, "pages": 0, "pages_total": extraction.pages_total,
+                     "chunks": 0, "skipped": 0, "embedded": 0, "written": 0}
+            progress.update(stats)
+
+            def on_page(number):
+                stats["pages"] = number
+                progress.update(stats)
+
+            def new_chunks(chunks):
+                # look up each batch of chunks, only the ones not stored yet go on to be embedded
+                for batch in iter_batches(chunks, max(1, settings.embedding_batch_size)):
+                    stats["chunks"] += len(batch)
+                    existing = claim_existing_pdf_chunks([pdf_chunk_id(user_id, filename, text) for text in batch], file_hash)
+                    for text in batch:
+                        if pdf_chunk_id(user_id, filename, text) in existing:
+                            stats["skipped"] += 1
+                        else:
+                            yield text
+
+            started = time.perf_counter()
+            chunks = new_chunks(iter_pdf_chunks(extraction.pages(), text_splitter, on_page=on_page))
+            for texts, vectors in iter_embedded_batches(chunks):
+                stats["embedded"] += len(texts)
+                # Store the chunks part in db (vector)
+                vector_store.add_embeddings(
+                    texts,
+                    vectors,
+                    metadatas=[{"user_id": user_id, "filename": filename, "file_hash": file_hash} for _ in texts],
+                    ids=[pdf_chunk_id(user_id, filename, text) for text in texts],
+                )
+                stats["written"] += len(texts)
+                elapsed = time.perf_counter() - started
+                stats["embeddings_per_second"] = round(stats["embedded"] / elapsed, 2) if elapsed else None
+                progress.update(stats)
+
+            delete_stale_pdf_chunks(user_id, filename, file_hash)
+            mark_pdf_file(user_id, filename, file_hash, complete=True, chunks=stats["chunks"])
+
         except Exception as error:
+            # the current file's page ranges too, not only the one extracted ahead
+            for pending in [extraction, *extractions.values()]:
+                if pending is not None:
+                    pending.cancel()
             jobs[task_id].status = f"Importing {filename} fails with error: {error}"
             return
         finally:
@@ -106,15 +216,60 @@ def save_pdf_to_neo4j(jobs: dict, task_id: UUID, byte_files: List[dict], user_id
     jobs[task_id].status = "completed"
 
 
-def insert_so_data(data: dict) -> None:
-    # Calculate embedding values for questions and answers
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+def iter_embedded_batches(texts: Iterable[str]) -> Iterator[Tuple[List[str], List[List[float]]]]:
+    """
+    Embed a stream of texts with `embed_documents`, `embedding_batch_size` texts per
+    call and at most `embedding_max_in_flight` calls at once. Yields (texts, vectors)
+    per batch in input order; only the in-flight batches are held in memory.
+    """
+    max_in_flight = max(1, settings.embedding_max_in_flight)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for batch in iter_batches(texts, max(1, settings.embedding_batch_size)):
+            in_flight.append((batch, executor.submit(embeddings.embed_documents, batch)))
+            # keep the executor busy while the caller handles the oldest batch
+            if len(in_flight) > max_in_flight:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield batch, future.result()
+
+def embed_in_batches(texts: List[str], on_progress=None) -> List[List[float]]:
+    """
+    Embed `texts` through `iter_embedded_batches`. Vectors come back in the order of `texts`.
+    """
+    vectors = []
+    started = time.perf_counter()
+    for _, batch_vectors in iter_embedded_batches(texts):
+        vectors.extend(batch_vectors)
+        if on_progress:
+            elapsed = time.perf_counter() - started
+            on_progress({
+                "embedded": len(vectors),
+                "embeddings_total": len(texts),
+                "embeddings_per_second": round(len(vectors) / elapsed, 2) if elapsed else None,
+                "embedding_batch_size": settings.embedding_batch_size,
+            })
+    return vectors
+
+def insert_so_data(data: dict, on_progress=None) -> None:
+    # Calculate embedding values for questions and answers, batched
+    items, texts = [], []
     for q in data["items"]:
         question_text = q["title"] + "\n" + q["body_markdown"]
-        q["embedding"] = embeddings.embed_query(question_text)
+        items.append(q)
+        texts.append(question_text)
         for a in q["answers"]:
-            a["embedding"] = embeddings.embed_query(
-                question_text + "\n" + a["body_markdown"]
-            )
+            items.append(a)
+            texts.append(question_text + "\n" + a["body_markdown"])
+    for item, vector in zip(items, embed_in_batches(texts, on_progress=on_progress)):
+        item["embedding"] = vector
 
     # Cypher, the query language of Neo4j, is used to import the data
     # https://neo4j.com/docs/getting-started/cypher-intro/
@@ -158,7 +313,7 @@ def load_so_data(jobs: dict, task_id: UUID, tag: str = "javascript", page: int =
         )
         data = requests.get(SO_API_BASE_URL + parameters).json()
         print(data)
-        insert_so_data(data)
+        insert_so_data(data, on_progress=jobs[task_id].progress.update)
     except Exception as error:
         jobs[task_id].status = f"Importing {tag} from so fails with error: {error}"
         return
@@ -174,6 +329,38 @@ def load_high_score_so_data() -> None:
     data = requests.get(SO_API_BASE_URL + parameters).json()
     insert_so_data(data)
 
+# Background task for deleting a session and everything under it in batches
+def delete_session_in_batches(jobs: dict, task_id: UUID, session_id: str) -> None:
+    neo4j_db = Neo4jDatabase(driver=get_driver())
+    try:
+        neo4j_db.delete_session(
+            session_id,
+            batch_size=settings.neo4j_delete_batch_size,
+            on_progress=jobs[task_id].progress.update,
+        )
+    except Exception as error:
+        jobs[task_id].status = f"Deleting session {session_id} fails with error: {error}"
+        return
+    finally:
+        jobs[task_id].processed_files.append(session_id)
+    jobs[task_id].status = "completed"
+
+# Background task for deleting a session's chat history in batches
+def delete_chat_history_in_batches(jobs: dict, task_id: UUID, session_id: str) -> None:
+    neo4j_db = Neo4jDatabase(driver=get_driver())
+    try:
+        neo4j_db.delete_chat_history(
+            session_id,
+            batch_size=settings.neo4j_delete_batch_size,
+            on_progress=jobs[task_id].progress.update,
+        )
+    except Exception as error:
+        jobs[task_id].status = f"Deleting chat history of {session_id} fails with error: {error}"
+        return
+    finally:
+        jobs[task_id].processed_files.append(session_id)
+    jobs[task_id].status = "completed"
+
 # Background task for crawling web data to mongodb
 def load_web_data(jobs: dict, task_id: UUID, file_collection, url: str = "https://python.langchain.com/v0.2/docs/concepts/#langchain-expression-language-lcel"):
     try:
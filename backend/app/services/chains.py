@@ -1,5 +1,11 @@
+import sys
+import time
+import asyncio
+import threading
 import logging
 import uuid
+from collections import deque
+from types import SimpleNamespace
 from langchain.chains import RetrievalQAWithSourcesChain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 
@@ -18,6 +24,7 @@ from langchain_neo4j import Neo4jVector, Neo4jChatMessageHistory
 from langchain.memory import ConversationBufferMemory
 
 from langchain_core.runnables.history import RunnableWithMessageHistory, RunnablePassthrough
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.tools import tool
 
 from langchain_core.output_parsers import StrOutputParser
@@ -25,7 +32,14 @@ from langchain_core.output_parsers import StrOutputParser
 from pydantic import BaseModel, Field
 from typing import Optional, List, Any
 from config import Settings, BaseLogger
-from db.neo4j import Neo4jDatabase
+from db.neo4j import Neo4jDatabase, get_driver
+from db.instrumentation import InstrumentedDriver
+from db.user_cache import user_cache, FIND_USER_QUERY
+from db.write_buffer import write_buffer
+from services.llm_scheduler import llm_scheduler
+from services.feedback_cache import feedback_cache, replay_tokens
+from services.embedding_cache import CachedEmbeddings
+from services.embedding_batcher import MicroBatchingEmbeddings
 
 import json
 
@@ -34,21 +48,32 @@ settings = Settings()
 '''
 chain.py [ ollama model Operation ]
 
-1.  `load_embedding_model`:                  Loads an embedding model (`OllamaEmbeddings`) for text vectorization and logs the model used.  
+1.  `load_embedding_model`:                  Loads an embedding model (`OllamaEmbeddings`, behind `CachedEmbeddings` and `MicroBatchingEmbeddings`) for text vectorization and logs the model used.  
+1.  `get_embedding_model`:                   The one `load_embedding_model` instance of the process, shared by api.py and background_task.py.  
 2.  `load_llm`:                              Initializes a language model (`ChatOllama`) with configurable parameters and logs its setup. 
 
 [ Model Setup ]
 3.  `configure_llm_only_chain`:              Sets up an LLM chain for single-turn Q&A without conversation history.  
-4.  `configure_llm_history_chain`:           Builds an LLM chain with conversation history using `Neo4jChatMessageHistory`.  
+4.  `configure_llm_history_chain`:           Builds an LLM chain with conversation history using `SequencedChatMessageHistory`.  
 5.  `configure_qa_rag_chain`:                Configures a RAG chain with `Neo4jVector` for context-aware responses and tracks history.  
 
 [ Assist function for AI ]
 6.  `fetch_questions_based_on_preferences`:  Retrieves top-scoring questions from Neo4j matching user preferences.  
-7.  `get_user_preferences`:                  Fetches user preferences from Neo4j using a user ID.  
+7.  `get_user_preferences`:                  Fetches user preferences from Neo4j using a user ID (read through `user_cache`).  
+7.  `get_pdf_vector_store`:                  The process-wide `Neo4jVector` handle (and driver) of the `pdf_bot` index.  
+7.  `retrieve_pdf_chunks_by_similarity`:     Top-k PDF chunks of a query through that handle.  
+                                             `python -m services.chains bench-retrieval <query> [calls]` times it against a handle per call.  
 
 [ AI function - Generate Question (Based on input) ]
 8.  `generate_task`:                         Creates programming tasks based on user preferences fetched from Neo4j.  
-9.  `check_quiz_correctness`:                Evaluates and provides feedback on student answers within task scope. 
+8.  `record_served_question`:                Appends a served question to its session's chat history (generation itself is history-free).  
+8.  `generate_task_graph`:                   The generate/verify -> grade -> save LangGraph, compiled once at import.  
+                                             `python -m services.chains bench-setup [calls]` times the per-request setup
+                                             (prompts + `compile()` per call, as before, vs. the compiled graph).  
+                                             Each round races `generate_task_candidates` candidates; after
+                                             `generate_task_max_attempts` the last candidate is kept (best effort).  
+9.  `check_quiz_correctness`:                Evaluates and provides feedback on student answers within task scope (cached, see `feedback_cache`). 
+9.  `save_submission`:                       Queues the submitted answer in the write-behind buffer (`write_buffer.save_answer`), not awaited.  
 10. `convert_question_to_attribute`:         Converts a question into a single-word attribute using the LLM.  
 11. `create_questions_based_on_preferences`: Generating questions based on user preferences. ( To do ) 
 12. `create_quiz`:                           Generates a personalized quiz based on user preferences and defines its structure (`MCQ`).  
@@ -60,7 +85,33 @@ def load_embedding_model(embedding_model_name: str, logger=BaseLogger(), config=
         model=embedding_model_name,
     )
     logger.info("Embedding: Using ", embedding_model_name)
-    return embeddings
+    # concurrent single-query misses share one `embed_documents` call, see services/embedding_batcher.py
+    batched = MicroBatchingEmbeddings(
+        embeddings,
+        window_ms=settings.embedding_batch_window_ms,
+        max_batch=settings.embedding_batch_max_size,
+        timeout=settings.embedding_batch_timeout,
+    )
+    # (model, text) -> vector is cached, see services/embedding_cache.py
+    return CachedEmbeddings(batched, model=embedding_model_name)
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """
+    The process-wide embedding model of `EMBEDDING_MODEL`, shared by the API routes and
+    the background tasks: one micro-batcher (and collector thread) sees every query.
+    """
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = load_embedding_model(
+                settings.embedding_model,
+                config={"ollama_base_url": settings.ollama_base_url},
+                logger=BaseLogger(),
+            )
+        return _embedding_model
 
 def load_llm(llm_name: str, logger=BaseLogger(), config={}):
     logger.info(f"LLM: Using Ollama: {llm_name}")
@@ -88,18 +139,62 @@ def configure_llm_only_chain(llm):
         [system_message_prompt, human_message_prompt]
     )
 
-    def generate_llm_output(
-        question: str, callbacks: List[Any], prompt=chat_prompt
+    # `sid` is accepted (and ignored) so it can stand in for the history chain
+    async def generate_llm_output(
+        question: str, callbacks: List[Any], prompt=chat_prompt, sid: str = None
     ) -> str:
         chain = prompt | llm
-        answer = chain.invoke(
-            {"question": question}, config={"callbacks": callbacks}
-        ).content
+        async with llm_scheduler.slot("llm_only"):
+            answer = (await chain.ainvoke(
+                {"question": question}, config={"callbacks": callbacks}
+            )).content
         return {"answer": answer}
 
     return generate_llm_output
 
-def configure_llm_history_chain(llm, url, username, password):
+class SequencedChatMessageHistory(Neo4jChatMessageHistory):
+    """
+    `Neo4jChatMessageHistory` that also numbers the messages of a session.
+
+    Every new `Message` gets `session_id` and a gap-free `seq`, and the session
+    keeps `message_count`, so history can be paged through the
+    `(Message.session_id, Message.seq)` index instead of walking `NEXT` chains.
+    Sessions that already hold unnumbered messages are left unnumbered here and
+    backfilled by `python -m db.schema apply`.
+    Appends take a write lock on the session, so concurrent writers cannot fork the chain.
+    Given a `driver`, it is borrowed (not closed) instead of opening one per session.
+    """
+
+    def __init__(self, session_id, *, driver=None, database="neo4j", **kwargs):
+        if driver is not None:
+            # the base class only reads `_driver` / `_database` off `graph`
+            kwargs["graph"] = SimpleNamespace(_driver=driver, _database=database)
+        super().__init__(session_id, database=database, **kwargs)
+
+    def add_message(self, message) -> None:
+        query = """
+        MERGE (s:%s {id: $session_id})
+        // write-lock the session first so concurrent appends (parallel candidates) queue up
+        SET s._lock = true REMOVE s._lock
+        WITH s
+        OPTIONAL MATCH (s)-[lm:LAST_MESSAGE]->(last_message)
+        WITH s, lm, last_message,
+             CASE WHEN s.message_count IS NULL AND last_message IS NOT NULL THEN null
+                  ELSE coalesce(s.message_count, 0) END AS seq
+        CREATE (s)-[:LAST_MESSAGE]->(new:Message)
+        SET new += {type: $type, content: $content, session_id: $session_id, seq: seq},
+            s.message_count = seq + 1
+        WITH new, lm, last_message WHERE last_message IS NOT NULL
+        CREATE (last_message)-[:NEXT]->(new)
+        DELETE lm
+        """ % self._node_label
+        self._driver.execute_query(
+            query,
+            {"type": message.type, "content": message.content, "session_id": self._session_id},
+            database_=self._database,
+        )
+
+def configure_llm_history_chain(llm):
     # Load chat history from MongoDB
     template = """
     You are a helpful assistant that helps a support agent with answering programming questions.
@@ -111,26 +206,25 @@ def configure_llm_history_chain(llm, url, username, password):
         HumanMessagePromptTemplate.from_template("{question}"),
     ])
 
-    def generate_llm_output(
+    async def generate_llm_output(
         sid: str, question: str, callbacks: List[Any], prompt=chat_prompt
     ) -> str:
         chain = prompt | llm
         chain_with_history = RunnableWithMessageHistory(
             chain,
-            lambda session_id: Neo4jChatMessageHistory(
+            lambda session_id: SequencedChatMessageHistory(
                 session_id=session_id,
-                url=url,
-                username=username,
-                password=password,
+                driver=get_driver().with_prefix("chat_history"),
             ),
             input_messages_key="question",
             history_messages_key="chat_history",
         )
 
-        answer = chain_with_history.invoke(
-            {"question": question}, 
-            config={"callbacks": callbacks, "configurable": {"session_id": sid}}
-        ).content
+        async with llm_scheduler.slot("llm_history"):
+            answer = (await chain_with_history.ainvoke(
+                {"question": question}, 
+                config={"callbacks": callbacks, "configurable": {"session_id": sid}}
+            )).content
 
         return {"answer": answer}
 
@@ -166,10 +260,11 @@ def configure_grader_chain(llm):
         | StrOutputParser()
     )
 
-    def generate_llm_output(
+    async def generate_llm_output(
         sid: str, question: str, callbacks: List[Any]
     ) -> str:
-        answer = tool_chain.invoke(question)        
+        async with llm_scheduler.slot("grader"):
+            answer = await tool_chain.ainvoke(question)
         # Remove Markdown code block if present
         if answer.startswith("```json") and answer.endswith("```"):
             answer = answer[7:-3].strip()
@@ -184,14 +279,17 @@ def configure_grader_chain(llm):
     return generate_llm_output
 
 def get_user_preferences(neo4j_graph, user_id):
-    query = "MATCH (u:User {id: $user_id}) RETURN u"
-    params = {'user_id': user_id}
-    result = neo4j_graph.query(query, params)
-
-    if result:
-        user_properties = result[0]['u']
-        return user_properties
-    return None
+    user = user_cache.get(user_id)
+    if user is None:
+        result = neo4j_graph.query(FIND_USER_QUERY, {'user_id': user_id})
+        if not result:
+            return None
+        user = result[0]['u']
+        user_cache.set(user_id, user)
+
+    # the preferences are the node properties only
+    user.pop("relationships", None)
+    return user
 
 def get_user_references(neo4j_graph, user_id, currentTopics, embeddings):
     query = "MATCH (u:User {id: $user_id}) RETURN u"
@@ -199,20 +297,41 @@ def get_user_references(neo4j_graph, user_id, currentTopics, embeddings):
     result = neo4j_graph.query(query, params)
 
     if result:
-        user_properties = retrieve_pdf_chunks_by_similarity(currentTopics, embeddings, url=settings.neo4j_uri, username=settings.neo4j_username, password=settings.neo4j_password, top_k=5)
+        user_properties = retrieve_pdf_chunks_by_similarity(currentTopics, embeddings, top_k=5)
         return user_properties
     return None
 
-def retrieve_pdf_chunks_by_similarity(query: str, embeddings, url: str, username: str, password: str, top_k: int = 5):
+_pdf_vector_store = None
+_pdf_vector_store_lock = threading.Lock()
+
+def get_pdf_vector_store(embeddings) -> Neo4jVector:
+    """
+    One `Neo4jVector` handle (and driver) for every upload and similarity search,
+    created with the index on first use. `embeddings` is only used by that first call.
+    """
+    global _pdf_vector_store
+    with _pdf_vector_store_lock:
+        if _pdf_vector_store is None:
+            vector_store = Neo4jVector(
+                embedding=embeddings,
+                url=settings.neo4j_uri,
+                username=settings.neo4j_username,
+                password=settings.neo4j_password,
+                index_name="pdf_bot",
+                node_label="PdfBotChunk",
+            )
+            _, index_type = vector_store.retrieve_existing_index()
+            if not index_type:
+                vector_store.create_new_index()
+            # the index setup above hands the driver to neo4j_graphrag, which
+            # type-checks it, so searches and uploads are only wrapped from here on
+            vector_store._driver = InstrumentedDriver(vector_store._driver, prefix="pdf_vector_store")
+            _pdf_vector_store = vector_store
+        return _pdf_vector_store
+
+def retrieve_pdf_chunks_by_similarity(query: str, embeddings, top_k: int = 5):
     try:
-        vector_store = Neo4jVector(
-            embedding=embeddings,
-            url=url,
-            username=username,
-            password=password,
-            index_name="pdf_bot",
-            node_label="PdfBotChunk"
-        )
+        vector_store = get_pdf_vector_store(embeddings)
         retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
         results = retriever.invoke(query)
         return results
@@ -221,176 +340,273 @@ def retrieve_pdf_chunks_by_similarity(query: str, embeddings, url: str, username
         return "No references found."
 
 
-def generate_task(user_id, neo4j_graph, llm_chain, session, grader_chain, embeddings, callbacks=[]):
-    preferences = get_user_preferences(neo4j_graph, user_id)
-    if not preferences:
-        return "User preferences not found."
+# [ generate_task workflow ]
+# Prompts and the LangGraph workflow are built once at import; each request only
+# fills the prompt variables (`.partial()`) and passes its own data through the state.
+
+GENERATE_TASK_TEMPLATE = """
+You are a programming teacher designing coding tasks for students.
+Your task is to generate a code snippet **containing intentional errors** for students to fix.
+### Requirements:
+- The question should be tailored to the student's preference: {{ preferences }}
+- The question should be related to the following reference: {{ references }}
+- The generated code must be **functionally flawed**.
+- Ensure the error **aligns with the student's learning level** (beginner, intermediate, advanced).
+- Do NOT include explanations, corrected codes, or hints in your response.
+### Response Format:
+1. **Title:** A concise title describing the task.
+2. **Difficulty:** easy / medium / hard.
+3. **Completeness:** A percentage indicating how much of the code is correct.
+4. **XP:** The experience points rewarded for completing the task.
+5. **Question:** A brief introduction to the task.
+---
+Example Output:
+**Title:** Fix the syntax error in the JavaScript function
+**Difficulty:** easy
+**Completeness:** 80 %
+**XP:** 10
+**Question:** The following JavaScript function has a syntax error. Identify and fix it.
+```javascript
+function add(a, b)
+return a + b
+console.log(add(3, 5);
+```
+"""
+generate_task_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(GENERATE_TASK_TEMPLATE, template_format="jinja2"),
+    HumanMessagePromptTemplate.from_template("{question}")
+])
+
+VERIFY_TASK_TEMPLATE = """
+Verify that the following generated question meets all of these criteria:
+1. It is tailored to the student's preference: {{ preferences }}.
+2. It is related to the following reference: {{ references }}.
+3. It contains a code snippet with intentional errors.
+4. It follows the required response format (Title, Difficulty, Completeness, XP, Question).
+Generated question:
+{{ generated_question }}
+If the question meets all the criteria, respond with "PASS". Otherwise, respond with "FAIL".
+"""
+verify_task_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(VERIFY_TASK_TEMPLATE, template_format="jinja2"),
+    HumanMessagePromptTemplate.from_template("{question}")
+])
+
+class GenerateTaskState(TypedDict):
+    preferences: str
+    references: str
+    currentTopics: str
+    session: dict
+    callbacks: list
+    llm_chain: object
+    grader_chain: object
+    chat_prompt: object
+    max_attempts: int
+    candidates: int
+    attempts: list
+    generated_question: str
+    verification_result: str
+    grader_details: dict
+    evaluated_difficulty: str
+    evaluated_completeness: str
+    evaluated_xp: (int)
+    question_id: str
+    pooled: bool
+
+# telemetry of the latest `generate_task` runs (per-attempt timings), see `/metrics/generation`
+generate_task_runs = deque(maxlen=100)
+
+def _passed(verification_result):
+    return "pass" in verification_result.lower()
+
+async def _generate_and_verify(state, attempt, callbacks):
+    """
+    One attempt: generate a candidate question, then verify it.
+    Returns (question, verification_result, timing); a failed attempt returns
+    (None, "", timing) with the error in `timing`, so it still counts against the budget.
+    """
+    try:
+        return await _run_attempt(state, attempt, callbacks)
+    except Exception as e:
+        logging.warning(f"generate_task attempt {attempt} failed: {e}")
+        return None, "", {"attempt": attempt, "passed": False, "error": str(e)}
+
+async def _run_attempt(state, attempt, callbacks):
+    started = time.perf_counter()
+    llm_response = await state["llm_chain"](
+        sid=state["session"].get("session_id"),
+        question=state["currentTopics"],
+        callbacks=callbacks,
+        prompt=state["chat_prompt"],
+    )
+    question = llm_response.get("answer", "")
+    generated = time.perf_counter()
 
-    currentTopics = "I want to know more about these topics " + json.dumps(session.get("topics"))
-    references = get_user_references(neo4j_graph, user_id, currentTopics, embeddings)
-    if not references:
-        return "No references found."
+    verification_prompt = verify_task_prompt.partial(
+        preferences=str(state["preferences"]),
+        references=str(state["references"]),
+        generated_question=question,
+    )
+    ver_response = await state["llm_chain"](
+        sid=state["session"].get("session_id"),
+        question="",  # no extra human message required
+        callbacks=callbacks,
+        prompt=verification_prompt,
+    )
+    verification_result = ver_response.get("answer", "").strip()  # Expect "PASS" or "FAIL"
+    verified = time.perf_counter()
+
+    timing = {
+        "attempt": attempt,
+        "generate_ms": round((generated - started) * 1000),
+        "verify_ms": round((verified - generated) * 1000),
+        "passed": _passed(verification_result),
+    }
+    return question, verification_result, timing
 
-    gen_system_template = f"""
-    You are a programming teacher designing coding tasks for students.
-    Your task is to generate a code snippet **containing intentional errors** for students to fix.
-    ### Requirements:
-    - The question should be tailored to the student's preference: {preferences}
-    - The question should be related to the following reference: {references}
-    - The generated code must be **functionally flawed**.
-    - Ensure the error **aligns with the student's learning level** (beginner, intermediate, advanced).
-    - Do NOT include explanations, corrected codes, or hints in your response.
-    ### Response Format:
-    1. **Title:** A concise title describing the task.
-    2. **Difficulty:** easy / medium / hard.
-    3. **Completeness:** A percentage indicating how much of the code is correct.
-    4. **XP:** The experience points rewarded for completing the task.
-    5. **Question:** A brief introduction to the task.
-    ---
-    Example Output:
-    **Title:** Fix the syntax error in the JavaScript function
-    **Difficulty:** easy
-    **Completeness:** 80 %
-    **XP:** 10
-    **Question:** The following JavaScript function has a syntax error. Identify and fix it.
-    ```javascript
-    function add(a, b)
-    return a + b
-    console.log(add(3, 5);
-    ```
+async def generate_candidates(state):
     """
-    system_prompt = SystemMessagePromptTemplate.from_template(gen_system_template, template_format="jinja2")
-    chat_prompt = ChatPromptTemplate.from_messages([
-        system_prompt,
-        HumanMessagePromptTemplate.from_template("{question}")
-    ])
-
-    verification_template = """
-    Verify that the following generated question meets all of these criteria:
-    1. It is tailored to the student's preference: {{preferences}}.
-    2. It is related to the following reference: {{references}}.
-    3. It contains a code snippet with intentional errors.
-    4. It follows the required response format (Title, Difficulty, Completeness, XP, Question).
-    Generated question:
-    {{generated_question}}
-    If the question meets all the criteria, respond with "PASS". Otherwise, respond with "FAIL".
+    One round of `candidates` attempts, run concurrently and verified as they
+    finish; the first that passes wins and the others are cancelled. With several
+    candidates their tokens would interleave, so only the winner is streamed.
     """
-    verification_system_prompt = SystemMessagePromptTemplate.from_template(verification_template, template_format="jinja2")
-    verification_chat_prompt = ChatPromptTemplate.from_messages([
-        verification_system_prompt,
-        HumanMessagePromptTemplate.from_template("{question}")
-    ])
-
-    def generate_candidate(state):
-        print("---GENERATE---")
-        llm_response = state["llm_chain"](
-            sid=state["session"].get("session_id"),
-            question=state["currentTopics"],
-            callbacks=state["callbacks"],
-            prompt=state["chat_prompt"],
-        )
-        generated_question = llm_response.get("answer", "")
-        state["generated_question"] = generated_question
-        print("Generated question:", generated_question)
-        return state
-
-    def verify_candidate(state):
-        print("---VERIFY---")
-        verification_inputs = {
-            "preferences": state["preferences"],
-            "references": state["references"],
-            "generated_question": state["generated_question"],
-            "question": ""  # no extra human message required
-        }
-        ver_response = state["llm_chain"](
-            sid=state["session"].get("session_id"),
-            question=verification_inputs["question"],
-            callbacks=state["callbacks"],
-            prompt=state["verification_chat_prompt"],
-        )
-        verification_result = ver_response.get("answer", "").strip()  # Expect "PASS" or "FAIL"
-        state["verification_result"] = verification_result
-        print("Verification result:", verification_result)
-        return state
-
-    def decide_verification(state):
-        print("---DECIDE---")
-        if "pass" in state.get("verification_result", "").lower():
-            print("Verification passed.")
+    print("---GENERATE---")
+    attempts = state.get("attempts", [])
+    k = max(1, min(state["candidates"], state["max_attempts"] - len(attempts)))
+    callbacks = state["callbacks"] if k == 1 else []
+
+    numbers = {
+        asyncio.create_task(_generate_and_verify(state, len(attempts) + n + 1, callbacks)): len(attempts) + n + 1
+        for n in range(k)
+    }
+    pending = set(numbers)
+    passed = False
+    try:
+        while pending and not passed:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    question, verification_result, timing = task.result()
+                except Exception as e:
+                    # one candidate failing (e.g. SchedulerBusy) is a failed attempt, not a failed round
+                    logging.warning(f"generate_task attempt {numbers[task]} failed: {e}")
+                    question, verification_result, timing = None, "", {"attempt": numbers[task], "passed": False, "error": str(e)}
+                attempts.append(timing)
+                if question is None or passed:
+                    continue
+                print("Verification result:", verification_result)
+                # a failing candidate is still kept as the best-effort fallback
+                if timing["passed"] or not state.get("generated_question"):
+                    state["generated_question"] = question
+                    state["verification_result"] = verification_result
+                passed = timing["passed"]
+    finally:
+        for task in numbers:
+            task.cancel()
+        # wait for the losers, so their scheduler slots and HTTP calls are released before grading
+        await asyncio.gather(*numbers, return_exceptions=True)
+
+    if k > 1 and state.get("generated_question"):
+        for callback in state["callbacks"]:
+            await callback.on_llm_new_token(state["generated_question"])
+
+    state["attempts"] = attempts
+    print("Generated question:", state.get("generated_question", ""))
+    return state
+
+def decide_verification(state):
+    print("---DECIDE---")
+    if _passed(state.get("verification_result", "")):
+        print("Verification passed.")
+        return "grade"
+    if len(state["attempts"]) >= state["max_attempts"]:
+        if state.get("generated_question"):
+            print(f"Attempt budget ({state['max_attempts']}) spent, grading the best-effort candidate.")
             return "grade"
-        else:
-            print("Verification failed: " + state.get("verification_result", ""))
-            # Return "generate" to retry generation on verification failure.
-            return "generate"
-
-    def grade_candidate(state):
-        print("---GRADE---")
-        question_to_grade = "Grade the following question: " + state["generated_question"]
-        grader_response = state["grader_chain"](
-            sid=state["session"].get("session_id"),
-            question=question_to_grade,
-            callbacks=state["callbacks"],
-        )
-        state["grader_details"] = grader_response
-        state["evaluated_difficulty"] = grader_response["question_level"]["difficulty"]
-        state["evaluated_completeness"] = grader_response["question_level"]["completeness"]
-        state["evaluated_xp"] = grader_response["question_level"]["xp"]
-        print("Grader response:", grader_response)
-        return state
-
-    def save_candidate(state):
-        question_id = str(uuid.uuid4())
-        neo4j_db = Neo4jDatabase(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
-        neo4j_db.create_question_node(
-            session_id=state["session"].get("session_id"),
-            question_id=question_id,
-            question_text=state["generated_question"],
-            difficulty=state["evaluated_difficulty"],
-            completeness=state["evaluated_completeness"],
-            xp=state["evaluated_xp"]
-        )
-        state["question_id"] = question_id
-        print(f"Verified question node created for session: {state['session'].get('session_id')} with question ID: {question_id}")
-        return state
-
-    class GraphState(TypedDict):
-        preferences: str
-        references: str
-        currentTopics: str
-        session: dict
-        callbacks: list
-        llm_chain: object
-        grader_chain: object
-        chat_prompt: object
-        verification_chat_prompt: object
-        generated_question: str
-        verification_result: str
-        grader_details: dict
-        evaluated_difficulty: str
-        evaluated_completeness: str
-        evaluated_xp: (int)
-        question_id: str
-
-    # Build the workflow with the state schema.
-    workflow = StateGraph(GraphState)
-    workflow.add_node("generate", generate_candidate)
-    workflow.add_node("verify", verify_candidate)
+        print(f"Attempt budget ({state['max_attempts']}) spent without a candidate.")
+        return "end"
+    print("Verification failed: " + state.get("verification_result", ""))
+    # Return "generate" to retry generation on verification failure.
+    return "generate"
+
+async def grade_candidate(state):
+    print("---GRADE---")
+    question_to_grade = "Grade the following question: " + state["generated_question"]
+    grader_response = await state["grader_chain"](
+        sid=state["session"].get("session_id"),
+        question=question_to_grade,
+        callbacks=state["callbacks"],
+    )
+    state["grader_details"] = grader_response
+    state["evaluated_difficulty"] = grader_response["question_level"]["difficulty"]
+    state["evaluated_completeness"] = grader_response["question_level"]["completeness"]
+    state["evaluated_xp"] = grader_response["question_level"]["xp"]
+    print("Grader response:", grader_response)
+    return state
+
+async def save_candidate(state):
+    question_id = str(uuid.uuid4())
+    # coalesced with concurrent generations into one transaction; wait so the node exists once we return
+    await asyncio.wrap_future(write_buffer.create_question_node(
+        session_id=state["session"].get("session_id"),
+        question_id=question_id,
+        question_text=state["generated_question"],
+        difficulty=state["evaluated_difficulty"],
+        completeness=state["evaluated_completeness"],
+        xp=state["evaluated_xp"],
+        pooled=state.get("pooled", False),
+    ))
+    state["question_id"] = question_id
+    if not state.get("pooled", False):
+        # a pooled question reaches the session history once `/generate-task` serves it
+        await asyncio.to_thread(record_served_question, state["session"], state["generated_question"])
+    print(f"Verified question node created for session: {state['session'].get('session_id')} with question ID: {question_id}")
+    return state
+
+def build_generate_task_graph():
+    workflow = StateGraph(GenerateTaskState)
+    workflow.add_node("generate", generate_candidates)
     workflow.add_node("grade", grade_candidate)
     workflow.add_node("save", save_candidate)
 
     workflow.add_edge(START, "generate")
-    workflow.add_edge("generate", "verify")
-    workflow.add_conditional_edges("verify", decide_verification, {
+    workflow.add_conditional_edges("generate", decide_verification, {
         "generate": "generate",
         "grade": "grade",
+        "end": END,
     })
     workflow.add_edge("grade", "save")
     workflow.add_edge("save", END)
+    return workflow.compile()
+
+generate_task_graph = build_generate_task_graph()
+
+def topics_question(session):
+    return "I want to know more about these topics " + json.dumps(session.get("topics"))
+
+def record_served_question(session, question):
+    """
+    Appends a served question to the session's chat history. Candidates are
+    generated and verified through a history-free chain, so only the question the
+    student actually gets ends up in the history.
+    """
+    history = SequencedChatMessageHistory(
+        session_id=session.get("session_id"),
+        driver=get_driver().with_prefix("chat_history"),
+    )
+    history.add_messages([HumanMessage(content=topics_question(session)), AIMessage(content=question)])
+
+async def generate_task(user_id, neo4j_graph, llm_chain, session, grader_chain, embeddings, callbacks=[], pooled=False):
+    # Neo4j / vector lookups are blocking, keep them off the event loop
+    preferences = await asyncio.to_thread(get_user_preferences, neo4j_graph, user_id)
+    if not preferences:
+        return "User preferences not found."
 
-    # Compile the workflow.
-    app = workflow.compile()
+    currentTopics = topics_question(session)
+    references = await asyncio.to_thread(get_user_references, neo4j_graph, user_id, currentTopics, embeddings)
+    if not references:
+        return "No references found."
 
-    # Create the initial state.
     initial_state = {
         "preferences": preferences,
         "references": references,
@@ -399,21 +615,65 @@ def generate_task(user_id, neo4j_graph, llm_chain, session, grader_chain, embedd
         "callbacks": callbacks,
         "llm_chain": llm_chain,
         "grader_chain": grader_chain,
-        "chat_prompt": chat_prompt,
-        "verification_chat_prompt": verification_chat_prompt
+        "chat_prompt": generate_task_prompt.partial(preferences=str(preferences), references=str(references)),
+        "max_attempts": settings.generate_task_max_attempts,
+        "candidates": settings.generate_task_candidates,
+        "attempts": [],
+        # pre-generated questions wait in the session's pool until `/generate-task` serves them
+        "pooled": pooled,
         # Other keys (generated_question, verification_result, etc.) will be set as the workflow runs.
     }
 
-    # Run the workflow. It will loop (via conditional edges) until generation passes verification.
-    for output in app.stream(initial_state):
+    # Run the workflow. It loops (via conditional edges) until a candidate passes verification
+    # or the attempt budget is spent.
+    started = time.perf_counter()
+    final_state = initial_state
+    async for output in generate_task_graph.astream(initial_state):
         for key, value in output.items():
             # Node
             pprint(f"Node '{key}':")
-            # Optional: print full state at each node
-            # pprint.pprint(value["keys"], indent=2, width=80, depth=None)
+            final_state = value
         pprint("\n---\n")
 
-def check_quiz_correctness(user_id, llm_chain, question_node, task, answer, callbacks=[]):
+    run = {
+        "session_id": session.get("session_id"),
+        "attempts": final_state.get("attempts", []),
+        "passed": _passed(final_state.get("verification_result", "")),
+        "question_id": final_state.get("question_id"),
+        "pooled": pooled,
+        "total_ms": round((time.perf_counter() - started) * 1000),
+    }
+    generate_task_runs.append(run)
+    logging.info(f"generate_task telemetry: {run}")
+
+def save_submission(user_id, task, answer):
+    """
+    Write-behind: the submission joins the next buffered `UNWIND` transaction and
+    nobody waits for it, so a failed write is only logged and never fails the feedback.
+    The feedback is free text, there is no verdict to store in `isCorrect`.
+    """
+    try:
+        future = write_buffer.save_answer(user_id=user_id, question=task, answer=answer, is_correct=None)
+    except RuntimeError as e:
+        logging.warning(f"Submission of {user_id} not saved: {e}")
+        return
+
+    def log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.warning(f"Submission of {user_id} not saved: {future.exception()}")
+
+    future.add_done_callback(log_failure)
+
+async def check_quiz_correctness(user_id, llm_chain, question_node, task, answer, callbacks=[], use_cache=True):
+    save_submission(user_id, task, answer)
+    # same task + same normalised answer: replay the feedback we already generated
+    feedback = feedback_cache.get(task, answer) if use_cache else None
+    if feedback is not None:
+        for token in replay_tokens(feedback):
+            for callback in callbacks:
+                await callback.on_llm_new_token(token)
+        return {"answer": feedback}
+
     # Build a system prompt that includes all the context details.
     system_template = (
     "You're a programming teacher and you have created a coding task for students.\n"
@@ -432,15 +692,17 @@ def check_quiz_correctness(user_id, llm_chain, question_node, task, answer, call
     )
     chat_prompt = ChatPromptTemplate.from_messages([system_prompt, human_prompt])
 
-    llm_response = llm_chain(
+    llm_response = await llm_chain(
         question="Evaluate the student's answer.",
         callbacks=callbacks,
         prompt=chat_prompt,
     )
+    if use_cache:
+        feedback_cache.set(task, answer, llm_response.get("answer"))
 
     return llm_response
 
-def convert_question_to_attribute(question, llm):
+async def convert_question_to_attribute(question, llm):
     gen_system_template = f"""
     Convert user question to a single word attribute.
     Do not return more than one word. 
@@ -469,7 +731,8 @@ def convert_question_to_attribute(question, llm):
         | llm.bind_tools([Attribute])
         | StrOutputParser()
     )
-    answer = tool_chain.invoke(question)
+    async with llm_scheduler.slot("convert_question_to_attribute"):
+        answer = await tool_chain.ainvoke(question)
     print("convert_question_to_attribute"+answer)
     try:
         # tools invoked
@@ -479,9 +742,9 @@ def convert_question_to_attribute(question, llm):
     except:
         return answer
 
-def generate_lp(user_id, neo4j_graph, llm_chain, session, callbacks=[]):
+async def generate_lp(user_id, neo4j_graph, llm_chain, session, callbacks=[]):
     # TODO with TOOLS
-    preferences = get_user_preferences(neo4j_graph, user_id)
+    preferences = await asyncio.to_thread(get_user_preferences, neo4j_graph, user_id)
     if not preferences:
         return "User preferences not found."
 
@@ -506,10 +769,103 @@ def generate_lp(user_id, neo4j_graph, llm_chain, session, callbacks=[]):
 
     currentTopics = "Could you suggest the learning path for me? I want a clear, step-by-step guide to learning web development. You should also tell me about some of the tools on the 'WebGenie' website (the website i am using) that can help me, no url need to provided, such as custom web development quizzes, collaborative learning with friends, and reliable learning resources from WebGenie."
 
-    llm_response = llm_chain(
+    llm_response = await llm_chain(
         sid=session.get("session_id"),
         question=currentTopics,
         callbacks=callbacks,
         prompt=chat_prompt,
     )
     return llm_response
+
+
+def _time_calls(fn, calls):
+    fn()  # warm up
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "calls": calls,
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1000, 3),
+    }
+
+def benchmark_setup(calls: int = 200):
+    """
+    Per-request setup of `generate_task`: building both prompt templates and
+    compiling the StateGraph on every call, as it used to, vs. filling the
+    module-level prompt and reusing `generate_task_graph`. No LLM or database involved.
+    """
+    preferences = {"Knowledge": "I know some basic", "Time": "Around 30 minutes"}
+    references = "benchmark reference text"
+
+    def per_request():
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(GENERATE_TASK_TEMPLATE, template_format="jinja2"),
+            HumanMessagePromptTemplate.from_template("{question}")
+        ])
+        ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(VERIFY_TASK_TEMPLATE, template_format="jinja2"),
+            HumanMessagePromptTemplate.from_template("{question}")
+        ])
+        build_generate_task_graph()
+        return prompt.partial(preferences=str(preferences), references=str(references))
+
+    def compiled_once():
+        # `generate_task_graph` and the prompts already exist, only the variables are filled
+        return generate_task_prompt.partial(preferences=str(preferences), references=str(references))
+
+    results = {
+        "setup_per_request": _time_calls(per_request, calls),
+        "compiled_once": _time_calls(compiled_once, calls),
+    }
+    results["speedup"] = round(results["setup_per_request"]["p50_ms"] / max(results["compiled_once"]["p50_ms"], 1e-6), 1)
+    return results
+
+def benchmark_retrieval(query: str, calls: int = 50, top_k: int = 5):
+    """
+    Per-call latency of `retrieve_pdf_chunks_by_similarity`, building a `Neo4jVector`
+    (driver, index lookup) on every call as it used to vs. the shared handle.
+    """
+    embeddings = get_embedding_model()
+
+    def per_call():
+        vector_store = Neo4jVector(
+            embedding=embeddings,
+            url=settings.neo4j_uri,
+            username=settings.neo4j_username,
+            password=settings.neo4j_password,
+            index_name="pdf_bot",
+            node_label="PdfBotChunk",
+        )
+        try:
+            return vector_store.similarity_search(query, k=top_k)
+        finally:
+            vector_store._driver.close()
+
+    def shared():
+        return get_pdf_vector_store(embeddings).similarity_search(query, k=top_k)
+
+    # the warm-up call fills the embedding cache, so both only differ by the handle
+    return {
+        "vector_store_per_call": _time_calls(per_call, calls),
+        "shared_vector_store": _time_calls(shared, calls),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench-setup":
+        calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        results = benchmark_setup(calls)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "bench-retrieval":
+        calls = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        results = benchmark_retrieval(sys.argv[2], calls)
+    else:
+        print("usage: python -m services.chains bench-setup [calls]")
+        print("       python -m services.chains bench-retrieval <query> [calls]")
+        sys.exit(2)
+
+    for name, result in results.items():
+        print(f"{name:>22}: {result}")
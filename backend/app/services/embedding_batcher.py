@@ -0,0 +1,170 @@
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+'''
+embedding_batcher.py [ Embedding Micro-Batcher ]
+
+At peak many requests embed one query each (`/retrieve_by_similarity`,
+`get_user_references`, ...). `MicroBatchingEmbeddings` queues the `embed_query`
+texts of concurrent callers and a collector thread sends them to the model as one
+`embed_documents` call once `window_ms` has passed or `max_batch` texts are waiting;
+each caller blocks on (or awaits) its own future, for at most `timeout` seconds.
+A caller that gave up (cancelled `aembed_query`) never breaks the batch of the
+others, and a collector thread that died is started again by the next query.
+
+`load_embedding_model` returns `CachedEmbeddings(MicroBatchingEmbeddings(OllamaEmbeddings))`,
+so only cache misses are batched. `embed_documents` (bulk imports) is already
+batched by its caller and goes straight to the model.
+
+1.  `MicroBatchingEmbeddings`:  `Embeddings` wrapper batching concurrent `embed_query` calls (`stats`, `close`).
+2.  `load_test`:                Throughput of N concurrent queries, one call each vs. micro-batched.
+                                `python -m services.embedding_batcher [--queries 256] [--concurrency 32]`
+'''
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, window_ms: float = 5.0, max_batch: int = 16, timeout: float = 60.0):
+        self.embeddings = embeddings
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending = []  # [(text, future)]
+        self._thread = None
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed")
+            self._pending.append((text, future))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+            # collect the texts of concurrent callers, unless a full batch is already waiting
+            deadline = time.monotonic() + self.window_ms / 1000
+            with self._cond:
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            try:
+                self._embed(batch)
+            except Exception as e:
+                # never let one batch kill the collector, every later query would wait on it
+                logging.error(f"Embedding batcher failed on a batch of {len(batch)} text(s): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _embed(self, batch):
+        # callers that were cancelled meanwhile are left out; the others can no longer be cancelled
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            vectors = self.embeddings.embed_documents([text for text, _ in batch])
+        except Exception as e:
+            logging.error(f"Embedding batcher failed to embed {len(batch)} text(s): {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.texts += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(text).result(self.timeout)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(text)), self.timeout)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "window_ms": self.window_ms,
+            "max_batch": self.max_batch,
+            "collector_alive": self._thread is not None and self._thread.is_alive(),
+        }
+
+
+def load_test(embeddings: Embeddings, queries=256, concurrency=32, window_ms=5.0, max_batch=16):
+    """
+    Embed `queries` distinct texts from `concurrency` threads, first with one
+    `embed_query` call each, then through a `MicroBatchingEmbeddings`.
+    """
+    texts = [f"load test query {i}: how do I debounce an input handler in JavaScript?" for i in range(queries)]
+
+    def run(model):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(model.embed_query, texts))
+        elapsed = time.perf_counter() - started
+        return {"seconds": round(elapsed, 3), "queries_per_second": round(queries / elapsed, 2)}
+
+    batcher = MicroBatchingEmbeddings(embeddings, window_ms=window_ms, max_batch=max_batch)
+    try:
+        results = {"unbatched": run(embeddings), "micro_batched": run(batcher)}
+    finally:
+        batcher.close()
+    results["micro_batched"].update(batcher.stats())
+    results["speedup"] = round(results["unbatched"]["seconds"] / results["micro_batched"]["seconds"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    from langchain_ollama import OllamaEmbeddings
+    from config import Settings
+
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Embedding micro-batcher load test against the configured Ollama")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=settings.embedding_batch_window_ms)
+    parser.add_argument("--max-batch", type=int, default=settings.embedding_batch_max_size)
+    args = parser.parse_args()
+
+    model = OllamaEmbeddings(base_url=settings.ollama_base_url, model=settings.embedding_model)
+    print(load_test(model, args.queries, args.concurrency, args.window_ms, args.max_batch))
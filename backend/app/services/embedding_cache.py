@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from db.user_cache import MemoryCacheBackend
+
+'''
+embedding_cache.py [ Embedding Cache ]
+
+Embeddings are a pure function of (model, text), so every vector is cached under
+`<model>:<sha256 of text>`: re-importing a StackOverflow tag, re-uploading a PDF or
+repeating a topic query no longer pays Ollama for vectors it already computed.
+
+Lookups go through an in-process LRU front and, with `EMBEDDING_CACHE_BACKEND=mongo`,
+a persistent `embedding_cache` collection shared by every worker and restart.
+Keys carry the model name, so changing `EMBEDDING_MODEL` never serves stale
+vectors; `EMBEDDING_CACHE_PURGE_STALE` also deletes the other models' entries.
+
+1.  `embedding_key`:                `<model>:<sha256 of text>`.
+2.  `MongoEmbeddingBackend`:        Persistent `embedding_cache` collection.
+3.  `EmbeddingCache`:               LRU front + optional persistent back (`get_many` / `set_many`,
+                                    `invalidate`, hit-rate `stats`).
+4.  `CachedEmbeddings`:             `Embeddings` wrapper, only the cache misses reach the model.
+5.  `configure_embedding_cache`:    Applies `EMBEDDING_CACHE_*` settings to the process-wide `embedding_cache`.
+'''
+
+
+def embedding_key(model, text):
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class MongoEmbeddingBackend:
+    def __init__(self, mongodb_uri, database, collection="embedding_cache"):
+        from pymongo import MongoClient
+
+        self._collection = MongoClient(mongodb_uri, serverSelectionTimeoutMS=2000)[database][collection]
+        self._collection.create_index("model")
+
+    def get_many(self, keys):
+        docs = self._collection.find({"_id": {"$in": list(keys)}}, {"embedding": 1})
+        return {doc["_id"]: doc["embedding"] for doc in docs}
+
+    def set_many(self, model, items):
+        from pymongo import ReplaceOne
+
+        self._collection.bulk_write([
+            ReplaceOne({"_id": key}, {"_id": key, "model": model, "embedding": embedding}, upsert=True)
+            for key, embedding in items.items()
+        ], ordered=False)
+
+    def delete_model(self, model=None, keep=None):
+        query = {}
+        if model is not None:
+            query["model"] = model
+        if keep is not None:
+            query["model"] = {"$ne": keep}
+        return self._collection.delete_many(query).deleted_count
+
+    def size(self):
+        return self._collection.estimated_document_count()
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries=10000, back=None, enabled=True):
+        # vectors never go stale for a given model, the front only evicts by size
+        self.front = MemoryCacheBackend(ttl=float("inf"), max_entries=max_entries)
+        self.back = back
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.front_hits = 0
+        self.back_hits = 0
+        self.misses = 0
+
+    def _count(self, front_hits=0, back_hits=0, misses=0):
+        with self._lock:
+            self.front_hits += front_hits
+            self.back_hits += back_hits
+            self.misses += misses
+
+    def get_many(self, keys):
+        """
+        Cached embeddings of `keys` (a key -> embedding dict, misses left out).
+        """
+        if not self.enabled:
+            return {}
+        found = {}
+        for key in keys:
+            embedding = self.front.get(key)
+            if embedding is not None:
+                found[key] = embedding
+        front_hits = len(found)
+        missing = [key for key in keys if key not in found]
+        back_hits = 0
+        if missing and self.back is not None:
+            try:
+                from_back = self.back.get_many(missing)
+            except Exception as e:
+                logging.warning(f"Embedding cache read failed: {e}")
+                from_back = {}
+            for key, embedding in from_back.items():
+                self.front.set(key, embedding)
+            found.update(from_back)
+            back_hits = len(from_back)
+        self._count(front_hits, back_hits, len(keys) - front_hits - back_hits)
+        return found
+
+    def set_many(self, model, items):
+        if not self.enabled or not items:
+            return
+        for key, embedding in items.items():
+            self.front.set(key, embedding)
+        if self.back is not None:
+            try:
+                self.back.set_many(model, items)
+            except Exception as e:
+                logging.warning(f"Embedding cache write failed for {len(items)} embedding(s): {e}")
+
+    def invalidate(self, model=None, keep=None):
+        """
+        Drop the embeddings of `model` (all models when None), or of every model but `keep`.
+        """
+        if model is None and keep is None:
+            self.front.clear()
+        else:
+            # model names may contain `:` themselves (`nomic-embed-text:latest`), the hash never does
+            self.front.delete(*[
+                key for key in self.front.keys()
+                if (key.rpartition(":")[0] == model if model is not None else key.rpartition(":")[0] != keep)
+            ])
+        if self.back is not None:
+            deleted = self.back.delete_model(model=model, keep=keep)
+            logging.info(f"Embedding cache: deleted {deleted} stored embedding(s)")
+
+    def stats(self):
+        lookups = self.front_hits + self.back_hits + self.misses
+        try:
+            back_size = self.back.size() if self.back is not None else None
+        except Exception:
+            back_size = None
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.back).__name__ if self.back is not None else None,
+            "front_hits": self.front_hits,
+            "back_hits": self.back_hits,
+            "misses": self.misses,
+            "hit_rate": (self.front_hits + self.back_hits) / lookups if lookups else None,
+            "evictions": self.front.evictions,
+            "front_size": self.front.size(),
+            "back_size": back_size,
+        }
+
+    def reset_stats(self):
+        self.front_hits = 0
+        self.back_hits = 0
+        self.misses = 0
+        self.front.evictions = 0
+
+
+embedding_cache = EmbeddingCache()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an `Embeddings` model; texts already embedded by `model` come from `cache`.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache = embedding_cache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def _split(self, texts):
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        # identical texts in one call are embedded once
+        missing = list(dict.fromkeys(
+            (key, text) for key, text in zip(keys, texts) if key not in found
+        ))
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents([text for _, text in missing])
+            computed = {key: vector for (key, _), vector in zip(missing, vectors)}
+            self.cache.set_many(self.model, computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.set_many(self.model, {key: vector})
+        return vector
+
+    # The persistent back does blocking I/O, keep it off the event loop
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents([text for _, text in missing])
+            computed = {key: vector for (key, _), vector in zip(missing, vectors)}
+            await asyncio.to_thread(self.cache.set_many, self.model, computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text)
+        found = await asyncio.to_thread(self.cache.get_many, [key])
+        if key in found:
+            return found[key]
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self.cache.set_many, self.model, {key: vector})
+        return vector
+
+
+def configure_embedding_cache(settings):
+    embedding_cache.enabled = settings.embedding_cache_max_entries > 0
+    embedding_cache.front = MemoryCacheBackend(ttl=float("inf"), max_entries=max(settings.embedding_cache_max_entries, 1))
+    if settings.embedding_cache_backend == "mongo":
+        embedding_cache.back = MongoEmbeddingBackend(settings.mongodb_uri, settings.mongodb_)
+    else:
+        embedding_cache.back = None
+    if settings.embedding_cache_purge_stale and embedding_cache.back is not None:
+        # EMBEDDING_MODEL changed: vectors of the previous model are dead weight
+        embedding_cache.invalidate(keep=settings.embedding_model)
+    return embedding_cache
@@ -0,0 +1,312 @@
+import re
+import sys
+import hashlib
+import threading
+
+from db.user_cache import MemoryCacheBackend
+
+'''
+feedback_cache.py [ Quiz Feedback Cache ]
+
+Students often submit the same fix to the same generated task, differing only in
+whitespace, comments or formatting. `check_quiz_correctness` keys its feedback on
+a hash of the task text and the normalised answer, and replays a cached feedback
+as a token stream instead of asking the LLM again.
+
+1.  `normalize_answer`:         Strips comments and formatting from HTML / CSS / JS code (small tokenizer,
+                                literals, HTML text and <pre> kept as written). `python -m services.feedback_cache check`
+2.  `feedback_key`:             sha256 of the task text and the normalised answer.
+3.  `FeedbackCache`:            TTL + LRU cache (`get` / `has` / `set`) with hit-rate `stats`.
+4.  `replay_tokens`:            Splits a cached feedback back into word tokens for streaming.
+5.  `configure_feedback_cache`: Applies `FEEDBACK_CACHE_*` settings to the process-wide `feedback_cache`.
+'''
+
+_TOKENS = re.compile(r"\S+\s*|\s+")
+_VERBATIM_ELEMENT = re.compile(r"<(pre|textarea)\b[^>]*>.*?(</\1\s*>|$)", re.IGNORECASE | re.DOTALL)
+# an HTML tag; the text after it up to the next `<` is a text node, unless it opens <script> / <style>
+_TAG = re.compile(r"<(/?)([A-Za-z][\w-]*)(?:\s[^<>]*)?/?>")
+_CODE_ELEMENTS = {"script", "style"}
+
+_PUNCTUATION = set("{}()[];,=<>+-*/!&|?:%^~.")
+# characters that can form a longer operator together (`- -` vs `--`, `= =` vs `==`)
+_OPERATORS = set("=<>+-*/!&|?:%^~.")
+# whitespace next to these never changes how HTML / CSS / JS reads; `:`, `+`, `-`,
+# `<`, `>`, `(` before and `)` `]` after are left out on purpose (`a :hover`,
+# `calc(1px - 2px)`, `<b>a</b> <i>b</i>`, `and (min-width)`, `[href] a`)
+_SPACE_AFTER = set("{};,([=")
+_SPACE_BEFORE = set("{};,)]=")
+# a newline before `{` can end a JS statement (`return\n{`)
+_NEWLINE_BEFORE = _SPACE_BEFORE - {"{"}
+# a newline after `}` can too (`x = {}\ny()`), unless what follows cannot start an expression
+_NEWLINE_AFTER = _SPACE_AFTER - {"}"}
+# after these a `/` starts a regex literal, not a division
+_REGEX_AFTER_PUNCTUATION = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_AFTER_WORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "instanceof", "yield", "await"}
+
+
+def _string_end(text, i):
+    # `text[i]` is the opening quote; returns the index after the closing one
+    quote = text[i]
+    i += 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        if text[i] == "\n" and quote != "`":
+            return i
+        i += 1
+    return len(text)
+
+def _regex_end(text, i):
+    # `text[i]` is the opening `/`; None when it is not a regex literal after all
+    i += 1
+    in_class = False
+    while i < len(text):
+        char = text[i]
+        if char == "\n":
+            return None
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            while i < len(text) and text[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return None
+
+def _tokenize(text):
+    """
+    (kind, text) tokens of an answer: "space" (a single " ", or "\n" when the run had
+    a newline), "verbatim" (string / regex literals, <pre> / <textarea> elements, HTML
+    text nodes), "punct" (one character) and "word". Comments come out as space.
+    """
+    tokens = []
+    previous = None  # last token that is not space, decides whether `/` starts a regex
+    text_node = None  # where the text node after the last HTML tag starts
+
+    def add(kind, value):
+        nonlocal previous
+        if kind == "space":
+            if tokens and tokens[-1][0] == "space":
+                if value == "\n":
+                    tokens[-1] = ("space", "\n")
+                return
+        else:
+            previous = (kind, value)
+        tokens.append((kind, value))
+
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if i == text_node:
+            j = text.find("<", i)
+            j = len(text) if j < 0 else j
+            if text[i:j].strip():
+                add("verbatim", text[i:j])
+                i = j
+                continue
+        if char.isspace():
+            j = i
+            while j < len(text) and text[j].isspace():
+                j += 1
+            add("space", "\n" if "\n" in text[i:j] else " ")
+            i = j
+        elif char in "\"'`":
+            j = _string_end(text, i)
+            add("verbatim", text[i:j])
+            i = j
+        elif text.startswith("<!--", i):
+            j = text.find("-->", i + 4)
+            j = len(text) if j < 0 else j + 3
+            add("space", "\n" if "\n" in text[i:j] else " ")
+            i = j
+        elif char == "<" and _VERBATIM_ELEMENT.match(text, i):
+            j = _VERBATIM_ELEMENT.match(text, i).end()
+            add("verbatim", text[i:j])
+            i = j
+        elif char == "<" and _TAG.match(text, i):
+            # the tag itself is tokenized as usual, only the text after it is kept as written
+            tag = _TAG.match(text, i)
+            if tag.group(1) or tag.group(2).lower() not in _CODE_ELEMENTS:
+                text_node = tag.end()
+            add("punct", char)
+            i += 1
+        elif text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            j = len(text) if j < 0 else j + 2
+            add("space", "\n" if "\n" in text[i:j] else " ")
+            i = j
+        elif text.startswith("//", i) and (not tokens or tokens[-1][0] == "space" or tokens[-1][1] in "{};(),"):
+            # a line comment only where one can start: never `http://` or `href=//cdn...`
+            j = text.find("\n", i)
+            i = len(text) if j < 0 else j
+        elif char == "/" and (
+            previous is None
+            or (previous[0] == "punct" and previous[1] in _REGEX_AFTER_PUNCTUATION)
+            or (previous[0] == "word" and previous[1] in _REGEX_AFTER_WORDS)
+        ) and _regex_end(text, i) is not None:
+            j = _regex_end(text, i)
+            add("verbatim", text[i:j])
+            i = j
+        elif char in _PUNCTUATION:
+            add("punct", char)
+            i += 1
+        else:
+            j = i
+            while j < len(text) and not text[j].isspace() and text[j] not in _PUNCTUATION and text[j] not in "\"'`":
+                j += 1
+            add("word", text[i:j])
+            i = j
+    return tokens
+
+def _drop_space(before, space, after):
+    if before[0] == "punct" and after[0] == "punct" and before[1] in _OPERATORS and after[1] in _OPERATORS:
+        return False
+    if before[0] == "punct" and before[1] in (_NEWLINE_AFTER if space == "\n" else _SPACE_AFTER):
+        return True
+    return after[0] == "punct" and after[1] in (_NEWLINE_BEFORE if space == "\n" else _SPACE_BEFORE)
+
+
+def normalize_answer(answer):
+    """
+    Drops comments and the whitespace that cannot change the meaning of the code;
+    string / regex literals, HTML text nodes and <pre> / <textarea> content are kept
+    as written.
+    Whitespace is never removed where it would join two tokens (`a - -b` vs `a--b`).
+    """
+    tokens = _tokenize(answer or "")
+    while tokens and tokens[0][0] == "space":
+        tokens.pop(0)
+    while tokens and tokens[-1][0] == "space":
+        tokens.pop()
+    parts = []
+    for index, (kind, value) in enumerate(tokens):
+        if kind == "space" and _drop_space(tokens[index - 1], value, tokens[index + 1]):
+            continue
+        parts.append(value)
+    return "".join(parts)
+
+
+def feedback_key(task, answer):
+    normalized = f"{(task or '').strip()}\0{normalize_answer(answer)}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def replay_tokens(feedback):
+    return _TOKENS.findall(feedback)
+
+
+class FeedbackCache:
+    def __init__(self, ttl=3600.0, max_entries=2048):
+        self.backend = MemoryCacheBackend(ttl=ttl, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.backend.ttl > 0 and self.backend.max_entries > 0
+
+    def get(self, task, answer):
+        if not self.enabled:
+            return None
+        feedback = self.backend.get(feedback_key(task, answer))
+        with self._lock:
+            if feedback is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return feedback
+
+    def has(self, task, answer):
+        # no stats, for admission checks ahead of the real `get`
+        return self.enabled and self.backend.get(feedback_key(task, answer)) is not None
+
+    def set(self, task, answer, feedback):
+        if self.enabled and feedback:
+            self.backend.set(feedback_key(task, answer), feedback)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.backend.evictions,
+            "size": self.backend.size(),
+            "ttl": self.backend.ttl,
+            "max_entries": self.backend.max_entries,
+        }
+
+
+feedback_cache = FeedbackCache()
+
+def configure_feedback_cache(settings):
+    feedback_cache.backend = MemoryCacheBackend(
+        ttl=settings.feedback_cache_ttl,
+        max_entries=settings.feedback_cache_max_entries,
+    )
+    return feedback_cache
+
+
+# (a, b, same normalised answer?)
+_SELF_CHECKS = [
+    ("a = 1 ;", "a=1;", True),
+    ("function f() {\n  return 1; // one\n}", "function f(){ return 1; }", True),
+    ("a { color: red; }", "a{color: red;}", True),
+    ("<!-- note --><p>x</p>", "<p>x</p>", True),
+    ("x = 1 /* set */ ;", "x = 1;", True),
+    ("a - -b", "a--b", False),
+    ("a + +b", "a++b", False),
+    ("a = = b", "a == b", False),
+    ('x = "a - b"', 'x = "a-b"', False),
+    ("u = '//a.js'; alert(1)", "u = '//a.js'; alert(2)", False),
+    ("<a href=//cdn.example/a.js>a</a>", "<a href=//cdn.example/b.js>b</a>", False),
+    ("<pre>a  b</pre>", "<pre>a b</pre>", False),
+    ("s.replace(/a  b/g, '')", "s.replace(/a b/g, '')", False),
+    ("r = /a\\/\\/b/; f(1)", "r = /a\\/\\/b/; f(2)", False),
+    ("return\nx", "return x", False),
+    ("return\n{a: 1}", "return {a: 1}", False),
+    ("div :hover", "div:hover", False),
+    ("a[href] b", "a[href]b", False),
+    ("calc(1px - 2px)", "calc(1px -2px)", False),
+    ("<b>a</b> <i>b</i>", "<b>a</b><i>b</i>", False),
+    ("x = {}\ny()", "x = {} y()", False),
+    ("const f = () => {}\n[1].map(f)", "const f = () => {} [1].map(f)", False),
+    ("<p>Hello, world</p>", "<p>Hello,world</p>", False),
+    ("if (a) {\n  f();\n}\n}", "if (a) { f(); } }", True),
+    ("<div>\n  <p>x</p>\n</div>", "<div>\n<p>x</p>\n</div>", True),
+    ("<style>a { color: red; }</style>", "<style>a{color: red;}</style>", True),
+]
+
+def self_check():
+    failures = []
+    for a, b, same in _SELF_CHECKS:
+        if (normalize_answer(a) == normalize_answer(b)) != same:
+            failures.append(f"{a!r} vs {b!r}: expected {'same' if same else 'different'}, "
+                            f"got {normalize_answer(a)!r} / {normalize_answer(b)!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "check":
+        print("usage: python -m services.feedback_cache check")
+        sys.exit(2)
+
+    failures = self_check()
+    for failure in failures:
+        print("FAIL", failure)
+    print(f"{len(_SELF_CHECKS) - len(failures)}/{len(_SELF_CHECKS)} normalisation checks passed")
+    sys.exit(1 if failures else 0)
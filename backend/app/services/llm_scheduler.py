@@ -0,0 +1,152 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from enum import IntEnum
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+'''
+llm_scheduler.py [ LLM Scheduler ]
+
+Every LLM call goes through one `LLMScheduler`, which lets at most
+`llm_max_concurrency` calls reach Ollama at once and queues the rest by priority
+(interactive chat > quiz feedback > background question generation).
+
+Requests are admitted at the door: when the queue is full `admit` raises
+`SchedulerBusy` (-> 429 + Retry-After), turning lower priorities away first, at
+50% / 75% / 100% of `llm_max_queue_depth`. Calls of an admitted request always queue.
+
+1.  `Priority`:                 INTERACTIVE, FEEDBACK, BACKGROUND.
+2.  `use_priority`:             Sets the priority of the LLM calls made in the current context.
+3.  `LLMScheduler.slot`:        `async with` a concurrency slot; records queue wait and generation time.
+4.  `LLMScheduler.admit`:       Fails fast with `SchedulerBusy` before a streaming response starts.
+5.  `configure_llm_scheduler`:  Applies the concurrency / queue depth from `Settings`.
+'''
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    FEEDBACK = 1
+    BACKGROUND = 2
+
+# share of the queue depth each priority may still join
+_QUEUE_SHARE = {
+    Priority.INTERACTIVE: 1.0,
+    Priority.FEEDBACK: 0.75,
+    Priority.BACKGROUND: 0.5,
+}
+
+_current_priority = ContextVar("llm_priority", default=Priority.BACKGROUND)
+
+@contextmanager
+def use_priority(priority):
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class SchedulerBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=2, max_queue_depth=32):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._stats = {p.name.lower(): {
+            "requests": 0,
+            "rejected": 0,
+            "wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "generation_ms": 0.0,
+        } for p in Priority}
+
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _retry_after(self):
+        # average generation time x queue turns ahead of a newcomer
+        completed = sum(s["requests"] for s in self._stats.values())
+        generation_ms = sum(s["generation_ms"] for s in self._stats.values())
+        average_s = generation_ms / completed / 1000 if completed else 5.0
+        turns = self.queue_depth() / max(self.max_concurrency, 1) + 1
+        return max(1, round(average_s * turns))
+
+    def admit(self, priority=None):
+        priority = _current_priority.get() if priority is None else priority
+        if self.queue_depth() >= self.max_queue_depth * _QUEUE_SHARE[priority]:
+            self._stats[priority.name.lower()]["rejected"] += 1
+            raise SchedulerBusy(self._retry_after())
+
+    async def _acquire(self, priority):
+        if self._active < self.max_concurrency and not self.queue_depth():
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # granted just before we were cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # the slot passes straight to the waiter, `_active` is unchanged
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, name="llm", priority=None):
+        priority = _current_priority.get() if priority is None else priority
+        queued_at = time.perf_counter()
+        await self._acquire(priority)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release()
+            finished_at = time.perf_counter()
+            wait_ms = (started_at - queued_at) * 1000
+            generation_ms = (finished_at - started_at) * 1000
+            stats = self._stats[priority.name.lower()]
+            stats["requests"] += 1
+            stats["wait_ms"] += wait_ms
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_ms)
+            stats["generation_ms"] += generation_ms
+            logging.info(f"LLM {name} [{priority.name.lower()}]: waited {wait_ms:.0f} ms, generated in {generation_ms:.0f} ms")
+
+    def stats(self):
+        stats = {}
+        for priority, s in self._stats.items():
+            stats[priority] = dict(s)
+            stats[priority]["avg_wait_ms"] = s["wait_ms"] / s["requests"] if s["requests"] else None
+            stats[priority]["avg_generation_ms"] = s["generation_ms"] / s["requests"] if s["requests"] else None
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "active": self._active,
+            "queued": self.queue_depth(),
+            "priorities": stats,
+        }
+
+
+llm_scheduler = LLMScheduler()
+
+def configure_llm_scheduler(settings):
+    llm_scheduler.max_concurrency = settings.llm_max_concurrency
+    llm_scheduler.max_queue_depth = settings.llm_max_queue_depth
+    return llm_scheduler
@@ -0,0 +1,155 @@
+import io
+import os
+import sys
+import glob
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PyPDF2 import PdfReader
+
+'''
+pdf_extract.py [ PDF Text Extraction ]
+
+PyPDF2 extraction is pure Python and CPU bound, so it runs in a process pool
+sized to the cores instead of the ingesting thread. Each PDF is cut into ranges
+of `pdf_extract_pages_per_task` pages, extracted in parallel, and read back in
+page order by the chunk / embedding stages of `save_pdf_to_neo4j`; the next file
+is extracted while the current one is embedded.
+
+Workers are spawned, not forked (the API process runs threads), and this module
+only imports PyPDF2 (pdf2image lazily), so they start light.
+
+Upload thumbnails have their own small thread pool: pdf2image shells out to
+poppler, so a thread only waits on the subprocess, and a burst of uploads never
+queues behind (or delays) the extraction of large PDFs.
+
+1.  `PdfExtraction`:            The page-range tasks of one PDF; `pages()` yields the page texts in order.
+2.  `render_thumbnail`:         First-page PNG thumbnail of a PDF (pdf2image), bounded in size.
+3.  `get_extract_pool`:         The process-wide `ProcessPoolExecutor` (`PDF_EXTRACT_WORKERS`, 0 = all cores).
+3.  `get_thumbnail_pool`:       The process-wide thumbnail `ThreadPoolExecutor` (`PDF_THUMBNAIL_WORKERS`).
+4.  `shutdown_extract_pool`:    Stops the extraction processes and thumbnail threads on shutdown.
+5.  `benchmark`:                Pages/second over a directory of PDFs at 1, 2, 4 and N workers.
+                                `python -m services.pdf_extract bench <pdf dir> [pages per task]`
+'''
+
+
+def count_pages(content: bytes) -> int:
+    return len(PdfReader(io.BytesIO(content)).pages)
+
+def extract_pages(content: bytes, start: int, stop: int) -> list:
+    # runs in a worker process
+    pdf_reader = PdfReader(io.BytesIO(content))
+    return [pdf_reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+def render_thumbnail(content: bytes, max_size: int = 320) -> bytes:
+    """
+    PNG of the first page only, at most `max_size` px on its longer side. Runs in
+    the thumbnail pool; cost does not depend on the page count.
+    """
+    from pdf2image import convert_from_bytes
+
+    images = convert_from_bytes(content, first_page=1, last_page=1, size=(max_size, None))
+    image = images[0]
+    image.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+class PdfExtraction:
+    def __init__(self, content: bytes, executor, pages_per_task: int = 32):
+        self.pages_total = 0
+        self.futures = []
+        self.error = None
+        try:
+            self.pages_total = count_pages(content)
+            self.futures = [
+                executor.submit(extract_pages, content, start, min(start + pages_per_task, self.pages_total))
+                for start in range(0, self.pages_total, max(1, pages_per_task))
+            ]
+        except Exception as e:
+            # raised when the file's turn comes, not while another file is being ingested
+            self.error = e
+
+    def pages(self):
+        if self.error is not None:
+            raise self.error
+        for future in self.futures:
+            yield from future.result()
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+def get_extract_pool(workers: int = 0) -> ProcessPoolExecutor:
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _extract_pool
+
+_thumbnail_pool = None
+
+def get_thumbnail_pool(workers: int = 2) -> ThreadPoolExecutor:
+    global _thumbnail_pool
+    with _extract_pool_lock:
+        if _thumbnail_pool is None:
+            _thumbnail_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pdf-thumbnail")
+        return _thumbnail_pool
+
+def shutdown_extract_pool():
+    global _extract_pool, _thumbnail_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(cancel_futures=True)
+            _extract_pool = None
+        if _thumbnail_pool is not None:
+            _thumbnail_pool.shutdown(cancel_futures=True)
+            _thumbnail_pool = None
+
+
+def benchmark(pdf_dir: str, pages_per_task: int = 32, worker_counts=None):
+    contents = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    if not contents:
+        raise ValueError(f"No PDFs in {pdf_dir}")
+
+    cores = os.cpu_count()
+    worker_counts = worker_counts or sorted({1, 2, 4, cores})
+    results = []
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            started = time.perf_counter()
+            extractions = [PdfExtraction(content, executor, pages_per_task) for content in contents]
+            pages = sum(len(list(extraction.pages())) for extraction in extractions)
+            elapsed = time.perf_counter() - started
+        results.append({
+            "workers": workers,
+            "files": len(contents),
+            "pages": pages,
+            "seconds": round(elapsed, 3),
+            "pages_per_second": round(pages / elapsed, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "bench":
+        print("usage: python -m services.pdf_extract bench <pdf dir> [pages per task]")
+        sys.exit(2)
+
+    pages_per_task = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    for result in benchmark(sys.argv[2], pages_per_task):
+        print(f"{result['workers']:>3} worker(s): {result['pages']} pages in {result['seconds']}s, {result['pages_per_second']} pages/s")
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+
+from services.llm_scheduler import Priority, SchedulerBusy, llm_scheduler, use_priority
+
+'''
+question_pool.py [ Question Pool ]
+
+Quiz sessions declare their `question_count` and `topics` up front, so their
+questions can be generated (and verified, graded) before the student asks for
+them. Pre-generated questions are ordinary `Question` nodes of the session with
+`pooled: true`; `/generate-task` claims the oldest one and streams it at once,
+and only falls back to a live generation when the pool is empty. Pool generation
+never touches the session's chat history; a question is recorded there once served.
+
+A session is refilled once its pool drops to `question_pool_low_water`, up to
+`question_pool_high_water` (never past the session's `question_count`). Refills
+run at BACKGROUND priority through the LLM scheduler, at most
+`question_pool_max_workers` at a time, and back off (without holding a worker)
+while the scheduler would turn background work away. A live generation on a pool
+miss has a student waiting, so it runs at FEEDBACK priority, ahead of the refills.
+
+1.  `QuestionPool.refill`:          Starts a refill of a session unless one is running.
+2.  `QuestionPool.claim`:           Takes a pooled question of a session (None when empty) and triggers a refill.
+3.  `QuestionPool.close`:           Cancels the running refills on shutdown.
+4.  `configure_question_pool`:      Applies the water marks / workers from `Settings` and the generator.
+'''
+
+
+class QuestionPool:
+    def __init__(self, low_water=1, high_water=3, max_workers=1, generate=None, db_getter=None):
+        self.low_water = low_water
+        self.high_water = high_water
+        self.max_workers = max_workers
+        # generate(user_id, session) -> creates one pooled question of the session
+        self._generate = generate
+        self._db_getter = db_getter
+        self._workers = None
+        self._refills = {}  # session_id -> task
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.backoffs = 0
+
+    @property
+    def enabled(self):
+        return self.high_water > 0 and self._generate is not None
+
+    def _semaphore(self):
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(max(1, self.max_workers))
+        return self._workers
+
+    def refill(self, user_id, session):
+        session_id = session.get("session_id")
+        if not self.enabled or not session_id or not session.get("question_count"):
+            return None
+        task = self._refills.get(session_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refill(user_id, session))
+            self._refills[session_id] = task
+            task.add_done_callback(lambda t: self._done(session_id, t))
+        return task
+
+    def _done(self, session_id, task):
+        if self._refills.get(session_id) is task:
+            del self._refills[session_id]
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Question pool refill failed for session {session_id}: {task.exception()}")
+
+    async def _refill(self, user_id, session):
+        session_id = session["session_id"]
+        db = self._db_getter()
+        threshold = self.low_water
+        while True:
+            retry_after = None
+            # one worker slot per generated question, never held while backing off
+            async with self._semaphore():
+                state = await db.get_question_pool_state(session_id)
+                if not state:
+                    return
+                remaining = (state["question_count"] or 0) - state["served"] - state["pooled"]
+                # start below the low-water mark, then keep going up to the high-water mark
+                if state["pooled"] > threshold or state["pooled"] >= self.high_water or remaining <= 0:
+                    return
+                threshold = self.high_water
+                try:
+                    llm_scheduler.admit(Priority.BACKGROUND)
+                except SchedulerBusy as e:
+                    self.backoffs += 1
+                    retry_after = e.retry_after
+                else:
+                    with use_priority(Priority.BACKGROUND):
+                        await self._generate(user_id, session)
+                    after = await db.get_question_pool_state(session_id)
+                    if not after or after["pooled"] <= state["pooled"]:
+                        logging.warning(f"Question pool: no question generated for session {session_id}, stopping refill")
+                        return
+                    self.generated += after["pooled"] - state["pooled"]
+                    logging.info(f"Question pool: session {session_id} has {after['pooled']} pooled question(s)")
+            if retry_after is not None:
+                # students are waiting on the LLM, try again once the queue has drained
+                await asyncio.sleep(retry_after)
+
+    async def claim(self, user_id, session):
+        """
+        The next pooled question of the session, or None to generate it live.
+        Either way the pool is topped up in the background.
+        """
+        question = None
+        if self.enabled and session.get("session_id"):
+            question = await self._db_getter().claim_pooled_question(session["session_id"])
+            if question is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self.refill(user_id, session)
+        return question
+
+    async def close(self):
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        claims = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "low_water": self.low_water,
+            "high_water": self.high_water,
+            "max_workers": self.max_workers,
+            "refilling": len(self._refills),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else None,
+            "generated": self.generated,
+            "backoffs": self.backoffs,
+        }
+
+
+question_pool = QuestionPool()
+
+def configure_question_pool(settings, generate=None, db_getter=None):
+    question_pool.low_water = settings.question_pool_low_water
+    question_pool.high_water = settings.question_pool_high_water
+    question_pool.max_workers = settings.question_pool_max_workers
+    question_pool._workers = None
+    if generate is not None:
+        question_pool._generate = generate
+    if db_getter is not None:
+        question_pool._db_getter = db_getter
+    return question_pool
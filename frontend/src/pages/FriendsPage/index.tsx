@@ -20,6 +20,7 @@ import { getAvatarPath } from '../../utils/avatarUtils';
 
 
 const LIST_ALL_USER = 'http://localhost:8504/users/all';
+const USER_RELATIONSHIPS = (userId: string) => `http://localhost:8504/users/${userId}/relationships`;
 const CREATE_USER_FOLLOW = 'http://localhost:8504/users/relationship';
 const DELETE_USER_FOLLOW = 'http://localhost:8504/users/relationship/delete';
 
@@ -39,25 +40,53 @@ interface User {
 
 export default function FriendsPage() {
     const [users, setUsers] = useState<User[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingUsers, setLoadingUsers] = useState(false);
+    // ids the current user follows; the current user may not be on a loaded page
+    const [followingIds, setFollowingIds] = useState<string[]>([]);
     const { user } = useAuth();
     const [hoveredUserId, setHoveredUserId] = useState<string | null>(null);
     const [isMessagingOpen, setIsMessagingOpen] = useState(false);
     const [targetUserId, setTargetUserId] = useState<string | null>(null);
     const [userAvatar, setUserAvatar] = useState<string | null>(null);
 
-    // Fetch all users
+    // `/users/all` is paginated: the first page on load, the next ones on demand
+    const fetchUsers = async (cursor: string | null) => {
+        setLoadingUsers(true);
+        try {
+            const url = cursor ? `${LIST_ALL_USER}?after=${encodeURIComponent(cursor)}` : LIST_ALL_USER;
+            const response = await fetch(url);
+            const data = await response.json();
+            setUsers(prev => (cursor ? prev : []).concat(data.users || []));
+            setNextCursor(response.headers.get('X-Next-Cursor'));
+        } catch (error) {
+            console.error('Error fetching users:', error);
+        } finally {
+            setLoadingUsers(false);
+        }
+    };
+
+    useEffect(() => {
+        fetchUsers(null);
+    }, []);
+
     useEffect(() => {
-        const fetchUsers = async () => {
+        if (!user?._id) return;
+        const fetchFollowing = async () => {
             try {
-                const response = await fetch(`${LIST_ALL_USER}`);
+                const response = await fetch(USER_RELATIONSHIPS(user._id));
                 const data = await response.json();
-                setUsers(data.users || []);
+                setFollowingIds(
+                    (data.relationships || [])
+                        .filter((r: { type: string }) => r.type === 'FOLLOWS')
+                        .map((r: { to_id: string }) => r.to_id)
+                );
             } catch (error) {
-                console.error('Error fetching users:', error);
+                console.error('Error fetching relationships:', error);
             }
         };
-        fetchUsers();
-    }, []);
+        fetchFollowing();
+    }, [user?._id]);
 
     // Knowledge Level Function
     const getKnowledgeLevel = (knowledge: string): { style: SxProps<Theme>; label: string } => {
@@ -106,6 +135,8 @@ export default function FriendsPage() {
             });
 
             if (response.ok) {
+                setFollowingIds(prev => [...prev, targetUserId]);
+
                 // Get the target user's username
                 const targetUser = users.find(u => u.id === targetUserId);
 
@@ -133,12 +164,7 @@ export default function FriendsPage() {
         }
     };
 
-    const isFollowing = (targetUserId: string) => {
-        const currentUser = users.find(u => u.id === user?._id);
-        return currentUser?.relationships.some(
-            r => r.type === 'FOLLOWS' && r.target_id === targetUserId
-        );
-    };
+    const isFollowing = (targetUserId: string) => followingIds.includes(targetUserId);
 
     const isMutualFollow = (targetUserId: string) => {
         const targetUser = users.find(u => u.id === targetUserId);
@@ -164,6 +190,8 @@ export default function FriendsPage() {
             });
 
             if (response.ok) {
+                setFollowingIds(prev => prev.filter(id => id !== targetUserId));
+
                 // Update users list to remove relationship
                 const updatedUsers = users.map(u => {
                     if (u.id === user._id) {
@@ -212,7 +240,7 @@ export default function FriendsPage() {
             <Divider sx={{ marginBottom: 2 }} />
 
             <Grid container spacing={4}>
-                {users.length > 1 ? (
+                {users.some(otherUser => otherUser.id !== user?._id) ? (
                     users.map(otherUser => (
                         user?._id !== otherUser.id && (
                             <Grid item xs={12} sm={6} md={4} key={otherUser.id}>
@@ -309,6 +337,14 @@ export default function FriendsPage() {
                 )}
             </Grid>
 
+            {nextCursor && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', marginTop: 4 }}>
+                    <Button variant="outlined" onClick={() => fetchUsers(nextCursor)} disabled={loadingUsers}>
+                        {loadingUsers ? 'Loading...' : 'Load more'}
+                    </Button>
+                </Box>
+            )}
+
             <Drawer
                 anchor="right"
                 open={isMessagingOpen}
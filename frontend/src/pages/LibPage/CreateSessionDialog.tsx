@@ -38,6 +38,7 @@ export default function FormDialog() {
     const [QuestionNum, setQuestionNum] = React.useState<number>(1);
     const [selectedTopics, setSelectedTopics] = React.useState<string[]>([]);
     const [cardContent, setCardContent] = React.useState<PDFData[]>([]);
+    const [nextCursor, setNextCursor] = React.useState<string | null>(null);
     const [selectedPDFs, setSelectedPDFs] = React.useState<string[]>([]);
     const [sessionName, setSessionName] = React.useState('');
 
@@ -48,18 +49,22 @@ export default function FormDialog() {
     }, []);
 
     // PDF
-    const fetchPDFs = async () => {
+    // `/pdfs` is paginated: the first page on load and refresh, the next ones on demand
+    // (the browser revalidates a page with its ETag, an unchanged page costs a 304)
+    const fetchPDFs = async (cursor: string | null = null) => {
         const abortController = new AbortController();
         try {
-            const response = await fetch(PDF_API_ENDPOINT, {
+            const url = cursor ? `${PDF_API_ENDPOINT}?after=${encodeURIComponent(cursor)}` : PDF_API_ENDPOINT;
+            const response = await fetch(url, {
                 signal: abortController.signal
             });
             const json = await response.json();
-            if (Array.isArray(json)) {
-                setCardContent(json);
-            } else {
+            if (!Array.isArray(json)) {
                 alert(json.detail);
+                return () => abortController.abort();
             }
+            setCardContent(prev => (cursor ? prev : []).concat(json));
+            setNextCursor(response.headers.get('X-Next-Cursor'));
         } catch (error) {
             if (error.name !== 'AbortError') {
                 console.error(error);
@@ -286,6 +291,13 @@ export default function FormDialog() {
                             </Grid>
                         ))}
                     </Grid>
+                    {nextCursor && (
+                        <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                            <Button variant="outlined" onClick={() => fetchPDFs(nextCursor)} sx={{ textTransform: 'none' }}>
+                                Load more
+                            </Button>
+                        </Box>
+                    )}
 
 
                 </DialogContent>
@@ -11,44 +11,64 @@ import Button from '@mui/material/Button';
 import MarkdownRenderer from '../../components/MarkdownRenderer';
 import { useAuth } from '../../authentication/AuthContext';
 
-const CHAT_HISTORIES_API_ENDPOINT = 'http://localhost:8504/chat_histories/user';
+const CHAT_HISTORIES_API_ENDPOINT = 'http://localhost:8504/chat_histories';
 
 interface ChatHistory {
     data: { content: string };
     type: string | null;
 }
 
+interface SessionSummary {
+    session_id: string;
+    sname: string | null;
+    message_count: number | null;
+    last_message: ChatHistory;
+}
+
 interface SessionHistory {
     session_id: string;
     history: ChatHistory[];
 }
 
+// newest messages of a session shown in the dialog, one page of `/chat_histories/{SessionId}`
+const HISTORY_PAGE_SIZE = 200;
+
 const QuestionAnswerHistory = () => {
-    const [history, setHistory] = React.useState<SessionHistory[]>([]);
+    const [sessions, setSessions] = React.useState<SessionSummary[]>([]);
     const [selectedSession, setSelectedSession] = React.useState<SessionHistory | null>(null);
     const [dialogOpen, setDialogOpen] = React.useState(false);
     const { user } = useAuth();
 
     React.useEffect(() => {
-        const fetchHistory = async () => {
+        const fetchSessions = async () => {
             try {
-                const response = await fetch(`${CHAT_HISTORIES_API_ENDPOINT}/${user?._id}`);
-                const data = await response.json();
-                const formattedData = Object.keys(data).map(session_id => ({
-                    session_id,
-                    history: data[session_id].filter((item: ChatHistory) => item.data.content.trim() !== ''),
-                }));
-                setHistory(formattedData);
+                // session heads only, the messages are read when a session is opened
+                const response = await fetch(`${CHAT_HISTORIES_API_ENDPOINT}/user/${user?._id}/summary`);
+                if (!response.ok) {
+                    setSessions([]);
+                    return;
+                }
+                const data: SessionSummary[] = await response.json();
+                setSessions(data.filter((session) => session.last_message?.data.content.trim() !== ''));
             } catch (error) {
                 console.error("Error fetching history:", error);
             }
         };
-        fetchHistory();
+        fetchSessions();
     }, [user?._id]);
 
-    const handleSessionClick = (session: SessionHistory) => {
-        setSelectedSession(session);
-        setDialogOpen(true);
+    const handleSessionClick = async (session: SessionSummary) => {
+        try {
+            const response = await fetch(`${CHAT_HISTORIES_API_ENDPOINT}/${session.session_id}?limit=${HISTORY_PAGE_SIZE}`);
+            const data: ChatHistory[] = response.ok ? await response.json() : [];
+            setSelectedSession({
+                session_id: session.session_id,
+                history: data.filter((item) => item.data.content.trim() !== ''),
+            });
+            setDialogOpen(true);
+        } catch (error) {
+            console.error("Error fetching session history:", error);
+        }
     };
 
     return (
@@ -56,8 +76,8 @@ const QuestionAnswerHistory = () => {
             <Typography variant="h6" gutterBottom>
                 My Session History (maybe merge to Lib page)
             </Typography>
-            {history.length > 0 ? (
-                history.map((session, index) => (
+            {sessions.length > 0 ? (
+                sessions.map((session, index) => (
                     <Card
                         key={index}
                         onClick={() => handleSessionClick(session)}
@@ -68,7 +88,7 @@ const QuestionAnswerHistory = () => {
                                 Session ID: {session.session_id.substring(0, 8)}...
                             </Typography>
                             <Typography variant="body2">
-                                {session.history[0]?.data.content.substring(0, 100)}...
+                                {session.last_message?.data.content.substring(0, 100)}...
                             </Typography>
                         </CardContent>
                     </Card>
@@ -91,7 +111,7 @@ const QuestionAnswerHistory = () => {
                     {selectedSession?.history.map((item, idx) => (
                         <div key={idx}>
                             <Typography variant="body1">
-                                <strong>{idx % 2 === 0 ? 'Question:' : 'Answer:'}</strong>
+                                <strong>{item.type === 'human' ? 'Question:' : 'Answer:'}</strong>
                             </Typography>
                             <MarkdownRenderer content={item.data.content} />
                             <Divider sx={{ margin: '10px 0' }} />
@@ -42,21 +42,26 @@ export default function FileUploadAndDisplay() {
     const [uploading, setUploading] = React.useState(false);
     const [checkingProgress, setCheckingProgress] = React.useState(false);
     const [cardContent, setCardContent] = React.useState<PDFData[]>([]); // Initialize as an array
+    const [nextCursor, setNextCursor] = React.useState<string | null>(null);
     const [taskType, setTaskType] = React.useState<string>("save");
     const { user } = useAuth();
 
-    const fetchPDFs = async () => {
+    // `/pdfs` is paginated: the first page on load and refresh, the next ones on demand
+    // (the browser revalidates a page with its ETag, an unchanged page costs a 304)
+    const fetchPDFs = async (cursor: string | null = null) => {
         const abortController = new AbortController();
         try {
-            const response = await fetch(PDF_API_ENDPOINT, {
+            const url = cursor ? `${PDF_API_ENDPOINT}?after=${encodeURIComponent(cursor)}` : PDF_API_ENDPOINT;
+            const response = await fetch(url, {
                 signal: abortController.signal
             });
             const json = await response.json();
-            if (Array.isArray(json)) {
-                setCardContent(json); // Ensure json is an array
-            } else {
+            if (!Array.isArray(json)) {
                 setError(json.detail);
+                return () => abortController.abort();
             }
+            setCardContent(prev => (cursor ? prev : []).concat(json));
+            setNextCursor(response.headers.get('X-Next-Cursor'));
         } catch (error) {
             if (error.name !== 'AbortError') {
                 console.error(error);
@@ -208,6 +213,11 @@ export default function FileUploadAndDisplay() {
                     </Grid>
                 ))}
             </Grid>
+            {nextCursor && (
+                <Button variant="outlined" onClick={() => fetchPDFs(nextCursor)} sx={{ marginTop: 2 }}>
+                    Load more
+                </Button>
+            )}
         </>
     );
 }
\ No newline at end of file